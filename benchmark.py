@@ -0,0 +1,838 @@
+#!/usr/bin/python
+# Copyright (C) 2019-23 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ****************************************************************************
+
+""" Benchmarks for the hamradio package.
+    Call with the name of a benchmark, see --help for a list.
+"""
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import random
+import shutil
+import tempfile
+import tracemalloc
+from time     import time
+from datetime import datetime
+from argparse import ArgumentParser
+from bisect   import bisect_right
+from hamradio import adif, tokenizer, bandplan, qth
+from hamradio.cty import CTY, CTY_DXCC
+from hamradio.dxcc import DXCC_File
+from hamradio.qth  import Maidenhead_Locator, Locator_Index
+from hamradio.qth  import encode, decode, distance
+
+class Legacy_Parse_Mixin (object) :
+    """ The original parser reading one character at a time,
+        for comparison with the current block-reading parser.
+    """
+
+    def get_header (self, endtag = 'eoh', firstchar = None) :
+        endtag = endtag.lower ()
+        head   = []
+        c = self.fd.read (1)
+        while (c) :
+            if c == '<' :
+                try :
+                    for k, v in self.get_tag (firstchar = c, stop = True) :
+                        if k == endtag :
+                            self.header = ''.join (head).strip ()
+                            return
+                        else :
+                            self.head_tags [k] = v
+                except adif.ADIF_Syntax_Error :
+                    head.extend (self.unftag)
+            else :
+                head.append (c)
+            c = self.fd.read (1)
+    # end def get_header
+
+    def get_tag (self, firstchar = None, stop = False) :
+        count  = 0
+        tag    = []
+        value  = []
+        state  = 'start'
+        self.unftag = []
+        if firstchar is not None :
+            c = firstchar
+        else :
+            c = self.fd.read (1)
+        while (c) :
+            self.unftag.append (c)
+            if state == 'start' or state == 'skip' :
+                c = c.lower ()
+                if c.isspace () :
+                    if c == '\n' :
+                        self.lineno += 1
+                elif c == '<' :
+                    state = 'tag'
+                elif state != 'skip' :
+                    raise adif.ADIF_Syntax_Error \
+                        ('%s: Expected tag start, got %s' % (self.lineno, c))
+            elif state == 'tag' :
+                c = c.lower ()
+                if c == '>' or c == ':' :
+                    if len (tag) == 0 :
+                        raise adif.ADIF_Syntax_Error \
+                            ('%s: Empty tag' % self.lineno)
+                    tag   = ''.join (tag)
+                    state = 'length'
+                    if c == '>' :
+                        yield ''.join (tag), ''
+                        tag   = []
+                        value = []
+                        state = 'start'
+                        if stop :
+                            return
+                else :
+                    tag.append (c)
+            elif state == 'length' :
+                if c == '>' :
+                    count = self._count (''.join (value))
+                    value = []
+                    state = 'value'
+                else :
+                    value.append (c)
+            elif state == 'value' :
+                if count :
+                    value.append (c)
+                    count -= 1
+                if count == 0 :
+                    value = ''.join (value)
+                    yield (tag, value)
+                    tag   = []
+                    value = []
+                    state = 'skip'
+                    if stop :
+                        state = 'start'
+                        return
+            c = self.fd.read (1)
+    # end def get_tag
+
+# end class Legacy_Parse_Mixin
+
+class Legacy_ADIF_Record (Legacy_Parse_Mixin, adif.ADIF_Record) :
+    pass
+
+class Legacy_ADIF (Legacy_Parse_Mixin, adif.ADIF) :
+    record_class = Legacy_ADIF_Record
+
+class Legacy_Reader (adif.ADIF_Reader) :
+    """ Hand the file through unbuffered, like the original parser """
+
+    blocksize = 1
+
+    def read (self, n = -1) :
+        if self.pos < len (self.buf) :
+            return self.__super.read (n)
+        return self.fd.read (n)
+    # end def read
+
+# end class Legacy_Reader
+
+def synthetic_call (rnd) :
+    letter = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    return ( rnd.choice (['OE', 'DL', 'K', 'G', 'JA', 'VK', 'PY'])
+           + str (rnd.randint (0, 9))
+           + ''.join (rnd.choice (letter) for k in range (3))
+           )
+# end def synthetic_call
+
+def synthetic_adif (size, seed = 23, calls = None) :
+    """ Generate a synthetic ADIF file of roughly size bytes, if calls
+        is given the QSOs are with that many different callsigns.
+    """
+    rnd    = random.Random (seed)
+    modes  = ['FT8', 'CW', 'SSB', 'RTTY', 'FT4']
+    bands  = ['160m', '80m', '40m', '30m', '20m', '17m', '15m', '10m']
+    letter = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    r = ['Synthetic ADIF for benchmarks\n<adif_ver:5>3.1.0\n<eoh>\n']
+    l = len (r [0])
+    pool = None
+    if calls :
+        pool = [synthetic_call (rnd) for k in range (calls)]
+    while l < size :
+        if pool :
+            call = rnd.choice (pool)
+        else :
+            call = synthetic_call (rnd)
+        date = '20%02d%02d%02d' % \
+            (rnd.randint (10, 23), rnd.randint (1, 12), rnd.randint (1, 28))
+        time = '%02d%02d%02d' % \
+            (rnd.randint (0, 23), rnd.randint (0, 59), rnd.randint (0, 59))
+        grid = ( rnd.choice (letter [:18]) + rnd.choice (letter [:18])
+               + '%02d' % rnd.randint (0, 99)
+               )
+        fields = \
+            [ ('call',     call)
+            , ('band',     rnd.choice (bands))
+            , ('mode',     rnd.choice (modes))
+            , ('qso_date', date)
+            , ('time_on',  time)
+            , ('time_off', time)
+            , ('freq',     '%.6f' % (rnd.randint (1800, 29700) / 1000.0))
+            , ('rst_sent', '-%02d' % rnd.randint (1, 24))
+            , ('rst_rcvd', '-%02d' % rnd.randint (1, 24))
+            , ('gridsquare', grid)
+            ]
+        rec = ''.join ('<%s:%d>%s ' % (k, len (v), v) for k, v in fields)
+        rec = rec + '<eor>\n'
+        r.append (rec)
+        l += len (rec)
+    return ''.join (r)
+# end def synthetic_adif
+
+def timed (fn, *args, **kw) :
+    start  = time ()
+    result = fn (*args, **kw)
+    return time () - start, result
+# end def timed
+
+def bench_adif_parse (args) :
+    """ Parse a synthetic ADIF file with the current and the original
+        character-by-character parser
+    """
+    text = synthetic_adif (int (args.size * 1e6))
+    with tempfile.NamedTemporaryFile ('w', suffix = '.adi') as tmp :
+        tmp.write (text)
+        tmp.flush ()
+        del text
+        size = os.path.getsize (tmp.name)
+        with io.open (tmp.name, 'r', encoding = 'utf-8') as f :
+            t_new, a_new = timed (adif.ADIF, f)
+        print ( "block parser:  %7.2fs %8.2f MB/s %d records"
+              % (t_new, size / t_new / 1e6, len (a_new.records))
+              )
+        if args.no_compare :
+            return
+        with io.open (tmp.name, 'r', encoding = 'utf-8') as f :
+            t_old, a_old = timed (Legacy_ADIF, Legacy_Reader (f))
+        print ( "legacy parser: %7.2fs %8.2f MB/s %d records"
+              % (t_old, size / t_old / 1e6, len (a_old.records))
+              )
+        assert len (a_old.records) == len (a_new.records)
+        for r1, r2 in zip (a_old.records, a_new.records) :
+            assert r1.dict == r2.dict
+        print ("Speedup: %.1f" % (t_old / t_new))
+# end def bench_adif_parse
+
+def bench_adif_index (args) :
+    """ Look up every record by call and minute like dbimport does
+        when matching QSOs against a logbook download: Build the index
+        and use it, compared to scanning the by_call lists comparing
+        the formatted dates. The log has QSOs with args.records / 50
+        different calls.
+    """
+    text = synthetic_adif (args.records * 200, calls = args.records // 50)
+    a    = adif.ADIF (io.StringIO (text))
+    del text
+    records = a.records [:args.records]
+    fmt     = '%Y-%m-%d.%H:%M'
+    def lookup () :
+        index = a.get_index ()
+        return [bool (index.find (r.call, r.get_datetime ())) for r in records]
+    def scan () :
+        found = []
+        for r in records :
+            ds = r.get_date (fmt)
+            for lc in a.by_call.get (r.call, []) :
+                if lc.get_date (fmt) == ds :
+                    found.append (True)
+                    break
+            else :
+                found.append (False)
+        return found
+    t_idx, f_idx = timed (lookup)
+    print ("index:     %7.2fs %d records" % (t_idx, len (records)))
+    if not args.no_compare :
+        t_scan, f_scan = timed (scan)
+        print ("scan:      %7.2fs" % t_scan)
+        assert f_idx == f_scan
+        print ("Speedup: %.1f" % (t_scan / t_idx))
+# end def bench_adif_index
+
+def bench_adif_memory (args) :
+    """ Memory used by the records of a synthetic ADIF file with
+        ADIF_Compact_Record compared to ADIF_Record
+    """
+    text = synthetic_adif (int (args.size * 1e6))
+    classes = [adif.ADIF_Compact_Record]
+    if not args.no_compare :
+        classes.append (adif.ADIF_Record)
+    result = {}
+    for cls in classes :
+        f = io.StringIO (text)
+        tracemalloc.start ()
+        t, a = timed (adif.ADIF, f, record_class = cls)
+        # Don't count the buffer of the reader
+        a.fd = a.parser = None
+        size = tracemalloc.get_traced_memory () [0]
+        tracemalloc.stop ()
+        result [cls] = size
+        print ( "%-20s %8.1f MB %6.1f bytes/record %7.2fs"
+              % (cls.__name__, size / 1e6, size / len (a.records), t)
+              )
+        del a
+    if not args.no_compare :
+        print \
+            ( "Ratio: %.1f"
+            % (result [adif.ADIF_Record] / result [adif.ADIF_Compact_Record])
+            )
+# end def bench_adif_memory
+
+def bench_adif_parallel (args) :
+    """ Parse a synthetic ADIF file with ADIF_Parallel using an
+        increasing number of worker processes, compared to ADIF_Mmap
+    """
+    text = synthetic_adif (int (args.size * 1e6))
+    with tempfile.NamedTemporaryFile ('w', suffix = '.adi') as tmp :
+        tmp.write (text)
+        tmp.flush ()
+        del text
+        size = os.path.getsize (tmp.name)
+        if not args.no_compare :
+            with io.open (tmp.name, 'rb') as f :
+                t_seq, a_seq = timed (adif.ADIF_Mmap, f)
+            print ( "sequential:    %7.2fs %8.2f MB/s %d records"
+                  % (t_seq, size / t_seq / 1e6, len (a_seq.records))
+                  )
+        workers = 1
+        while workers <= args.workers :
+            t, a = timed (adif.ADIF_Parallel, tmp.name, workers = workers)
+            print ( "%2d workers:    %7.2fs %8.2f MB/s %d records"
+                  % (workers, t, size / t / 1e6, len (a.records))
+                  )
+            if not args.no_compare :
+                assert len (a.records) == len (a_seq.records)
+                for r1, r2 in zip (a.records, a_seq.records) :
+                    assert r1.dict == r2.dict and r1.lineno == r2.lineno
+                print ("Speedup: %.1f" % (t_seq / t))
+            a.close ()
+            del a
+            workers *= 2
+        if not args.no_compare :
+            a_seq.close ()
+# end def bench_adif_parallel
+
+def strptime_adif (d, t) :
+    """ ADIF date conversion of previous versions """
+    fmt = '%Y%m%d.%H%M'
+    if len (t) > 4 :
+        fmt = '%Y%m%d.%H%M%S'
+    return datetime.strptime ('.'.join ((d, t)), fmt)
+# end def strptime_adif
+
+def synthetic_callsigns (cty, n, seed = 23, pool = None, repeat = .5) :
+    """ Generate n callsigns from the prefixes and exact calls of cty,
+        some don't match anything. Like in a log or spot stream many
+        callsigns occur repeatedly: The fraction repeat of them is
+        drawn from a pool of callsigns (default size n / 100).
+    """
+    rnd    = random.Random (seed)
+    pfx    = sorted (cty.prefix)
+    exact  = sorted (cty.exact_callsign)
+    letter = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    def call () :
+        r = rnd.random ()
+        if r < .05 :
+            return rnd.choice (exact)
+        if r < .1 :
+            return ''.join \
+                (rnd.choice (letter + '0123456789') for k in range (5))
+        p = rnd.choice (pfx)
+        if not p [-1].isdigit () :
+            p += str (rnd.randint (0, 9))
+        return p + ''.join \
+            (rnd.choice (letter) for k in range (rnd.randint (1, 3)))
+    pool  = [call () for k in range (pool or max (1, n // 100))]
+    calls = []
+    for k in range (n) :
+        if rnd.random () < repeat :
+            calls.append (rnd.choice (pool))
+        else :
+            calls.append (call ())
+    return calls
+# end def synthetic_callsigns
+
+def legacy_band_lookup (plan, frq) :
+    """ Band lookup of previous versions via a dummy Band object """
+    b   = bandplan.Band (None, 'dummy', frq, frq)
+    idx = bisect_right (plan.bands, b) - 1
+    if idx < 0 :
+        return
+    entry = plan.bands [idx]
+    if idx and entry.f_start <= frq <= entry.f_end :
+        return entry
+# end def legacy_band_lookup
+
+def bench_band_lookup (args) :
+    """ Band names of args.calls frequencies (mostly in a band) with
+        lookup_many compared to calling lookup for each
+    """
+    bpa   = bandplan.bandplan_austria
+    rnd   = random.Random (23)
+    freqs = []
+    for k in range (args.calls) :
+        b = rnd.choice (bpa.bands)
+        freqs.append (rnd.uniform (b.f_start - 1e3, b.f_end + 1e3))
+    t_many, r_many = timed (bpa.lookup_many, freqs)
+    print ("lookup_many: %7.3fs %d frequencies" % (t_many, len (freqs)))
+    t_one, r_one = timed \
+        (lambda : [getattr (bpa.lookup (f), 'name', None) for f in freqs])
+    print ("lookup:      %7.3fs" % t_one)
+    assert r_one == r_many
+    if not args.no_compare :
+        t_old, r_old = timed \
+            (lambda : [legacy_band_lookup (bpa, f) for f in freqs])
+        print ("old lookup:  %7.3fs" % t_old)
+        # The old lookup never found the first band
+        first = bpa.bands [0].name
+        for n, o in zip (r_many, r_old) :
+            assert n == getattr (o, 'name', None) or n == first and o is None
+        print ( "Speedup: lookup_many %.1f, lookup %.1f"
+              % (t_old / t_many, t_old / t_one)
+              )
+# end def bench_band_lookup
+
+def bench_band_enrich (args) :
+    """ Set band from freq for all records of a log file with
+        args.records records (use -r 1000000 for a million records)
+        with Bandplan.enrich compared to looking up each record. The
+        frequencies of the synthetic log are random between 1.8 and
+        29.7 MHz, so many of them are flagged as out of band. Both
+        start with a freshly parsed ADIF_Mmap.
+    """
+    text = synthetic_adif (args.records * 200)
+    plan = bandplan.bandplans ['IARU-R1']
+    with tempfile.NamedTemporaryFile ('w', suffix = '.adi') as tmp :
+        tmp.write (text)
+        tmp.flush ()
+        del text
+        def records () :
+            with io.open (tmp.name, 'rb') as f :
+                return adif.ADIF_Mmap (f).records [:args.records]
+        r_new = records ()
+        s     = plan.enrich (r_new, overwrite = True)
+        print ( "enrich:     %7.2fs %d records %10.0f records/s %d out of band"
+              % ( s ['seconds'], s ['records'], s ['records_per_sec']
+                , len (s ['out_of_band'])
+                )
+              )
+        if not args.no_compare :
+            r_old = records ()
+            def single () :
+                out = []
+                for r in r_old :
+                    b = plan.lookup (float (r.freq) * 1e6)
+                    if b is None :
+                        out.append (r)
+                    else :
+                        r.set_fields (dict (band = b.name))
+                return out
+            t, out = timed (single)
+            print ("per record: %7.2fs" % t)
+            assert [r.dict for r in r_new] == [r.dict for r in r_old]
+            assert [r.lineno for r in s ['out_of_band']] \
+                == [r.lineno for r in out]
+            print ("Speedup: %.1f" % (t / s ['seconds']))
+# end def bench_band_enrich
+
+def bench_cty_dxcc (args) :
+    """ DXCC lookup of args.calls callsigns via CTY with the LRU cache
+        compared to no cache. This models a spot stream: 90% of the
+        callsigns are from a pool of 3000.
+    """
+    cd    = CTY_DXCC ()
+    calls = synthetic_callsigns \
+        (cd.cty, args.calls, pool = 3000, repeat = .9)
+    t_lru, r_lru = timed (lambda : [cd.callsign_lookup (c) for c in calls])
+    s = cd.cache.stats ()
+    print ( "LRU cache: %7.2fs %d calls, hit rate %.2f, %d evictions"
+          % (t_lru, len (calls), s ['hit_rate'], s ['evictions'])
+          )
+    if not args.no_compare :
+        cd = CTY_DXCC (cache_size = 0)
+        t_no, r_no = timed (lambda : [cd.callsign_lookup (c) for c in calls])
+        print ("no cache:  %7.2fs" % t_no)
+        codes = lambda r : [[e.code for e in l] for l in r]
+        assert codes (r_no) == codes (r_lru)
+        print ("Speedup: %.1f" % (t_no / t_lru))
+# end def bench_cty_dxcc
+
+def bench_cty_resolve (args) :
+    """ Set dxcc, cqz, ituz and cont of all records of a log with
+        CTY_DXCC.resolve compared to looking up each record, the log
+        has QSOs with args.records / 5 different calls. With more
+        than one worker the calls are also resolved in a process pool.
+    """
+    text = synthetic_adif (args.records * 200, calls = args.records // 5)
+    a    = adif.ADIF (io.StringIO (text))
+    del text
+    cd   = CTY_DXCC (cache_size = 0)
+    s    = cd.resolve (a)
+    print ( "resolve:    %7.2fs %d records %d calls %10.0f records/s"
+          % (s ['seconds'], s ['records'], s ['calls'], s ['records_per_sec'])
+          )
+    if args.workers > 1 :
+        cd.min_pool = 0
+        w = cd.resolve (a, workers = args.workers, overwrite = True)
+        print ( "%2d workers: %7.2fs %25s %10.0f records/s"
+              % (args.workers, w ['seconds'], '', w ['records_per_sec'])
+              )
+    if not args.no_compare :
+        def single () :
+            for r in a.records :
+                e = cd.cty.lookup_full (r.call)
+                d = cd.callsign_lookup (r.call)
+                if e is not None :
+                    r.set_fields \
+                        ( dict
+                            ( dxcc = str (int (d [0].code))
+                            , cqz  = str (e.cq)
+                            , ituz = str (e.itu)
+                            , cont = e.continent
+                            )
+                        )
+        result = [r.dict for r in a.records]
+        t, x   = timed (single)
+        print ("per record: %7.2fs" % t)
+        assert result == [r.dict for r in a.records]
+        print ("Speedup: %.1f" % (t / s ['seconds']))
+# end def bench_cty_resolve
+
+def bench_cty_load (args) :
+    """ Load cty.dat from the cache compared to parsing it """
+    d = tempfile.mkdtemp ()
+    try :
+        CTY (CTY.data, cache_dir = d)
+        n = 20
+        t_cache, cty = timed \
+            (lambda : [CTY (CTY.data, cache_dir = d) for k in range (n)])
+        assert cty [-1].loaded_from_cache
+        print ("cached:  %7.2fms" % (t_cache / n * 1000))
+        if not args.no_compare :
+            def parse () :
+                for k in range (n) :
+                    cty = CTY.__new__ (CTY)
+                    cty.parse (CTY.data)
+                    cty.build_trie ()
+            t_parse, x = timed (parse)
+            print ("parse:   %7.2fms" % (t_parse / n * 1000))
+            print ("Speedup: %.1f" % (t_parse / t_cache))
+    finally :
+        shutil.rmtree (d)
+# end def bench_cty_load
+
+def bench_dxcc_load (args) :
+    """ Load the ARRL DXCC list from the cache compared to parsing it """
+    d = tempfile.mkdtemp ()
+    try :
+        DXCC_File (cache_dir = d).parse ()
+        n = 50
+        def load (cache_dir) :
+            for k in range (n) :
+                df = DXCC_File (cache_dir = cache_dir)
+                if cache_dir is None :
+                    df.cache_dir = None
+                df.parse ()
+            return df
+        t_cache, df = timed (load, d)
+        assert df.loaded_from_cache
+        print ("cached:  %7.2fms" % (t_cache / n * 1000))
+        if not args.no_compare :
+            t_parse, df = timed (load, None)
+            assert not df.loaded_from_cache
+            print ("parse:   %7.2fms" % (t_parse / n * 1000))
+            print ("Speedup: %.1f" % (t_parse / t_cache))
+    finally :
+        shutil.rmtree (d)
+# end def bench_dxcc_load
+
+def bench_cty_lookup (args) :
+    """ Country lookup of args.calls callsigns with the prefix trie,
+        one at a time and with lookup_many, compared to trying every
+        prefix length like previous versions did.
+    """
+    cty   = CTY (CTY.data)
+    calls = synthetic_callsigns (cty, args.calls)
+    def old_lookup (callsign) :
+        if callsign in cty.exact_callsign :
+            return cty.exact_callsign [callsign]
+        for n in reversed (range (cty.prf_max)) :
+            pfx = callsign [:n+1]
+            if pfx in cty.prefix :
+                return cty.prefix [pfx]
+    t_one, r_one   = timed (lambda : [cty.callsign_lookup (c) for c in calls])
+    t_many, r_many = timed (cty.lookup_many, calls)
+    t_full, r_full = timed (lambda : [cty.lookup_full (c) for c in calls])
+    print ("callsign_lookup: %7.2fs %d calls" % (t_one, len (calls)))
+    print ("lookup_many:     %7.2fs" % t_many)
+    print ("lookup_full:     %7.2fs" % t_full)
+    assert r_one == r_many
+    if not args.no_compare :
+        t_old, r_old = timed (lambda : [old_lookup (c) for c in calls])
+        print ("prefix slicing:  %7.2fs" % t_old)
+        assert r_old == r_one
+        print ( "Speedup: callsign_lookup %.1f, lookup_many %.1f"
+              % (t_old / t_one, t_old / t_many)
+              )
+# end def bench_cty_lookup
+
+def bench_adif_dates (args) :
+    """ Decode QSO_DATE/TIME_ON of the records to datetime and encode
+        them again as ADIF fields and in the default date format, with
+        adif_datetime/adif_strftime and with strptime/strftime.
+    """
+    text = synthetic_adif (args.records * 200)
+    a    = adif.ADIF (io.StringIO (text))
+    del text
+    dates = [(r.qso_date, r.time_on) for r in a.records [:args.records]]
+    fmts  = ('%Y%m%d', '%H%M%S', a.date_format)
+    def strp () :
+        return [strptime_adif (*d) for d in dates]
+    def fast () :
+        return [adif.adif_datetime (*d) for d in dates]
+    def strf (dts) :
+        return [dt.strftime (f) for dt in dts for f in fmts]
+    def fastf (dts) :
+        return [adif.adif_strftime (dt, f) for dt in dts for f in fmts]
+    t_dec, dts = timed (fast)
+    t_enc, s   = timed (fastf, dts)
+    print ( "adif_datetime:   %7.2fs adif_strftime: %7.2fs %d dates"
+          % (t_dec, t_enc, len (dts))
+          )
+    if not args.no_compare :
+        t_odec, odts = timed (strp)
+        t_oenc, o_s  = timed (strf, odts)
+        print ( "strptime:        %7.2fs strftime:      %7.2fs"
+              % (t_odec, t_oenc)
+              )
+        assert odts == dts and o_s == s
+        print ( "Speedup: decode %.1f, encode %.1f"
+              % (t_odec / t_dec, t_oenc / t_enc)
+              )
+# end def bench_adif_dates
+
+def bench_adif_sort (args) :
+    """ Sort records by date, the first sort parses and caches the
+        dates of the records, compared to converting the date for each
+        sort key like previous versions did.
+    """
+    text = synthetic_adif (args.records * 200)
+    a    = adif.ADIF (io.StringIO (text))
+    del text
+    records = a.records [:args.records]
+    fmt     = a.date_format
+    def old_key (r) :
+        return strptime_adif (r.qso_date, r.time_on).strftime (fmt)
+    if not args.no_compare :
+        t_old, s_old = timed (sorted, records, key = old_key)
+        print ("strptime key:    %7.2fs %d records" % (t_old, len (records)))
+    t_first, s_new = timed (sorted, records, key = a.date_key)
+    print ("first sort:      %7.2fs" % t_first)
+    t_cached, s_new = timed (sorted, records, key = a.date_key)
+    print ("cached sort:     %7.2fs" % t_cached)
+    for k in 'first', 'cached' :
+        t_fmt, dates = timed (lambda : [r.get_date () for r in s_new])
+        print ("%-6s get_date: %7.2fs" % (k, t_fmt))
+    if not args.no_compare :
+        assert s_old == s_new
+        print ( "Speedup: first %.1f, cached %.1f"
+              % (t_old / t_first, t_old / t_cached)
+              )
+# end def bench_adif_sort
+
+def bench_adif_tokenize (args) :
+    """ Tokenize a synthetic ADIF file (without header) in blocks with
+        the NumPy and the pure-Python tokenizer, then parse it with and
+        without the accelerated tokenizer
+    """
+    text = synthetic_adif (int (args.size * 1e6))
+    text = text [text.index ('<eoh>') + 5:].lstrip ()
+    size = len (text.encode ('utf-8'))
+    tokenizers = [tokenizer.accelerated]
+    if not args.no_compare :
+        tokenizers.append (tokenizer.tokenize_py)
+    block = adif.ADIF_Parse.token_window
+    for tok in tokenizers :
+        if tok is None :
+            print ("NumPy not available")
+            continue
+        def run () :
+            """ Tokenize blocks, continuing after the last end tag """
+            n = pos = 0
+            while pos < len (text) :
+                lt, name_end, start, end = tok (text, pos, pos + block) [0]
+                eor = [i for i, s in enumerate (start) if s == name_end [i] + 1]
+                if not eor :
+                    break
+                n  += eor [-1] + 1
+                pos = start [eor [-1]]
+            return n
+        t, n = timed (run)
+        print ( "%-16s %7.2fs %8.2f MB/s %d tags"
+              % (tok.__name__, t, size / t / 1e6, n)
+              )
+    default = adif.ADIF_Parse.__dict__ ['tokenizer']
+    try :
+        for tok in (tokenizer.accelerated, None) :
+            if tok is None and args.no_compare :
+                break
+            adif.ADIF_Parse.tokenizer = staticmethod (tok) if tok else None
+            t, a = timed (adif.ADIF, io.StringIO (text))
+            print ( "parse %-10s %7.2fs %8.2f MB/s %d records"
+                  % (tok.__name__ if tok else 'regex', t, size / t / 1e6
+                    , len (a.records)
+                    )
+                  )
+    finally :
+        adif.ADIF_Parse.tokenizer = default
+# end def bench_adif_tokenize
+
+def bench_locator (args) :
+    """ Encode args.calls random positions as 6-character Maidenhead
+        locators and decode them again with the batch functions
+        encode/decode, compared to one Maidenhead_Locator at a time.
+    """
+    rnd = random.Random (23)
+    lat = [rnd.uniform (-90, 90)   for k in range (args.calls)]
+    lon = [rnd.uniform (-180, 180) for k in range (args.calls)]
+    t_enc, locs = timed (encode, lat, lon, 3)
+    t_dec, pos  = timed (decode, locs)
+    print ( "encode:            %7.2fs decode:       %7.2fs %d positions"
+          % (t_enc, t_dec, len (locs))
+          )
+    if not args.no_compare :
+        ml = Maidenhead_Locator
+        t_oenc, o_locs = timed \
+            (lambda : [ml (*x).as_locator (3) for x in zip (lat, lon)])
+        t_odec, o_pos  = timed \
+            (lambda : [ml.from_locator (l) for l in o_locs])
+        print ( "as_locator:        %7.2fs from_locator: %7.2fs"
+              % (t_oenc, t_odec)
+              )
+        assert o_locs == locs
+        assert [p.lat for p in o_pos] == list (pos [0])
+        assert [p.lon for p in o_pos] == list (pos [1])
+        print ( "Speedup: encode %.1f, decode %.1f"
+              % (t_oenc / t_enc, t_odec / t_dec)
+              )
+# end def bench_locator
+
+def bench_locator_index (args) :
+    """ Find all of args.records stations in Europe within 300 km of
+        1000 random positions with Locator_Index, compared to computing
+        the distances to all stations for each query. Also reports
+        the throughput of haversine and vincenty distances.
+    """
+    rnd = random.Random (23)
+    n   = args.records
+    lat = [rnd.uniform (35, 70)  for k in range (n)]
+    lon = [rnd.uniform (-10, 40) for k in range (n)]
+    q   = [(rnd.uniform (35, 70), rnd.uniform (-10, 40)) for k in range (1000)]
+    t_build, idx = timed (Locator_Index, lat, lon)
+    t_idx, r_idx = timed \
+        (lambda : [[i for i, d in idx.within (a, o, 300)] for a, o in q])
+    print ( "index:       %7.2fs build %7.2fs %d stations %d queries"
+          % (t_idx, t_build, n, len (q))
+          )
+    for method in 'haversine', 'vincenty' :
+        t, d = timed (distance, q [0][0], q [0][1], idx.lat, idx.lon, method)
+        print ("%-12s %7.2fs %10.0f distances/s" % (method + ':', t, n / t))
+    if not args.no_compare :
+        def scan () :
+            r = []
+            for a, o in q :
+                d = distance (a, o, idx.lat, idx.lon)
+                if qth.numpy is None :
+                    r.append ([i for i in range (n) if d [i] <= 300])
+                else :
+                    r.append (qth.numpy.nonzero (d <= 300) [0].tolist ())
+            return r
+        t_scan, r_scan = timed (scan)
+        print ("full scan:   %7.2fs" % t_scan)
+        assert [sorted (r) for r in r_idx] == r_scan
+        print ("Speedup: %.1f" % (t_scan / t_idx))
+# end def bench_locator_index
+
+def main () :
+    benchmarks = dict \
+        ( (k [6:].replace ('_', '-'), v)
+          for k, v in globals ().items () if k.startswith ('bench_')
+        )
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "benchmark"
+        , help    = "Benchmark to run, one of %s" % ', '.join (benchmarks)
+        , nargs   = '+'
+        )
+    cmd.add_argument \
+        ( "-n", "--no-compare"
+        , help    = "Don't compare against the previous implementation"
+        , action  = 'store_true'
+        )
+    cmd.add_argument \
+        ( "-s", "--size"
+        , help    = "Size of synthetic input file in MB, default=%(default)s"
+        , type    = float
+        , default = 10.0
+        )
+    cmd.add_argument \
+        ( "-r", "--records"
+        , help    = "Number of records for record-based benchmarks,"
+                    " default=%(default)s"
+        , type    = int
+        , default = 100000
+        )
+    cmd.add_argument \
+        ( "-c", "--calls"
+        , help    = "Number of callsigns, frequencies or positions for"
+                    " lookup benchmarks, default=%(default)s"
+        , type    = int
+        , default = 1000000
+        )
+    cmd.add_argument \
+        ( "-w", "--workers"
+        , help    = "Maximum number of worker processes, default=%(default)s"
+        , type    = int
+        , default = os.cpu_count () or 1
+        )
+    args = cmd.parse_args ()
+    for b in args.benchmark :
+        if b not in benchmarks :
+            print ("Unknown benchmark: %s" % b, file = sys.stderr)
+            sys.exit (1)
+        print ("%s:" % b)
+        benchmarks [b] (args)
+# end def main
+
+if __name__ == '__main__' :
+    main ()
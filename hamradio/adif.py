@@ -29,28 +29,253 @@
 
 from __future__ import print_function
 
+import os
 import sys
 import io
-from datetime         import datetime
+import mmap
+import pickle
+import tempfile
+from array            import array
+from heapq            import merge
+from operator         import itemgetter, attrgetter
+from bisect           import bisect_left
+from datetime         import datetime, timedelta
+from re               import compile as rc
 from rsclib.autosuper import autosuper
 from gzip             import GzipFile
 from argparse         import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 
 class ADIF_Syntax_Error (RuntimeError)  : pass
 class ADIF_EOF          (Exception) : pass
 
+def adif_datetime (d, t = '0000') :
+    """ Convert ADIF date (YYYYMMDD) and time (HHMM or HHMMSS) to a
+        datetime. The fixed-width digits of the ADIF standard are
+        sliced directly, everything else is left to strptime with the
+        formats we always used, so the result (or the ValueError) is
+        the same as before.
+    >>> adif_datetime ('20200229', '235959')
+    datetime.datetime(2020, 2, 29, 23, 59, 59)
+    >>> adif_datetime ('20200101')
+    datetime.datetime(2020, 1, 1, 0, 0)
+    >>> adif_datetime ('2020011', '1200')
+    datetime.datetime(2020, 1, 1, 12, 0)
+    >>> adif_datetime ('20210229', '1200')
+    Traceback (most recent call last):
+    ValueError: day is out of range for month
+
+    Compare with strptime for random (mostly valid) dates and times:
+    >>> import random
+    >>> def strp (d, t) :
+    ...     s = '.'.join ((d, t))
+    ...     f = '%Y%m%d.%H%M%S' if len (s) > 13 else '%Y%m%d.%H%M'
+    ...     try :
+    ...         return datetime.strptime (s, f)
+    ...     except ValueError :
+    ...         return ValueError
+    >>> def fast (d, t) :
+    ...     try :
+    ...         return adif_datetime (d, t)
+    ...     except ValueError :
+    ...         return ValueError
+    >>> def rnd (n, hi) :
+    ...     return '%0*d' % (n, random.randint (0, hi))
+    >>> random.seed (23)
+    >>> bad = []
+    >>> for i in range (20000) :
+    ...     d = rnd (4, 2100) + rnd (2, 13) + rnd (2, 32)
+    ...     t = rnd (2, 24) + rnd (2, 60) + random.choice (('', rnd (2, 61)))
+    ...     if random.random () < .1 :
+    ...         d = d [:random.randint (0, 8)] + random.choice ('0 x.')
+    ...     if random.random () < .1 :
+    ...         t = t [:random.randint (0, 6)]
+    ...     if strp (d, t) != fast (d, t) :
+    ...         bad.append ((d, t))
+    >>> bad
+    []
+    """
+    if len (d) == 8 and len (t) in (4, 6) and not (d + t).strip (_digits) :
+        return datetime \
+            ( int (d [:4]),  int (d [4:6]),  int (d [6:])
+            , int (t [:2]),  int (t [2:4]),  int (t [4:] or 0)
+            )
+    s   = '.'.join ((d, t))
+    fmt = '%Y%m%d.%H%M'
+    if len (s) > 13 :
+        fmt = '%Y%m%d.%H%M%S'
+    return datetime.strptime (s, fmt)
+# end def adif_datetime
+
+_digits             = '0123456789'
+_strftime_codes     = dict \
+    ( Y = ('%04d', 'year'), m = ('%02d', 'month'),  d = ('%02d', 'day')
+    , H = ('%02d', 'hour'), M = ('%02d', 'minute'), S = ('%02d', 'second')
+    )
+_strftime_templates = {}
+
+def adif_strftime (dt, fmt) :
+    """ Format datetime dt like dt.strftime (fmt). Formats consisting
+        only of %Y, %m, %d, %H, %M, %S and literal text (this covers
+        the ADIF fields and all date formats used here) are converted
+        once to a %-template and an attrgetter for the needed fields,
+        other formats and years before 1000 (which strftime doesn't
+        pad) use strftime.
+    >>> dt = datetime (2020, 1, 2, 3, 4, 5)
+    >>> adif_strftime (dt, '%Y%m%d'), adif_strftime (dt, '%H%M%S')
+    ('20200102', '030405')
+    >>> adif_strftime (dt, '%Y-%m-%dT%H:%M:%S')
+    '2020-01-02T03:04:05'
+    >>> adif_strftime (dt, '%d.%m.%Y %%{}'), adif_strftime (dt, '%b')
+    ('02.01.2020 %{}', 'Jan')
+    >>> import random
+    >>> random.seed (42)
+    >>> fmts = ('%Y%m%d', '%H%M', '%Y-%m-%d.%H:%M:%S', '%S', 'x%S%%', '')
+    >>> bad = []
+    >>> for i in range (5000) :
+    ...     dt = datetime \\
+    ...         ( random.randint (1, 9999), random.randint (1, 12)
+    ...         , random.randint (1, 28),   random.randint (0, 23)
+    ...         , random.randint (0, 59),   random.randint (0, 59)
+    ...         )
+    ...     for f in fmts :
+    ...         if adif_strftime (dt, f) != dt.strftime (f) :
+    ...             bad.append ((dt, f))
+    >>> bad
+    []
+    """
+    try :
+        tpl = _strftime_templates [fmt]
+    except KeyError :
+        parts  = fmt.split ('%')
+        tpl    = [parts [0]]
+        fields = []
+        for p in parts [1:] :
+            if not p or p [0] not in _strftime_codes :
+                tpl = None
+                break
+            f, name = _strftime_codes [p [0]]
+            tpl.append (f + p [1:])
+            fields.append (name)
+        if tpl is not None and fields :
+            tpl = (''.join (tpl), attrgetter (*fields))
+        else :
+            tpl = None
+        _strftime_templates [fmt] = tpl
+    if tpl is None or dt.year < 1000 :
+        return dt.strftime (fmt)
+    f, get = tpl
+    return f % get (dt)
+# end def adif_strftime
+
+class ADIF_Reader (autosuper) :
+    """ Buffered reader for the ADIF parser: We read large blocks from
+        the underlying file and let the parser scan the buffer with
+        str.find and compiled regexes instead of reading one character
+        at a time. Data already consumed by the parser (everything
+        before pos) is dropped when the next block is read.
+    """
+
+    blocksize = 1024 * 1024
+
+    def __init__ (self, fd, blocksize = None) :
+        self.__super.__init__ ()
+        self.fd  = fd
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        # Tokens of the buffer, see ADIF_Parse._get_tags_tokens: the
+        # buffer position they start at, index of the next tag, tag
+        # names and values and if more tokens follow after the window
+        self.tokens     = None
+        self.tok_pos    = None
+        self.tok_idx    = 0
+        self.tok_names  = None
+        self.tok_values = None
+        self.tok_more   = False
+        if blocksize :
+            self.blocksize = blocksize
+    # end def __init__
+
+    def fill (self, need = 0) :
+        """ Read the next block, need is the number of characters
+            after pos we want in the buffer. Return False at end of file.
+        """
+        if self.eof :
+            return False
+        n    = max (self.blocksize, need - (len (self.buf) - self.pos))
+        data = self.fd.read (n)
+        if not data :
+            self.eof = True
+            return False
+        self.buf = self.buf [self.pos:] + data
+        self.pos = 0
+        self.tokens = None
+        return True
+    # end def fill
+
+    def peek (self) :
+        if self.pos >= len (self.buf) :
+            self.fill ()
+        return self.buf [self.pos:self.pos + 1]
+    # end def peek
+
+    def read (self, n = -1) :
+        """ Compatibility with file objects, reads n characters or the
+            rest of the file if n is negative.
+        """
+        while n < 0 or len (self.buf) - self.pos < n :
+            if not self.fill (n) :
+                break
+        end = len (self.buf)
+        if n >= 0 :
+            end = min (end, self.pos + n)
+        r = self.buf [self.pos:end]
+        self.pos = end
+        return r
+    # end def read
+
+    def unread (self, s) :
+        """ Push back characters already read """
+        self.buf = s + self.buf [self.pos:]
+        self.pos = 0
+        self.tokens = None
+    # end def unread
+
+# end class ADIF_Reader
+
 class ADIF_Parse (autosuper) :
 
     # Default date format for date conversion, see date_cvt below
     date_format = '%Y-%m-%dT%H:%M:%S'
 
+    # Common case of a tag: optional whitespace followed by a tag with
+    # an optional numeric length. Everything else (data type in the
+    # length, end of buffer, syntax errors) is handled by _next_tag.
+    re_tag     = rc (r'(\s*)<([^:>]+)(?::(\d+))?>')
+    re_tag_end = rc (r'[:>]')
+    # Tags with their value (and anything following up to the next tag
+    # or newline) for _get_tags_fast
+    re_fields  = rc (r'<([^:>\n]+):(\d+)(?::[dD])?>([^<\n]*)')
+    re_endtags = {}
+    # Optional tokenizer for whole buffers, if None get_tags uses
+    # _get_tags_fast which is faster for parsing whole files. Set to
+    # staticmethod (hamradio.tokenizer.accelerated) to use the NumPy
+    # tokenizer, the tokenizer module (and NumPy) is only imported by
+    # callers doing so. The number of characters tokenized at once is
+    # token_window, this grows for large records.
+    tokenizer    = None
+    token_window = 64 * 1024
+
     def __init__ (self, fd, lineno = 1) :
         self.__super.__init__ ()
+        if fd is not None and not isinstance (fd, ADIF_Reader) :
+            fd = ADIF_Reader (fd)
         self.fd        = fd
         self.lineno    = lineno
         self.dict      = {}
         self.header    = None
-        self.unftag    = []
+        self.unftag    = ''
         self.head_tags = {}
     # end def __init__
 
@@ -58,143 +283,331 @@ class ADIF_Parse (autosuper) :
     def date_cvt (cls, d, t = '0000', date_format = None) :
         if not date_format :
             date_format = cls.date_format
-        s  = '.'.join ((d, t))
-        fmt = '%Y%m%d.%H%M'
-        if len (s) > 13 :
-            fmt = '%Y%m%d.%H%M%S'
-        dt = datetime.strptime (s, fmt)
-        return dt.strftime (date_format)
+        return adif_strftime (cls.date_parse (d, t), date_format)
     # end def date_cvt
 
+    @classmethod
+    def date_parse (cls, d, t = '0000') :
+        """ Convert ADIF date and time to datetime """
+        return adif_datetime (d, t)
+    # end def date_parse
+
     def get_header (self, endtag = 'eoh', firstchar = None) :
         endtag = endtag.lower ()
         head   = []
-        state  = 'text'
+        fd     = self.fd
         if firstchar is not None :
-            c = firstchar
-        else :
-            c = self.fd.read (1)
-        while (c) :
-            if state == 'text' :
-                if c == '<' :
-                    try :
-                        for k, v in self.get_tag (firstchar = c, stop = True) :
-                            if k == endtag :
-                                self.header = ''.join (head).strip ()
-                                return
-                            else :
-                                self.head_tags [k] = v
-                    except ADIF_Syntax_Error :
-                        self.head.extend (self.unftag)
-                        self.unftag = []
-                else :
-                    head.append (c)
-            else :
-                assert 0
-            c = self.fd.read (1)
+            fd.unread (firstchar)
+        while True :
+            idx = fd.buf.find ('<', fd.pos)
+            if idx < 0 :
+                head.append (fd.buf [fd.pos:])
+                fd.pos = len (fd.buf)
+                if not fd.fill () :
+                    return
+                continue
+            head.append (fd.buf [fd.pos:idx])
+            fd.pos = idx
+            try :
+                for k, v in self.get_tag (stop = True) :
+                    if k == endtag :
+                        self.header = ''.join (head).strip ()
+                        return
+                    else :
+                        self.head_tags [k] = v
+            except ADIF_Syntax_Error :
+                head.append (self.unftag)
     # end def get_header
 
-    def get_mode (self) :
-        if 'app_lotw_mode' in self :
-            mode = self.app_lotw_mode
-        else :
-            mode = self.mode
-        return mode
-    # end def get_mode
-
     def get_tags (self, endtag, firstchar = None) :
+        if firstchar is None :
+            if self.tokenizer :
+                if self._get_tags_tokens (endtag) :
+                    return
+            elif self._get_tags_fast (endtag) :
+                return
         for k, v in self.get_tag (firstchar = firstchar) :
             firstchar = None
-            if k.lower () == endtag :
+            if k == endtag :
                 if v :
                     raise ADIF_Syntax_Error \
                         ("%s: Invalid %s" % (self.lineno, endtag))
                 return
             else :
-                self.dict [k.lower ()] = v
+                self.dict [k] = v
     # end def get_tags
 
-    def get_tag (self, firstchar = None, stop = False) :
-        count  = 0
-        tag    = []
-        value  = []
-        state  = 'start'
-        self.unftag = []
+    def _get_tags_fast (self, endtag) :
+        """ Fast path of get_tags: Find the end tag and parse all tags
+            up to there with a single findall. This only succeeds for
+            well-formed records: Each '<' must start a tag with a
+            length, no newlines in tags or values (newlines between
+            tags are counted for the line number) and no value may
+            extend beyond the next '<'. Returns False if the record
+            needs to be parsed by get_tag, nothing is consumed then.
+        """
+        fd = self.fd
+        if endtag not in self.re_endtags :
+            self.re_endtags [endtag] = rc ('(?i)<%s>' % endtag)
+        search = self.re_endtags [endtag].search
+        while True :
+            m = search (fd.buf, fd.pos)
+            if m or not fd.fill () :
+                break
+        if not m :
+            return False
+        seg  = fd.buf [fd.pos:m.start ()]
+        tags = self.re_fields.findall (seg)
+        if len (tags) != seg.count ('<') :
+            return False
+        # Only white space is allowed before the first tag
+        lead = seg [:seg.find ('<')] if tags else seg
+        if lead.strip () :
+            return False
+        d = {}
+        for tag, count, value in tags :
+            count = int (count)
+            # A zero-length value swallows the next character
+            if len (value) < (count or 1) :
+                return False
+            d [tag.lower ()] = value [:count]
+        if endtag in d :
+            return False
+        self.dict.update (d)
+        self.lineno += seg.count ('\n')
+        fd.pos = m.end ()
+        return True
+    # end def _get_tags_fast
+
+    def _get_tags_tokens (self, endtag) :
+        r""" Like _get_tags_fast but using the tokens of the whole
+            buffer computed by tokenizer, a record accepted here gives
+            the same result as parsing it with get_tag. The tokens are
+            kept in the reader and used for the following records until
+            the buffer changes or a record was parsed by the slow path.
+        >>> from hamradio.tokenizer import tokenize_py, accelerated
+        >>> class Parse (ADIF_Parse) :
+        ...     tokenizer = staticmethod (tokenize_py)
+        >>> p = Parse (io.StringIO ('<call:6>OE3RSU x\n<eor> <a:1>b <eor>'))
+        >>> p._get_tags_tokens ('eor'), p.dict, p.lineno, p.fd.pos
+        (True, {'call': 'OE3RSU'}, 2, 22)
+        >>> p._get_tags_tokens ('eor'), p.dict, p.fd.pos
+        (True, {'call': 'OE3RSU', 'a': 'b'}, 35)
+        >>> p._get_tags_tokens ('eor'), p.fd.pos
+        (False, 35)
 
+        Compare with the pure-Python parser on random input:
+        >>> import random
+        >>> def parse (text, tokenizer) :
+        ...     t = ADIF_Parse.__dict__ ['tokenizer']
+        ...     ADIF_Parse.tokenizer = staticmethod (tokenizer)
+        ...     try :
+        ...         a = ADIF (io.StringIO (text))
+        ...         return [(r.dict, r.lineno) for r in a], a.eofmark
+        ...     except (ADIF_Syntax_Error, ValueError) as err :
+        ...         return repr (err)
+        ...     finally :
+        ...         ADIF_Parse.tokenizer = t
+        >>> pieces = ['<call:6>OE3RSU', '<eor>', '<EOR>\n', ' ', 'x', '\n',
+        ...     '<x:0>', '<d:8:d>20200101', '<a:b>', '<n:2>\n', '<', '>',
+        ...     '<t:3>a<b', '<c:5>J\xfcrg ', '<c:7>ab<eor>c', '<e:0>']
+        >>> random.seed (23)
+        >>> for i in range (300) :
+        ...     s = ''.join (random.choice (pieces) for k in range (20))
+        ...     r = parse (s, None)
+        ...     assert parse (s, tokenize_py) == r, s
+        ...     assert parse (s, accelerated or tokenize_py) == r, s
+        """
+        fd = self.fd
+        window = self.token_window
+        while True :
+            if fd.tokens is None or fd.tok_pos != fd.pos :
+                buf  = fd.buf
+                stop = min (fd.pos + window, len (buf))
+                fd.tokens, fd.tok_more = self.tokenizer (buf, fd.pos, stop)
+                fd.tok_more = fd.tok_more and (stop < len (buf) or not fd.eof)
+                fd.tok_idx  = 0
+                fd.tok_pos  = fd.pos
+                names = values = []
+                lt, name_end, start, end = fd.tokens
+                if lt :
+                    lt     = map ((1).__add__, lt)
+                    names  = map (buf.__getitem__, map (slice, lt, name_end))
+                    values = map (buf.__getitem__, map (slice, start, end))
+                    # Names can't contain a newline: Lowercase all at once
+                    names  = '\n'.join (names).lower ().split ('\n')
+                fd.tok_names  = names
+                fd.tok_values = list (values)
+            names = fd.tok_names
+            try :
+                i = names.index (endtag, fd.tok_idx)
+            except ValueError :
+                i = -1
+            if i >= 0 :
+                lt, name_end, start = (t [i] for t in fd.tokens [:3])
+                # The end tag must not have a length
+                if start != name_end + 1 :
+                    return False
+                self.dict.update \
+                    (zip (names [fd.tok_idx:i], fd.tok_values [fd.tok_idx:i]))
+                self.lineno += fd.buf.count ('\n', fd.pos, lt)
+                fd.pos = fd.tok_pos = start
+                fd.tok_idx = i + 1
+                return True
+            if not fd.tok_more :
+                return False
+            # Record not complete in the tokens: Tokenize the next window
+            # starting with this record, if the record is larger than
+            # the window we use a larger one or read more data.
+            if not fd.tok_idx :
+                if fd.pos + window < len (fd.buf) :
+                    window *= 2
+                elif not fd.fill () :
+                    return False
+            fd.tokens = None
+    # end def _get_tags_tokens
+
+    def get_tag (self, firstchar = None, stop = False) :
+        """ Yield (tag, value) pairs from the input, tags are converted
+            to lowercase, tags without a length yield an empty value.
+            White space where a tag is expected is skipped (and counted
+            for the line number), after a value anything up to the next
+            tag is ignored. With stop set we return after one tag.
+        """
+        fd    = self.fd
+        match = self.re_tag.match
+        state = 'start'
+        self.unftag = ''
         if firstchar is not None :
-            c = firstchar
-        else :
-            c = self.fd.read (1)
-        while (c) :
-            self.unftag.append (c)
-            if state == 'start' or state == 'skip' :
-                c = c.lower ()
-                # Be tolerant and allow white space where we expect a tag
-                if c.isspace () :
-                    if c == '\n' :
-                        self.lineno += 1
-                elif c == '<' :
-                    state = 'tag'
-                elif state != 'skip' :
-                    raise ADIF_Syntax_Error \
-                        ('%s: Expected tag start, got %s' % (self.lineno, c))
-            elif state == 'tag' :
-                c = c.lower ()
-                if c == '>' or c == ':' :
-                    if len (tag) == 0 :
-                        raise ADIF_Syntax_Error ('%s: Empty tag' % self.lineno)
-                    tag   = ''.join (tag)
-                    state = 'length'
-                    if c == '>' :
-                        yield ''.join (tag), ''
-                        tag   = []
-                        value = []
-                        state = 'start'
-                        if stop :
-                            return
+            fd.unread (firstchar)
+        while True :
+            buf = fd.buf
+            m   = match (buf, fd.pos)
+            r   = None
+            if m :
+                count = m.group (3)
+                end   = m.end ()
+                if count is None :
+                    r     = m.group (2).lower (), ''
+                    state = 'start'
                 else :
-                    tag.append (c)
-            elif state == 'length' :
-                if c == '>' :
-                    v = ''.join (value)
-                    try :
-                        count = int (v)
-                    except ValueError :
-                        c1, c2 = v.split (':', 1)
-                        if c2.lower () in ('d',) :
-                            count = int (c1)
-                        else :
-                            # TQ8 has some weirdness for SIGN_LOTW_V1.0 tag
-                            try :
-                                count = int (c1)
-                                c2    = int (c2)
-                            except ValueError :
-                                raise ADIF_Syntax_Error \
-                                    ( '%s: Invalid count: %s'
-                                    % (self.lineno, ''.join (value))
-                                    )
-                    value = []
-                    state = 'value'
-                else :
-                    value.append (c)
-            elif state == 'value' :
-                if count :
-                    value.append (c)
-                    count -= 1
-                if count == 0 :
-                    value = ''.join (value)
-                    yield (tag, value)
-                    tag   = []
-                    value = []
-                    state = 'skip'
-                    if stop :
-                        state = 'start'
-                        return
+                    count = int (count)
+                    # A zero-length value swallows the next character
+                    if end + (count or 1) <= len (buf) :
+                        r     = m.group (2).lower (), buf [end:end + count]
+                        end  += count or 1
+                        state = 'skip'
+            if r :
+                self.lineno += buf.count ('\n', fd.pos, m.start (2))
+                fd.pos = end
             else :
-                assert (0)
-            c = self.fd.read (1)
+                r = self._next_tag (state)
+                if r is None :
+                    return
+                state = r [2]
+                r     = r [:2]
+            yield r
+            if stop :
+                return
     # end def get_tag
 
+    def _next_tag (self, state) :
+        """ Slow path of get_tag if the regex in the fast path did not
+            match: This handles tags crossing the end of the buffer,
+            end of file and syntax errors. Returns None at end of file,
+            an incomplete tag at the end of the file is dropped.
+            Otherwise returns tag, value and the new state.
+        """
+        fd = self.fd
+        while True :
+            idx = fd.buf.find ('<', fd.pos)
+            if idx >= 0 or not fd.fill () :
+                break
+        end  = idx if idx >= 0 else len (fd.buf)
+        skip = fd.buf [fd.pos:end]
+        if state == 'start' and skip.strip () :
+            off = len (skip) - len (skip.lstrip ())
+            self.lineno += skip.count ('\n', 0, off)
+            self.unftag  = skip [:off + 1]
+            fd.pos      += off + 1
+            raise ADIF_Syntax_Error \
+                ( '%s: Expected tag start, got %s'
+                % (self.lineno, skip [off].lower ())
+                )
+        self.lineno += skip.count ('\n')
+        fd.pos = end
+        if idx < 0 :
+            return None
+        # From here on fd.pos is the start of the tag, offsets are
+        # relative to fd.pos because reading may shift the buffer.
+        while True :
+            m = self.re_tag_end.search (fd.buf, fd.pos + 1)
+            if m or not fd.fill () :
+                break
+        if not m :
+            self._skip_to_eof ()
+            return None
+        tag = fd.buf [fd.pos + 1:m.start ()].lower ()
+        if not tag :
+            self.unftag = fd.buf [fd.pos:m.end ()]
+            fd.pos      = m.end ()
+            raise ADIF_Syntax_Error ('%s: Empty tag' % self.lineno)
+        if m.group (0) == '>' :
+            fd.pos = m.end ()
+            return tag, '', 'start'
+        lstart = m.end () - fd.pos
+        while True :
+            idx = fd.buf.find ('>', fd.pos + lstart)
+            if idx >= 0 :
+                break
+            if not fd.fill () :
+                self._skip_to_eof ()
+                return None
+        spec        = fd.buf [fd.pos + lstart:idx]
+        self.unftag = fd.buf [fd.pos:idx + 1]
+        fd.pos      = idx + 1
+        count       = self._count (spec)
+        # A zero-length value swallows the next character
+        need        = count or 1
+        while count >= 0 and len (fd.buf) - fd.pos < need :
+            if not fd.fill (need) :
+                break
+        if count < 0 or len (fd.buf) - fd.pos < need :
+            self._skip_to_eof ()
+            return None
+        value   = fd.buf [fd.pos:fd.pos + count]
+        fd.pos += need
+        return tag, value, 'skip'
+    # end def _next_tag
+
+    def _skip_to_eof (self) :
+        fd = self.fd
+        fd.pos = len (fd.buf)
+        while fd.fill () :
+            fd.pos = len (fd.buf)
+    # end def _skip_to_eof
+
+    def _count (self, v) :
+        """ Compute length from the length part of a tag, this may
+            contain a data type after a colon.
+        """
+        try :
+            count = int (v)
+        except ValueError :
+            c1, c2 = v.split (':', 1)
+            if c2.lower () in ('d',) :
+                count = int (c1)
+            else :
+                # TQ8 has some weirdness for SIGN_LOTW_V1.0 tag
+                try :
+                    count = int (c1)
+                    c2    = int (c2)
+                except ValueError :
+                    raise ADIF_Syntax_Error \
+                        ('%s: Invalid count: %s' % (self.lineno, v))
+        return count
+    # end def _count
+
     def set_date_format (self, format) :
         self.date_format = format
     # end def set_date_format
@@ -212,13 +625,16 @@ class ADIF_Parse (autosuper) :
 
 # end class ADIF_Parse
 
-class ADIF_Record (ADIF_Parse) :
-    """ Represents a QSO record in ADIF format
-        Common fields: BAND, CALL, FREQ, MODE, QSO_DATE, RST_RCVD,
-        RST_SENT, TIME_OFF, TIME_ON, GRIDSQUARE
-        all converted to lowercase.
+class ADIF_Record_Mixin (object) :
+    """ Methods common to all QSO record types, field access goes
+        through _field, _has_field and _field_names.
     """
 
+    __slots__ = ()
+
+    # Cache of get_datetime and formatted dates
+    _dates = None
+
     cabrillo_fields  = \
         [ 'frqint:5'
         , 'mode:2'
@@ -231,17 +647,6 @@ class ADIF_Record (ADIF_Parse) :
         , 'gridsquare:4'
         ]
 
-    def __init__ (self, adif, fd, lineno, end_tag = 'eor', firstchar = None) :
-        """ consume one record from fd """
-        self.__super.__init__ (fd, lineno)
-        self.end_tag  = end_tag
-        self.adif     = adif
-        self.fd       = fd
-        self.get_tags (self.end_tag, firstchar = firstchar)
-        if not self.dict :
-            raise ADIF_EOF
-    # end def __init__
-
     def as_cabrillo (self, fields = None) :
         x = fields or self.cabrillo_fields
         fields = []
@@ -255,14 +660,69 @@ class ADIF_Record (ADIF_Parse) :
         return ' '.join (r)
     # end def as_cabrillo
 
+    def field (self, name, default = None) :
+        """ Value of a field in this record, unlike item access this
+            does not compute fields or fall back to the ADIF file.
+        """
+        try :
+            return self._field (name.lower ())
+        except KeyError :
+            return default
+    # end def field
+
+    def get_datetime (self, which = 'on') :
+        r""" Return QSO start ('on', from QSO_DATE and TIME_ON), QSO end
+            ('off', from QSO_DATE_OFF and TIME_OFF) or the QSL received
+            date ('rdate', from QSLRDATE) as a datetime. The end and
+            received date are None if not in the record. The result is
+            computed once and cached in the record.
+        >>> adif = ADIF (io.StringIO
+        ...     ('<qso_date:8>20200101 <time_on:4>1200 <qslrdate:8>20200202'
+        ...      ' <eor>'))
+        >>> r = adif.records [0]
+        >>> r.get_datetime (), r.get_datetime ('off'), r.get_qsl_rdate ()
+        (datetime.datetime(2020, 1, 1, 12, 0), None, '2020-02-02T00:00:00')
+        >>> r.get_date (), r.get_date ('%Y%m%d') , r.get_date ()
+        ('2020-01-01T12:00:00', '20200101', '2020-01-01T12:00:00')
+        >>> len ([k for k in r._dates if isinstance (k, tuple)])
+        3
+        """
+        dates = self._dates
+        if dates is None :
+            dates = self._dates = {}
+        if which not in dates :
+            dt = None
+            if which == 'on' :
+                dt = ADIF_Parse.date_parse (self.qso_date, self.time_on)
+            elif which == 'off' :
+                if 'qso_date_off' in self and 'time_off' in self :
+                    dt = ADIF_Parse.date_parse \
+                        (self.qso_date_off, self.time_off)
+            elif which == 'rdate' :
+                if 'qslrdate' in self :
+                    dt = ADIF_Parse.date_parse (self.qslrdate)
+            else :
+                raise ValueError ("Invalid date: %s" % which)
+            dates [which] = dt
+        return dates [which]
+    # end def get_datetime
+
+    def _format_date (self, which, date_fmt) :
+        """ Format date from get_datetime, memoised per format """
+        if date_fmt is None :
+            date_fmt = self.adif.date_format
+        dt  = self.get_datetime (which)
+        key = (which, date_fmt)
+        if key not in self._dates :
+            self._dates [key] = dt and adif_strftime (dt, date_fmt)
+        return self._dates [key]
+    # end def _format_date
+
     def get_date (self, date_fmt = None) :
         """ Return the date of the record computed from QSO_DATE and
             TIME_ON.
         """
-        if date_fmt is None :
-            date_fmt = self.adif.date_format
-        return self.date_cvt \
-            (self.qso_date, self.time_on, date_format = date_fmt)
+        return self._format_date ('on', date_fmt)
     # end def get_date
     get_date_on = get_date
 
@@ -270,43 +730,47 @@ class ADIF_Record (ADIF_Parse) :
         """ Return the date of the record computed from QSO_DATE_OFF and
             TIME_OFF.
         """
-        if date_fmt is None :
-            date_fmt = self.adif.date_format
-        if 'qso_date_off' in self and 'time_off' in self :
-            return self.date_cvt \
-                (self.qso_date_off, self.time_off, date_format = date_fmt)
+        return self._format_date ('off', date_fmt)
     # end def get_date
 
+    def get_mode (self) :
+        if 'app_lotw_mode' in self :
+            mode = self.app_lotw_mode
+        else :
+            mode = self.mode
+        return mode
+    # end def get_mode
+
     def get_qsl_rdate (self, date_fmt = None) :
         """ Return the date of the record computed from QSLRDATE.
         """
-        if date_fmt is None :
-            date_fmt = self.adif.date_format
-        if 'qslrdate' in self :
-            return self.date_cvt (self.qslrdate, date_format = date_fmt)
+        return self._format_date ('rdate', date_fmt)
     # end def get_qsl_rdate
 
     def __getitem__ (self, name) :
         n = name.lower ()
         if n == 'frqint' :
-            return str (int (float (self.dict ['freq']) * 1000 + 0.5))
+            return str (int (float (self._field ('freq')) * 1000 + 0.5))
         elif n == 'mode' and self.adif.modemap :
             return self.adif.modemap.get \
-                ( self.dict ['mode']
-                , self.adif.modemap.get ('default', self.dict ['mode'])
+                ( self._field ('mode')
+                , self.adif.modemap.get ('default', self._field ('mode'))
                 )
         elif n == 'isodate' :
-            dt = datetime.strptime (self.dict ['qso_date'], '%Y%m%d')
-            return dt.strftime ('%Y-%m-%d')
+            dt = adif_datetime (self._field ('qso_date'))
+            return adif_strftime (dt, '%Y-%m-%d')
         try :
             if n == 'time_off' and n not in self :
-                return self.__super.__getitem__ ('time_on')
-            return self.__super.__getitem__ (n)
+                return self._field ('time_on')
+            return self._field (n)
         except KeyError :
             return self.adif [n]
     # end def __getitem__
 
     def __getattr__ (self, name) :
+        # Don't look up special methods (e.g. for pickle) in the fields
+        if name.startswith ('__') :
+            raise AttributeError (name)
         try :
             return self [name]
         except KeyError as msg :
@@ -319,13 +783,13 @@ class ADIF_Record (ADIF_Parse) :
             return True
         if n == 'mode' and self.adif.modemap :
             return True
-        return self.__super.has_key (n) or self.adif.has_key (n)
+        return self._has_field (n) or self.adif.has_key (n)
     # end def __contains__
     has_key = __contains__
 
     def __str__ (self) :
         r = []
-        for k in sorted (self.dict) :
+        for k in sorted (self._field_names ()) :
             v = self [k]
             if v is not None :
                 r.append ('<%s:%d>%s' % (k, len (v), v))
@@ -335,52 +799,410 @@ class ADIF_Record (ADIF_Parse) :
     __unicode__ = __str__
     __repr__ = __str__
 
+# end class ADIF_Record_Mixin
+
+class ADIF_Record (ADIF_Record_Mixin, ADIF_Parse) :
+    """ Represents a QSO record in ADIF format
+        Common fields: BAND, CALL, FREQ, MODE, QSO_DATE, RST_RCVD,
+        RST_SENT, TIME_OFF, TIME_ON, GRIDSQUARE
+        all converted to lowercase.
+    """
+
+    def __init__ (self, adif, fd, lineno, end_tag = 'eor', firstchar = None) :
+        """ consume one record from fd """
+        self.__super.__init__ (fd, lineno)
+        self.end_tag  = end_tag
+        self.adif     = adif
+        self.get_tags (self.end_tag, firstchar = firstchar)
+        if not self.dict :
+            raise ADIF_EOF
+    # end def __init__
+
+    def _field (self, name) :
+        return self.dict [name]
+    # end def _field
+
+    def _field_names (self) :
+        return self.dict.keys ()
+    # end def _field_names
+
+    def _has_field (self, name) :
+        return name in self.dict
+    # end def _has_field
+
+    def set_fields (self, fields) :
+        """ Add or replace fields from a dictionary (with lowercase
+            names), this invalidates the cached dates.
+        """
+        self.dict.update (fields)
+        self._dates = None
+    # end def set_fields
+
 # end class ADIF_Record
 
+class ADIF_Schema (object) :
+    """ Field layouts shared by the compact records of one ADIF file:
+        Records with the same fields (in the same order) share one
+        dictionary mapping the interned field name to the index of the
+        value in the record. Short values are interned, too.
+    """
+
+    def __init__ (self) :
+        self.layouts = {}
+    # end def __init__
+
+    # Values up to this length (band, mode, dates, RST...) are interned
+    intern_len = 8
+
+    def layout (self, names) :
+        """ Get layout for the given tuple of field names """
+        try :
+            return self.layouts [names]
+        except KeyError :
+            pass
+        l = dict ((sys.intern (n), i) for i, n in enumerate (names))
+        self.layouts [tuple (l)] = l
+        return l
+    # end def layout
+
+    def values (self, values) :
+        """ Tuple of values for a record, short values are interned
+            since these are repeated in many records.
+        """
+        n = self.intern_len
+        return tuple (sys.intern (v) if len (v) <= n else v for v in values)
+    # end def values
+
+# end class ADIF_Schema
+
+class ADIF_Compact_Record (ADIF_Record_Mixin) :
+    r""" QSO record with much lower memory footprint than ADIF_Record:
+        Only the values are stored (as a tuple) in the record, the
+        field names are kept in a layout shared with other records of
+        the same ADIF file, see ADIF_Schema. Use with
+        ADIF (fd, record_class = ADIF_Compact_Record).
+    >>> f = io.StringIO ('<call:6>OE3RSU <mode:3>FT8 <eor>\n'
+    ...     '<call:5>DL1AB <mode:2>CW <eor>\n')
+    >>> adif = ADIF (f, record_class = ADIF_Compact_Record)
+    >>> r1, r2 = adif.records
+    >>> r1.call, r2 ['MODE'], 'mode' in r2, 'band' in r2, r2.dict
+    ('OE3RSU', 'CW', True, False, {'call': 'DL1AB', 'mode': 'CW'})
+    >>> r1.layout is r2.layout
+    True
+    """
+
+    __slots__ = ('adif', 'layout', 'values', 'lineno', '_dates')
+
+    def __init__ (self, adif, fd, lineno, end_tag = 'eor', firstchar = None) :
+        """ consume one record from fd """
+        parser = adif.record_parser (fd)
+        parser.lineno = lineno
+        parser.dict   = d = {}
+        parser.get_tags (end_tag, firstchar = firstchar)
+        if not d :
+            raise ADIF_EOF
+        self.adif   = adif
+        self.lineno = parser.lineno
+        self.layout = adif.schema.layout (tuple (d))
+        self.values = adif.schema.values (d.values ())
+        self._dates = None
+    # end def __init__
+
+    @classmethod
+    def from_values (cls, adif, layout, values, lineno) :
+        """ Create record from already parsed layout and values """
+        self = cls.__new__ (cls)
+        self.adif   = adif
+        self.layout = layout
+        self.values = values
+        self.lineno = lineno
+        self._dates = None
+        return self
+    # end def from_values
+
+    @property
+    def dict (self) :
+        return dict (zip (self.layout, self.values))
+    # end def dict
+
+    def _field (self, name) :
+        return self.values [self.layout [name]]
+    # end def _field
+
+    def _field_names (self) :
+        return self.layout.keys ()
+    # end def _field_names
+
+    def _has_field (self, name) :
+        return name in self.layout
+    # end def _has_field
+
+    def set_fields (self, fields) :
+        r""" Add or replace fields from a dictionary (with lowercase
+            names), the record gets a new layout if fields are added.
+            This invalidates the cached dates.
+        >>> f = io.StringIO ('<call:6>OE3RSU <qso_date:8>20200101'
+        ...     ' <time_on:4>1200 <eor>\n')
+        >>> r = ADIF (f, record_class = ADIF_Compact_Record).records [0]
+        >>> r.get_date ('%Y%m%d')
+        '20200101'
+        >>> r.set_fields (dict (dxcc = '206', qso_date = '20210101'))
+        >>> r.dxcc, r.qso_date, r.get_date ('%Y%m%d'), len (r.layout)
+        ('206', '20210101', '20210101', 4)
+        """
+        d = self.dict
+        d.update (fields)
+        schema = self.adif.schema
+        if len (d) != len (self.layout) :
+            self.layout = schema.layout (tuple (d))
+        self.values = schema.values (d.values ())
+        self._dates = None
+    # end def set_fields
+
+# end class ADIF_Compact_Record
+
+class ADIF_Index (autosuper) :
+    r""" Secondary indexes for the records of an ADIF object: Records
+        by callsign and QSO start truncated to the minute (which is how
+        logbook sites and the database compare QSOs), by band, by mode
+        and submode and a list of records sorted by start time for
+        date range queries. Records without a valid QSO date are only
+        indexed by band and mode, the band and mode indexes are built
+        on first use. The index reflects the records at the time it
+        was built, see ADIF.get_index.
+    >>> f = io.StringIO ('<eoh>\n'
+    ...     '<call:5>DL1AB <qso_date:8>20200101 <time_on:6>120030'
+    ...     ' <band:3>20M <mode:3>FT8 <eor>\n'
+    ...     '<call:5>DL1AB <qso_date:8>20200101 <time_on:4>1203'
+    ...     ' <band:3>40m <mode:4>MFSK <submode:3>FT4 <eor>\n'
+    ...     '<call:6>OE3RSU <qso_date:8>20200102 <time_on:4>0000'
+    ...     ' <band:3>20m <mode:2>CW <eor>\n'
+    ...     '<call:6>OE3RSU <band:3>20m <eor>\n')
+    >>> idx = ADIF (f).get_index ()
+    >>> def calls (records) :
+    ...     return [(r.call, r.field ('time_on')) for r in records]
+    >>> calls (idx.find ('DL1AB', datetime (2020, 1, 1, 12, 0, 59)))
+    [('DL1AB', '120030')]
+    >>> calls (idx.find ('DL1AB', datetime (2020, 1, 1, 12, 1)))
+    []
+    >>> calls (idx.find ('DL1AB', datetime (2020, 1, 1, 12, 2), fuzzy = 5))
+    [('DL1AB', '1203'), ('DL1AB', '120030')]
+    >>> calls (idx.band ('20M'))
+    [('DL1AB', '120030'), ('OE3RSU', '0000'), ('OE3RSU', None)]
+    >>> calls (idx.mode ('mfsk', 'ft4')), calls (idx.mode ('MFSK'))
+    ([('DL1AB', '1203')], [('DL1AB', '1203')])
+    >>> calls (idx.date_range (datetime (2020, 1, 1, 12, 1)))
+    [('DL1AB', '1203'), ('OE3RSU', '0000')]
+    >>> calls (idx.date_range (end = datetime (2020, 1, 1, 12, 3)))
+    [('DL1AB', '120030')]
+    """
+
+    def __init__ (self, adif, records = None) :
+        self.__super.__init__ ()
+        if records is None :
+            records = adif.records
+        self.records        = records
+        self.by_call_minute = {}
+        self._by_band       = None
+        self._by_mode       = None
+        dated = []
+        for r in records :
+            try :
+                dt = r.get_datetime ()
+            except (AttributeError, KeyError, ValueError) :
+                continue
+            dated.append ((dt, len (dated), r))
+            call = r.field ('call') or adif.dict.get ('call')
+            if call :
+                key = (call, dt.replace (second = 0))
+                self.by_call_minute.setdefault (key, []).append (r)
+        dated.sort (key = itemgetter (0, 1))
+        self.starts  = [d [0] for d in dated]
+        self.by_date = [d [2] for d in dated]
+    # end def __init__
+
+    @property
+    def by_band (self) :
+        """ Records by lowercase band, built on first use """
+        if self._by_band is None :
+            self._by_band = {}
+            for r in self.records :
+                band = r.field ('band')
+                if band :
+                    self._by_band.setdefault (band.lower (), []).append (r)
+        return self._by_band
+    # end def by_band
+
+    @property
+    def by_mode (self) :
+        """ Records by uppercase (mode, submode), built on first use """
+        if self._by_mode is None :
+            self._by_mode = {}
+            for r in self.records :
+                mode = r.field ('app_lotw_mode') or r.field ('mode')
+                if mode :
+                    sm  = r.field ('submode') or ''
+                    key = (mode.upper (), sm.upper ())
+                    self._by_mode.setdefault (key, []).append (r)
+        return self._by_mode
+    # end def by_mode
+
+    def find (self, call, dt, fuzzy = 0) :
+        """ Records of call with a start in the same minute as datetime
+            dt. With fuzzy > 0 we also return records up to fuzzy
+            minutes before or after dt, nearest first.
+        """
+        minute = dt.replace (second = 0, microsecond = 0)
+        result = list (self.by_call_minute.get ((call, minute), ()))
+        for n in range (1, fuzzy + 1) :
+            for d in (-n, n) :
+                key = (call, minute + timedelta (minutes = d))
+                result.extend (self.by_call_minute.get (key, ()))
+        return result
+    # end def find
+
+    def band (self, band) :
+        """ Records on band (case insensitive) """
+        return self.by_band.get (band.lower (), [])
+    # end def band
+
+    def mode (self, mode, submode = None) :
+        """ Records with the given mode (and submode if given) """
+        mode = mode.upper ()
+        if submode is not None :
+            return self.by_mode.get ((mode, submode.upper ()), [])
+        result = []
+        for (m, sm), records in self.by_mode.items () :
+            if m == mode :
+                result.extend (records)
+        return result
+    # end def mode
+
+    def date_range (self, start = None, end = None) :
+        """ Records with start <= QSO start < end sorted by date, start
+            and end are datetimes, each can be None for an open range.
+        """
+        lo = 0
+        hi = len (self.starts)
+        if start is not None :
+            lo = bisect_left (self.starts, start)
+        if end is not None :
+            hi = bisect_left (self.starts, end)
+        return self.by_date [lo:hi]
+    # end def date_range
+
+# end class ADIF_Index
+
 class ADIF (ADIF_Parse) :
+    r""" Parse an ADIF file, records are in .records and indexed by
+        callsign in .by_call.
+    >>> f = io.StringIO ('Log\n<adif_ver:5>3.1.0\n<eoh>\n'
+    ...     '<call:6>OE3RSU <mode:3>FT8\n<eor>\n'
+    ...     '<CALL:5>DL1AB <MODE:2>CW <EOR>\n')
+    >>> adif = ADIF (f)
+    >>> adif.header, adif.head_tags
+    ('Log', {'adif_ver': '3.1.0'})
+    >>> [(r.call, r.mode) for r in adif]
+    [('OE3RSU', 'FT8'), ('DL1AB', 'CW')]
+    >>> ADIF (io.StringIO ('<call:6>OE3RSU <eor>\n x'))
+    Traceback (most recent call last):
+    ...
+    hamradio.adif.ADIF_Syntax_Error: 2: Expected tag start, got x
+    """
 
-    modemap = {}
+    modemap      = {}
+    record_class = ADIF_Record
 
-    def __init__ (self, fd = None, lineno = 1, callsign = None, ** kw) :
+    def __init__ \
+        ( self
+        , fd           = None
+        , lineno       = 1
+        , callsign     = None
+        , record_class = None
+        , ** kw
+        ) :
         self.__super.__init__ (fd, lineno)
         self.eofmark  = None
         self.callsign = callsign
+        self.schema   = ADIF_Schema ()
+        self.parser   = None
+        if record_class :
+            self.record_class = record_class
         self.dict.update (kw)
         if callsign :
             self.dict ['own_call'] = callsign
         self.by_call  = {}
         self.records  = []
+        self.index    = None
         if fd is not None :
-            c1 = fd.read (1)
-            if c1 != '<' :
-                self.get_header (firstchar = c1)
-                c1 = None
-            while (1) :
-                try :
-                    r = ADIF_Record (self, fd, self.lineno, firstchar = c1)
-                    self.records.append (r)
-                    if getattr (r, 'call', None) :
-                        if r.call not in self.by_call :
-                            self.by_call [r.call] = []
-                        self.by_call [r.call].append (r)
-                    c1 = None
-                except ADIF_EOF :
-                    break
-        if self.records :
-            last = self.records [-1]
-            key  = list (last.dict.keys ()) [0]
-            if len (last.dict) == 1 and 'eof' in key :
+            if self.fd.peek () != '<' :
+                self.get_header ()
+            self.read_records ()
+    # end def __init__
+
+    def record_parser (self, fd) :
+        """ Parser for record types that don't parse themselves """
+        if self.parser is None or self.parser.fd is not fd :
+            self.parser = ADIF_Parse (fd)
+        return self.parser
+    # end def record_parser
+
+    def iter_records (self) :
+        """ Parse records from the input and yield them one at a time.
+            A non-standard EOF mark (a last record consisting only of
+            an empty tag containing 'eof') is not returned, it is
+            stored in eofmark.
+        """
+        last = None
+        while (1) :
+            try :
+                r = self.parse_record ()
+            except ADIF_EOF :
+                break
+            if last is not None :
+                yield last
+            last = r
+        if last is not None :
+            keys = list (last._field_names ())
+            key  = keys [0]
+            if len (keys) == 1 and 'eof' in key :
                 assert len (last [key]) == 0
                 self.eofmark = key
-                del self.records [-1]
-    # end def __init__
+            else :
+                yield last
+    # end def iter_records
+
+    def parse_record (self) :
+        """ Parse the next record, raises ADIF_EOF at end of file """
+        return self.record_class (self, self.fd, self.lineno)
+    # end def parse_record
+
+    def read_records (self) :
+        for r in self.iter_records () :
+            self.records.append (r)
+            call = r.field ('call') or self.dict.get ('call')
+            if call :
+                if call not in self.by_call :
+                    self.by_call [call] = []
+                self.by_call [call].append (r)
+    # end def read_records
 
     def append (self, adif_record) :
         self.records.append (adif_record)
-        self.by_call [adif_record.call] = adif_record
+        self.by_call.setdefault (adif_record.call, []).append (adif_record)
         adif_record.adif = self
+        self.index = None
     # end def append
 
+    def get_index (self) :
+        """ Secondary indexes of the records, see ADIF_Index. The index
+            is built on first use and rebuilt after append.
+        """
+        if self.index is None :
+            self.index = ADIF_Index (self)
+        return self.index
+    # end def get_index
+
     def as_cabrillo (self, fields = None, cabrillo = (), **kw) :
         s = []
         for k in cabrillo :
@@ -401,14 +1223,68 @@ class ADIF (ADIF_Parse) :
         self.modemap = modemap
     # end def set_modemap
 
-    def __str__ (self) :
-        r = []
+    def date_key (self, record) :
+        """ Default sort key for output """
+        return record.get_datetime ()
+    # end def date_key
+
+    def sorted_text (self, key = None) :
+        """ Generate the formatted records sorted by key """
+        for rec in sorted (self, key = key or self.date_key) :
+            yield str (rec)
+    # end def sorted_text
+
+    def write (self, fd, sort = True, key = None) :
+        r""" Write the ADIF to the file object fd in the same format as
+            str, records are formatted and written one at a time.
+            Unless sort is False the records are sorted by key, the
+            default is the date of the record.
+        >>> f = io.StringIO ('Log <eoh>\n'
+        ...     '<call:5>DL1AB <qso_date:8>20200102 <time_on:4>1200 <eor>\n'
+        ...     '<call:6>OE3RSU <qso_date:8>20200101 <time_on:4>1200 <eor>')
+        >>> adif = ADIF (f)
+        >>> out = io.StringIO ()
+        >>> adif.write (out)
+        >>> out.getvalue () == str (adif)
+        True
+        >>> print (out.getvalue ())
+        Log
+        <BLANKLINE>
+        <eoh>
+        <BLANKLINE>
+        <call:6>OE3RSU
+        <qso_date:8>20200101
+        <time_on:4>1200
+        <eor>
+        <BLANKLINE>
+        <call:5>DL1AB
+        <qso_date:8>20200102
+        <time_on:4>1200
+        <eor>
+        >>> out = io.StringIO ()
+        >>> adif.write (out, sort = False)
+        >>> out.getvalue ().split ('\n') [4]
+        '<call:5>DL1AB'
+        """
+        sep = ''
         if self.header :
-            r.append (self.header)
-            r.append ('<eoh>')
-        for rec in sorted (self.records, key = lambda x: x.get_date ()) :
-            r.append (str (rec))
-        return '\n\n'.join (r)
+            fd.write (self.header)
+            fd.write ('\n\n<eoh>')
+            sep = '\n\n'
+        if sort :
+            records = self.sorted_text (key)
+        else :
+            records = (str (rec) for rec in self)
+        for rec in records :
+            fd.write (sep)
+            fd.write (rec)
+            sep = '\n\n'
+    # end def write
+
+    def __str__ (self) :
+        f = io.StringIO ()
+        self.write (f)
+        return f.getvalue ()
     # end def __str__
     __unicode__ = __str__
     __repr__ = __str__
@@ -420,9 +1296,503 @@ class ADIF (ADIF_Parse) :
 
 # end class ADIF
 
+class ADIF_Stream (ADIF) :
+    r""" Like ADIF but records are parsed while iterating over the
+        object, they are not kept in .records and there is no by_call
+        index. This allows processing large files in constant memory.
+        Since the input is consumed we can iterate only once, eofmark
+        is set after the iteration is finished.
+    >>> f = io.StringIO ('<call:6>OE3RSU <eor>\n<call:5>DL1AB <eor>\n'
+    ...     '<app_x_eof:0> <eor>')
+    >>> adif = ADIF_Stream (f)
+    >>> [r.call for r in adif], adif.records, adif.eofmark
+    (['OE3RSU', 'DL1AB'], [], 'app_x_eof')
+
+    When writing sorted output, runs of sort_run_size records are
+    sorted and merged from temporary files:
+    >>> f = io.StringIO (''.join ('<call:1>%s <eor>' % c for c in 'dbeac'))
+    >>> adif = ADIF_Stream (f)
+    >>> adif.sort_run_size = 2
+    >>> out = io.StringIO ()
+    >>> adif.write (out, key = lambda r: r.call)
+    >>> out.getvalue ().replace ('\n', '')
+    '<call:1>a<eor><call:1>b<eor><call:1>c<eor><call:1>d<eor><call:1>e<eor>'
+    """
+
+    sort_run_size = 100000
+
+    def read_records (self) :
+        pass
+    # end def read_records
+
+    def sorted_text (self, key = None) :
+        """ External sort: The records are not in memory, so we sort
+            runs of sort_run_size formatted records and merge them.
+        """
+        key  = key or self.date_key
+        runs = []
+        run  = []
+        try :
+            for rec in self :
+                run.append ((key (rec), str (rec)))
+                if len (run) >= self.sort_run_size :
+                    runs.append (self._write_run (run))
+                    run = []
+            run.sort (key = itemgetter (0))
+            if runs :
+                runs.append (self._write_run (run))
+                run = merge \
+                    (* (self._read_run (f) for f in runs), key = itemgetter (0))
+            for k, text in run :
+                yield text
+        finally :
+            for f in runs :
+                f.close ()
+    # end def sorted_text
+
+    def _write_run (self, run) :
+        run.sort (key = itemgetter (0))
+        f = tempfile.TemporaryFile ()
+        for item in run :
+            pickle.dump (item, f)
+        f.seek (0)
+        return f
+    # end def _write_run
+
+    def _read_run (self, f) :
+        while True :
+            try :
+                yield pickle.load (f)
+            except EOFError :
+                break
+    # end def _read_run
+
+    def __iter__ (self) :
+        return self.iter_records ()
+    # end def __iter__
+
+# end class ADIF_Stream
+
+class ADIF_Mmap_Record (ADIF_Compact_Record) :
+    """ Record of an ADIF_Mmap: The values are kept as start/end
+        offsets into the memory-mapped file and decoded when accessed.
+    """
+
+    __slots__ = ()
+
+    @property
+    def dict (self) :
+        return dict ((k, self._field (k)) for k in self.layout)
+    # end def dict
+
+    def _field (self, name) :
+        i = self.layout [name] * 2
+        v = self.values
+        return self.adif.mm [v [i]:v [i + 1]].decode (self.adif.encoding)
+    # end def _field
+
+    def set_fields (self, fields) :
+        """ Changed values are not in the file, the record is turned
+            into an ADIF_Compact_Record holding the decoded values.
+        """
+        mm, enc, v = self.adif.mm, self.adif.encoding, self.values
+        values = tuple \
+            (mm [v [i]:v [i + 1]].decode (enc) for i in range (0, len (v), 2))
+        self.__class__ = ADIF_Compact_Record
+        self.values    = values
+        self.set_fields (fields)
+    # end def set_fields
+
+# end class ADIF_Mmap_Record
+
+class ADIF_Mmap (ADIF) :
+    r""" ADIF parser for large files on disk: The file (which must be
+        opened in binary mode) is memory-mapped and scanned as bytes,
+        field values are only decoded when accessed, see
+        ADIF_Mmap_Record. Records that are not well-formed or contain
+        non-ASCII characters are decoded and parsed like in ADIF (these
+        become ADIF_Compact_Record instances), so the length of a value
+        is always counted in characters. The mapping is released by
+        close (or at the end of a with block), values of the records
+        can't be accessed afterwards.
+    >>> import tempfile
+    >>> with tempfile.TemporaryFile () as f :
+    ...     _ = f.write (b'Log <eoh>\n<call:6>OE3RSU <mode:3>FT8 <eor>\n'
+    ...         b'<call:5>DL1AB <name:4>J\xc3\xbcrg <eor>\n')
+    ...     _ = f.seek (0)
+    ...     adif = ADIF_Mmap (f)
+    >>> adif.header, [r.call for r in adif], adif.records [1].name
+    ('Log', ['OE3RSU', 'DL1AB'], 'J\xfcrg')
+    >>> [type (r).__name__ for r in adif]
+    ['ADIF_Mmap_Record', 'ADIF_Compact_Record']
+    >>> with adif :
+    ...     adif.records [0].mode
+    'FT8'
+    >>> adif.mm.closed
+    True
+    >>> adif.close ()
+    """
+
+    # Like ADIF_Parse.re_fields but for bytes and only ASCII in values
+    re_fields_b = rc \
+        (rb'<([^:>\n\x80-\xff]+):(\d+)(?::[dD])?>([^<\n\x80-\xff]*)')
+    re_eoh_b    = rc (rb'(?i)<eoh>')
+    re_eor_b    = rc (rb'(?i)<eor>')
+
+    def __init__ \
+        ( self
+        , fd
+        , encoding     = 'utf-8'
+        , lineno       = 1
+        , callsign     = None
+        , start        = None
+        , ** kw
+        ) :
+        """ If start is given, no header is parsed and no records are
+            read: The caller parses records from byte offset start
+            with parse_record, see ADIF_Parallel.
+        """
+        self.__super.__init__ (None, lineno, callsign, ** kw)
+        self.encoding = encoding
+        self.tagnames = {}
+        self.pos      = start or 0
+        try :
+            self.mm = mmap.mmap (fd.fileno (), 0, access = mmap.ACCESS_READ)
+        except ValueError :
+            # Empty file can't be mapped
+            self.mm = b''
+        if start is not None :
+            return
+        if self.mm [:1] != b'<' :
+            self.mmap_header ()
+        self.read_records ()
+    # end def __init__
+
+    def __enter__ (self) :
+        return self
+    # end def __enter__
+
+    def __exit__ (self, * exc) :
+        self.close ()
+    # end def __exit__
+
+    def close (self) :
+        """ Unmap the file, an empty file was never mapped """
+        if isinstance (self.mm, mmap.mmap) :
+            self.mm.close ()
+    # end def close
+
+    def _text_reader (self, regex) :
+        """ Generate readers for decoded parts of the file from pos up to
+            successive matches of regex, the last reader extends to the
+            end of the file.
+        """
+        end = self.pos
+        while True :
+            m   = regex.search (self.mm, end)
+            end = m.end () if m else len (self.mm)
+            text = self.mm [self.pos:end].decode (self.encoding)
+            fd   = ADIF_Reader (io.StringIO (text), blocksize = len (text) + 1)
+            yield fd, not m
+            if not m :
+                break
+    # end def _text_reader
+
+    def _consumed (self, fd) :
+        """ Advance pos by the part of the decoded text used by fd """
+        self.pos += len (fd.buf [:fd.pos].encode (self.encoding))
+    # end def _consumed
+
+    def mmap_header (self) :
+        lineno = self.lineno
+        for fd, last in self._text_reader (self.re_eoh_b) :
+            self.fd        = fd
+            self.lineno    = lineno
+            self.head_tags = {}
+            self.get_header ()
+            if self.header is not None or last :
+                break
+        self._consumed (fd)
+        self.fd = None
+    # end def mmap_header
+
+    def parse_record (self) :
+        m = self.re_eor_b.search (self.mm, self.pos)
+        if m :
+            r = self._parse_record_fast (m.start (), m.end ())
+            if r is not None :
+                return r
+        # Not well-formed: Parse decoded text, if the record is not
+        # complete in the text (e.g. a value contains '<eor>') we retry
+        # with the text up to the next '<eor>'.
+        for fd, last in self._text_reader (self.re_eor_b) :
+            try :
+                r = ADIF_Compact_Record (self, fd, self.lineno)
+            except ADIF_EOF :
+                if fd.eof and not last :
+                    continue
+                raise
+            if not fd.eof or last :
+                break
+        self._consumed (fd)
+        return r
+    # end def parse_record
+
+    def _parse_record_fast (self, end, next) :
+        """ Parse well-formed record between pos and end, see
+            ADIF_Parse._get_tags_fast. Returns None if this fails.
+        """
+        pos  = self.pos
+        seg  = self.mm [pos:end]
+        last = 0
+        d    = {}
+        for m in self.re_fields_b.finditer (seg) :
+            if not d and seg [:m.start ()].strip () :
+                return None
+            if seg.find (b'<', last, m.start ()) >= 0 :
+                return None
+            count = int (m.group (2))
+            start = m.start (3)
+            # A zero-length value swallows the next character
+            if m.end (3) - start < (count or 1) :
+                return None
+            tag = m.group (1)
+            if tag not in self.tagnames :
+                self.tagnames [tag] = sys.intern (tag.decode ('ascii').lower ())
+            d [self.tagnames [tag]] = (pos + start, pos + start + count)
+            last = m.end ()
+        if seg.find (b'<', last) >= 0 or not d and seg.strip () :
+            return None
+        if 'eor' in d :
+            return None
+        self.pos = next
+        if not d :
+            raise ADIF_EOF
+        spans  = array ('Q')
+        for v in d.values () :
+            spans.extend (v)
+        layout = self.schema.layout (tuple (d))
+        return ADIF_Mmap_Record.from_values \
+            (self, layout, spans, self.lineno + seg.count (b'\n'))
+    # end def _parse_record_fast
+
+# end class ADIF_Mmap
+
+def field_values (records, name, default = None) :
+    """ Values of field name of all records, like
+        [r.field (name, default) for r in records] but faster for
+        compact records: The index of the field is looked up once for
+        all records sharing a layout, values of ADIF_Mmap_Record are
+        sliced from the file directly.
+    >>> f = io.StringIO ('<call:6>OE3RSU <freq:6>14.074 <eor>'
+    ...     '<call:5>DL1AB <eor><freq:5>7.074 <call:4>K1AB <eor>')
+    >>> a = ADIF (f, record_class = ADIF_Compact_Record)
+    >>> field_values (a.records, 'FREQ'), field_values (a, 'band', '')
+    (['14.074', None, '7.074'], ['', '', ''])
+    >>> a = ADIF (io.StringIO (f.getvalue ()))
+    >>> field_values (a.records, 'freq')
+    ['14.074', None, '7.074']
+    """
+    name   = name.lower ()
+    index  = {}
+    result = []
+    append = result.append
+    for r in records :
+        cls = type (r)
+        if cls is not ADIF_Compact_Record and cls is not ADIF_Mmap_Record :
+            append (r.field (name, default))
+            continue
+        # Layouts are kept alive by the records, so the id is unique
+        layout = r.layout
+        try :
+            i = index [id (layout)]
+        except KeyError :
+            i = index [id (layout)] = layout.get (name)
+        if i is None :
+            append (default)
+        elif cls is ADIF_Compact_Record :
+            append (r.values [i])
+        else :
+            v = r.values
+            append (r.adif.mm [v [2 * i]:v [2 * i + 1]].decode (r.adif.encoding))
+    return result
+# end def field_values
+
+def parse_shard (filename, encoding, lineno, start, end) :
+    """ Parse the records of an ADIF file starting at byte offset start
+        up to end (the last record may extend beyond end). This runs in
+        a worker process of ADIF_Parallel, so only plain data is
+        returned: The layouts (tuples of field names), the records as
+        tuples (layout index, values, lineno, mapped), the byte offset
+        where parsing stopped, a flag if the end of the ADIF data was
+        reached and the syntax error encountered (if any).
+    """
+    layouts = {}
+    records = []
+    eof     = False
+    error   = None
+    with io.open (filename, 'rb') as f :
+        adif = ADIF_Mmap (f, encoding, lineno, start = start)
+    try :
+        while adif.pos < end :
+            r = adif.parse_record ()
+            if id (r.layout) not in layouts :
+                layouts [id (r.layout)] = (len (layouts), tuple (r.layout))
+            records.append \
+                ( ( layouts [id (r.layout)][0]
+                  , r.values
+                  , r.lineno
+                  , isinstance (r, ADIF_Mmap_Record)
+                  )
+                )
+    except ADIF_EOF :
+        eof = True
+    except ADIF_Syntax_Error as err :
+        error = err
+    finally :
+        adif.close ()
+    layouts = [names for idx, names in sorted (layouts.values ())]
+    return layouts, records, adif.pos, eof, error
+# end def parse_shard
+
+class ADIF_Parallel (ADIF_Mmap) :
+    r""" Parse a large ADIF file in several worker processes: The file
+        is split into shards at '<eor>' tags, each shard is parsed by
+        parse_shard in a process pool and the results are merged in
+        file order, so records, by_call and line numbers are the same
+        as with ADIF_Mmap. The records refer to the memory-mapped file
+        of the ADIF_Parallel object. Since an '<eor>' may also occur
+        inside a value (with a length-prefixed tag) the start of each
+        shard is verified: It must be the position where parsing of the
+        previous shard stopped. Otherwise the records after the false
+        boundary are parsed sequentially until a verified shard start
+        is reached. Syntax errors are only raised if encountered in a
+        verified shard. Files smaller than min_shard are parsed
+        without a process pool.
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile () as f :
+    ...     _ = f.write (b'Log <eoh>\n<call:6>OE3RSU <eor>\n')
+    ...     _ = f.write (3 * b'<call:5>DL1AB <comment:9>x <eor> y <eor>\n'
+    ...         b'<call:5>DL1AB <mode:2>CW <eor>\n')
+    ...     f.flush ()
+    ...     adif = ADIF_Parallel (f.name, workers = 2, min_shard = 10)
+    ...     with io.open (f.name, 'rb') as f2 :
+    ...         mm = ADIF_Mmap (f2)
+    >>> [(r.dict, r.lineno) for r in adif] == [(r.dict, r.lineno) for r in mm]
+    True
+    >>> len (adif.records), len (adif.by_call ['DL1AB'])
+    (7, 6)
+    >>> adif.close (), mm.close ()
+    (None, None)
+    """
+
+    min_shard = 1024 * 1024
+
+    def __init__ \
+        ( self
+        , filename
+        , encoding     = 'utf-8'
+        , workers      = None
+        , lineno       = 1
+        , callsign     = None
+        , min_shard    = None
+        , ** kw
+        ) :
+        self.filename = filename
+        self.workers  = workers or os.cpu_count () or 1
+        self.merged   = None
+        if min_shard :
+            self.min_shard = min_shard
+        with io.open (filename, 'rb') as f :
+            self.__super.__init__ (f, encoding, lineno, callsign, ** kw)
+    # end def __init__
+
+    def shard_bounds (self) :
+        """ Split the file after the header into shards of roughly
+            equal size, each but the first starts after an '<eor>'.
+        """
+        start  = self.pos
+        size   = len (self.mm) - start
+        n      = min (self.workers * 4, size // self.min_shard)
+        bounds = [start]
+        for k in range (1, n) :
+            m = self.re_eor_b.search \
+                (self.mm, max (start + size * k // n, bounds [-1]))
+            if not m :
+                break
+            if m.end () > bounds [-1] :
+                bounds.append (m.end ())
+        bounds.append (len (self.mm))
+        return bounds
+    # end def shard_bounds
+
+    def merge_shards (self) :
+        """ Generate records of all shards in file order """
+        bounds = self.shard_bounds ()
+        n      = len (bounds) - 1
+        if n < 2 or self.workers < 2 :
+            n = 0
+        with ProcessPoolExecutor (self.workers) as executor :
+            shards = \
+                [ executor.submit
+                    ( parse_shard
+                    , self.filename, self.encoding, self.lineno
+                    , bounds [i], bounds [i + 1]
+                    )
+                  for i in range (n)
+                ]
+            i = 0
+            while True :
+                while i < n and bounds [i] < self.pos :
+                    shards [i].cancel ()
+                    i += 1
+                if i < n and bounds [i] == self.pos :
+                    layouts, records, pos, eof, error = shards [i].result ()
+                    for r in self.unshard (layouts, records) :
+                        yield r
+                    if error :
+                        raise error
+                    if eof :
+                        break
+                    self.pos = pos
+                    i += 1
+                    continue
+                # Shard boundary was not at a record start, continue
+                # sequentially up to the next boundary.
+                try :
+                    yield ADIF_Mmap.parse_record (self)
+                except ADIF_EOF :
+                    break
+            for s in shards :
+                s.cancel ()
+    # end def merge_shards
+
+    def unshard (self, layouts, records) :
+        layouts = [self.schema.layout (names) for names in layouts]
+        for idx, values, lineno, mapped in records :
+            if mapped :
+                yield ADIF_Mmap_Record.from_values \
+                    (self, layouts [idx], values, lineno)
+            else :
+                yield ADIF_Compact_Record.from_values \
+                    (self, layouts [idx], self.schema.values (values), lineno)
+    # end def unshard
+
+    def parse_record (self) :
+        if self.merged is None :
+            self.merged = self.merge_shards ()
+        try :
+            return next (self.merged)
+        except StopIteration :
+            raise ADIF_EOF
+    # end def parse_record
+
+# end class ADIF_Parallel
+
 class TQ8 (ADIF_Parse) :
     def __init__ (self, fd, lineno = 1, ** kw) :
-        fd = GzipFile (mode = 'r', fileobj = fd)
+        fd = io.TextIOWrapper \
+            (GzipFile (mode = 'r', fileobj = fd), encoding = 'utf-8')
         self.__super.__init__ (fd, lineno)
         self.get_tags ('eor')
         assert (self.dict ['Rec_Type'] == 'tCERT')
@@ -433,7 +1803,7 @@ class TQ8 (ADIF_Parse) :
         while (1) :
             try :
                 self.records.append \
-                    (ADIF_Record (self, fd, self.lineno, end_tag = 'eor'))
+                    (ADIF_Record (self, self.fd, self.lineno, end_tag = 'eor'))
             except ADIF_EOF :
                 break
     # end def __init__
@@ -473,12 +1843,38 @@ def main () :
         , help    = "Location name to use for some outputs"
         , default = 'OE3RSU'
         )
+    cmd.add_argument \
+        ( "-m", "--mmap"
+        , help    = "Memory-map the ADIF file, values are decoded on access"
+        , action  = 'store_true'
+        )
+    cmd.add_argument \
+        ( "-j", "--jobs"
+        , help    = "Parse memory-mapped ADIF file with this number of"
+                    " worker processes"
+        , type    = int
+        )
     args = cmd.parse_args ()
-    if args.adif :
-        f = io.open (args.adif, 'r', encoding = args.encoding)
+    if args.jobs :
+        if not args.adif :
+            cmd.error ("--jobs needs an ADIF file")
+        adif = ADIF_Parallel \
+            ( args.adif
+            , encoding = args.encoding
+            , workers  = args.jobs
+            , callsign = args.call
+            )
+    elif args.mmap :
+        if not args.adif :
+            cmd.error ("--mmap needs an ADIF file")
+        with io.open (args.adif, 'rb') as f :
+            adif = ADIF_Mmap (f, encoding = args.encoding, callsign = args.call)
     else :
-        f = sys.stdin
-    adif = ADIF (f, callsign = args.call)
+        if args.adif :
+            f = io.open (args.adif, 'r', encoding = args.encoding)
+        else :
+            f = sys.stdin
+        adif = ADIF (f, callsign = args.call)
     # For cabrillog output, not currently used
     d = {'START-OF-LOG' : '2.0'}
     print (adif.header)
@@ -489,7 +1885,10 @@ def main () :
         print ('Got non-standard EOF-mark: %s' % adif.eofmark)
     print ('<EOH>')
     #print (adif.records [-1])
-    print (adif)
+    adif.write (sys.stdout)
+    print ()
+    if isinstance (adif, ADIF_Mmap) :
+        adif.close ()
     #print (adif.as_cabrillo (cabrillo = d))
 # end def main
 
@@ -27,19 +27,61 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 # ****************************************************************************
 
+import io
+import os
 import sys
-from bisect import bisect_right
+from array     import array
+from bisect    import bisect_left, bisect_right
+from itertools import islice
+from time      import perf_counter
+from hamradio.adif import field_values
+try :
+    import numpy
+except ImportError :
+    numpy = None
 
-class Band :
+def mhz_to_hz (values) :
+    """ Convert ADIF frequencies (strings in MHz, None if missing) to
+        Hz, missing or invalid values become NaN which is outside all
+        bands. We round to mHz, otherwise e.g. 128.003 MHz would end up
+        a fraction of a Hz below 128003 kHz. With NumPy the common case
+        (all values valid) is converted in one go.
+    >>> mhz = ['128.003', None, '0.472', 'x', ' 7.1 ']
+    >>> [float (f) for f in mhz_to_hz (mhz)]
+    [128003000.0, nan, 472000.0, nan, 7100000.0]
+    >>> import hamradio.bandplan as bp
+    >>> np, bp.numpy = bp.numpy, None
+    >>> mhz_to_hz (mhz)
+    [128003000.0, nan, 472000.0, nan, 7100000.0]
+    >>> bp.numpy = np
+    """
+    if numpy is None :
+        return [round (_float (v) * 1e6, 3) for v in values]
+    try :
+        f = numpy.array (['nan' if v is None else v for v in values], float)
+    except ValueError :
+        f = numpy.array ([_float (v) for v in values], float)
+    return numpy.round (f * 1e6, 3)
+# end def mhz_to_hz
+
+def _float (v) :
+    try :
+        return float (v)
+    except (TypeError, ValueError) :
+        return float ('nan')
+# end def _float
+
+class Frequency_Range :
+    """ Closed frequency range f_start-f_end in Hz """
 
-    def __init__ (self, bandplan, name, f_start, f_end) :
-        self.name    = name
+    def __init__ (self, f_start, f_end) :
+        if f_start > f_end :
+            raise ValueError ('Invalid range: %s-%s' % (f_start, f_end))
         self.f_start = f_start
         self.f_end   = f_end
-        self.plan    = bandplan
     # end def __init__
 
-    def __str__ (self) :
+    def format_range (self) :
         if self.f_start > 1e9 :
             range = '%.3f GHz-%.3f GHz' % (self.f_start / 1e9, self.f_end / 1e9)
         elif self.f_start > 1e6 :
@@ -48,50 +90,430 @@ class Band :
             range = '%.3f kHz-%.3f kHz' % (self.f_start / 1e3, self.f_end / 1e3)
         else :
             range = '%.3f Hz-%.3f Hz' % (self.f_start, self.f_end)
-        return 'Band %s %s' % (self.name, range)
-    # end def __str__
-    __repr__ = __str__
+        return range
+    # end def format_range
+
+    def __contains__ (self, frq) :
+        return self.f_start <= frq <= self.f_end
+    # end def __contains__
 
     def __lt__ (self, other) :
         return self.f_start < other.f_start
     # end def __lt__
 
-# end class Band
+# end class Frequency_Range
 
 class Overlap_Error (ValueError) :
     """ This is raised if an inserted band overlaps an existing one
     """
     pass
 
-class Bandplan :
+class Intervals :
+    """ Sorted Frequency_Range objects that don't overlap, adjacent
+        ranges may share an edge (a frequency on the edge belongs to
+        the upper range). The edges are kept in arrays parallel to the
+        ranges, so point and range queries are bisections in O(log n)
+        without creating objects.
+    >>> iv = Intervals ()
+    >>> iv.extend ([Frequency_Range (30, 40), Frequency_Range (10, 20)])
+    >>> iv.insert (Frequency_Range (20, 30))
+    >>> [(r.f_start, r.f_end) for r in iv.items]
+    [(10, 20), (20, 30), (30, 40)]
+    >>> iv.lookup_idx (20), iv.lookup_idx (40), iv.lookup_idx (41)
+    (1, 2, -1)
+    >>> [r.f_start for r in iv.overlapping (15, 25)]
+    [10, 20]
+    >>> [r.f_start for r in iv.overlapping (0, 5)]
+    []
+    >>> iv.insert (Frequency_Range (35, 50))
+    Traceback (most recent call last):
+    ...
+    hamradio.bandplan.Overlap_Error: 30.000 Hz-40.000 Hz overlaps 35.000 Hz-50.000 Hz
+    >>> iv.extend ([Frequency_Range (5, 11), Frequency_Range (39, 45)])
+    Traceback (most recent call last):
+    ...
+    hamradio.bandplan.Overlap_Error: 5.000 Hz-11.000 Hz overlaps 10.000 Hz-20.000 Hz
+    30.000 Hz-40.000 Hz overlaps 39.000 Hz-45.000 Hz
+    """
+
+    def __init__ (self) :
+        self.items   = []
+        self.f_start = array ('d')
+        self.f_end   = array ('d')
+        self.arrays  = None
+    # end def __init__
+
+    def __len__ (self) :
+        return len (self.items)
+    # end def __len__
+
+    def __iter__ (self) :
+        return iter (self.items)
+    # end def __iter__
+
+    @staticmethod
+    def overlaps (items) :
+        """ Overlapping neighbours in a sorted list of ranges """
+        return [(a, b) for a, b in zip (items, items [1:]) if b.f_start < a.f_end]
+    # end def overlaps
+
+    def check (self, items) :
+        bad = self.overlaps (items)
+        if bad :
+            raise Overlap_Error \
+                ('\n'.join
+                    ( '%s overlaps %s' % (a.format_range (), b.format_range ())
+                      for a, b in bad
+                    )
+                )
+    # end def check
+
+    def insert (self, item) :
+        idx = bisect_right (self.f_start, item.f_start)
+        self.check (sorted (self.items [max (idx - 1, 0):idx + 1] + [item]))
+        self.items.insert   (idx, item)
+        self.f_start.insert (idx, item.f_start)
+        self.f_end.insert   (idx, item.f_end)
+        self.arrays = None
+    # end def insert
+
+    def extend (self, items) :
+        """ Insert many ranges, all overlaps are reported at once """
+        items = sorted (self.items + list (items))
+        self.check (items)
+        self.items [:] = items
+        self.f_start   = array ('d', (i.f_start for i in items))
+        self.f_end     = array ('d', (i.f_end   for i in items))
+        self.arrays    = None
+    # end def extend
+
+    def lookup_idx (self, frq) :
+        """ Index of the range containing frq in self.items or -1 """
+        idx = bisect_right (self.f_start, frq) - 1
+        if idx >= 0 and frq <= self.f_end [idx] :
+            return idx
+        return -1
+    # end def lookup_idx
+
+    def overlapping (self, f_lo, f_hi) :
+        """ Ranges overlapping f_lo-f_hi: Since the ranges don't
+            overlap the end frequencies are sorted, too.
+        """
+        lo = bisect_left  (self.f_end,   f_lo)
+        hi = bisect_right (self.f_start, f_hi)
+        return self.items [lo:hi]
+    # end def overlapping
+
+# end class Intervals
+
+class Band (Frequency_Range) :
+    """ A band of a Bandplan, optionally with a power limit (W) and
+        segments for different modes.
+    """
+
+    def __init__ (self, bandplan, name, f_start, f_end, power = None) :
+        Frequency_Range.__init__ (self, f_start, f_end)
+        self.name     = name
+        self.plan     = bandplan
+        self.power    = power
+        self.segments = Intervals ()
+    # end def __init__
+
+    def __str__ (self) :
+        return 'Band %s %s' % (self.name, self.format_range ())
+    # end def __str__
+    __repr__ = __str__
+
+    def add_segments (self, segments) :
+        """ Add segments, these must be inside the band and must not
+            overlap each other.
+        """
+        segments = list (segments)
+        outside  = \
+            [ s for s in segments
+              if s.f_start < self.f_start or s.f_end > self.f_end
+            ]
+        if outside :
+            raise Overlap_Error \
+                ( '\n'.join
+                    ('%s outside %s' % (s, self) for s in outside)
+                )
+        self.segments.extend (segments)
+    # end def add_segments
+
+    def add_segment (self, segment) :
+        self.add_segments ([segment])
+    # end def add_segment
+
+    def segment (self, frq) :
+        """ Segment containing frq or None """
+        idx = self.segments.lookup_idx (frq)
+        if idx >= 0 :
+            return self.segments.items [idx]
+    # end def segment
+
+# end class Band
+
+class Segment (Frequency_Range) :
+    """ Part of a band for a mode, optionally with maximum bandwidth
+        (Hz) and power limit (W).
+    """
+
+    def __init__ \
+        (self, band, mode, f_start, f_end, bandwidth = None, power = None) :
+        Frequency_Range.__init__ (self, f_start, f_end)
+        self.band      = band
+        self.mode      = mode
+        self.bandwidth = bandwidth
+        self.power     = power
+    # end def __init__
+
+    def __str__ (self) :
+        return 'Segment %s %s' % (self.mode, self.format_range ())
+    # end def __str__
+    __repr__ = __str__
+
+# end class Segment
+
+class Bandplan (Intervals) :
     """ Keep track of a set of Band objects.
         These typically constitute a national band plan.
+        The band edges are kept in arrays parallel to the bands for
+        lookups without creating objects, lookup_many uses NumPy if
+        installed.
     """
 
-    def __init__ (self) :
+    def __init__ (self, name = None, description = None) :
         """ This is kept sorted for a little faster lookup
         """
-        self.bands = []
+        Intervals.__init__ (self)
+        self.name        = name
+        self.description = description
     # end def __init__
 
+    @property
+    def bands (self) :
+        return self.items
+    # end def bands
+
     def add_band (self, band) :
-        idx = bisect_right (self.bands, band)
-        l   = len (self.bands)
-        if idx > 0 and idx < l and self.bands [idx].end > band.start :
-            raise Overlap_Error \
-                ('New band %s overlaps existing %s' % (band, self.bands [idx]))
-        self.bands.insert (idx, band)
+        """ Add a band, it must not overlap an existing band
+        >>> bp = Bandplan ()
+        >>> bp.add_band (Band (bp, '20m', 14.0e6, 14.35e6))
+        >>> bp.add_band (Band (bp, '40m',  7.0e6,  7.2e6))
+        >>> bp.add_band (Band (bp, 'x',   14.3e6, 14.4e6))
+        Traceback (most recent call last):
+        ...
+        hamradio.bandplan.Overlap_Error: 14.000 MHz-14.350 MHz overlaps 14.300 MHz-14.400 MHz
+        >>> bp.add_band (Band (bp, 'y',    6.9e6,  7.1e6))
+        Traceback (most recent call last):
+        ...
+        hamradio.bandplan.Overlap_Error: 6.900 MHz-7.100 MHz overlaps 7.000 MHz-7.200 MHz
+        >>> bp.bands
+        [Band 40m 7.000 MHz-7.200 MHz, Band 20m 14.000 MHz-14.350 MHz]
+        """
+        self.insert (band)
     # end def add_band
 
+    def add_bands (self, bands) :
+        """ Add many bands, all overlaps are reported at once """
+        self.extend (bands)
+    # end def add_bands
+
     def lookup (self, frq) :
-        b   = Band (None, 'dummy', frq, frq)
-        idx = bisect_right (self.bands, b) - 1
-        if idx < 0 :
-            return
-        entry = self.bands [idx]
-        if idx and entry.f_start <= frq <= entry.f_end :
-            return entry
-    # end def
+        """ Band containing frq (in Hz) or None
+        >>> bandplan_austria.lookup (14.074e6)
+        Band 20m 14.000 MHz-14.350 MHz
+        >>> bandplan_austria.lookup (136e3)
+        Band 2190m 135.700 kHz-137.800 kHz
+        >>> print (bandplan_austria.lookup (14.5e6))
+        None
+        """
+        idx = self.lookup_idx (frq)
+        if idx >= 0 :
+            return self.bands [idx]
+    # end def lookup
+
+    def lookup_many (self, freqs, index = False) :
+        """ Band names for a sequence of frequencies (in Hz), None for
+            frequencies outside all bands. With index set we return
+            the indices into self.bands (-1 if outside) instead.
+            With NumPy the whole batch is resolved with one
+            searchsorted call.
+        >>> bpa = bandplan_austria
+        >>> freqs = [14.074e6, 7.0e6, 1.0e6, 28e6, 440e6, 136e3, 1e10]
+        >>> bpa.lookup_many (freqs)
+        ['20m', '40m', None, '10m', '70cm', '2190m', None]
+        >>> [int (i) for i in bpa.lookup_many (freqs, index = True)]
+        [7, 5, -1, 11, 14, 0, -1]
+        >>> import random
+        >>> random.seed (4)
+        >>> freqs = [random.uniform (0, 500e6) for i in range (5000)]
+        >>> freqs.extend (b.f_start for b in bpa.bands)
+        >>> freqs.extend (b.f_end   for b in bpa.bands)
+        >>> names = [getattr (bpa.lookup (f), 'name', None) for f in freqs]
+        >>> bpa.lookup_many (freqs) == names
+        True
+        >>> empty = Bandplan ()
+        >>> empty.lookup_many ([1.0, 7e6])
+        [None, None]
+        >>> [int (i) for i in empty.lookup_many ([1.0], index = True)]
+        [-1]
+
+        Without NumPy:
+        >>> import hamradio.bandplan as bp
+        >>> np, bp.numpy = bp.numpy, None
+        >>> bpa.lookup_many (freqs) == names
+        True
+        >>> Bandplan ().lookup_many ([1.0, 7e6])
+        [None, None]
+        >>> bp.numpy = np
+        """
+        if numpy is None :
+            idx = array ('l', (self.lookup_idx (f) for f in freqs))
+            if index :
+                return idx
+            bands = self.bands
+            return [bands [i].name if i >= 0 else None for i in idx]
+        if self.arrays is None :
+            names = [b.name for b in self.bands] + [None]
+            self.arrays = \
+                ( numpy.array (self.f_start)
+                , numpy.array (self.f_end)
+                , numpy.array (names, dtype = object)
+                )
+        f_start, f_end, names = self.arrays
+        f   = numpy.asarray (freqs, dtype = float)
+        idx = numpy.searchsorted (f_start, f, side = 'right') - 1
+        if len (f_start) :
+            ok  = (idx >= 0) & (f <= f_end [numpy.maximum (idx, 0)])
+            idx = numpy.where (ok, idx, -1)
+        if index :
+            return idx
+        return names [idx].tolist ()
+    # end def lookup_many
+
+    # Frequency and band fields of ADIF records
+    enrich_fields = (('freq', 'band'), ('freq_rx', 'band_rx'))
+    enrich_chunk  = 65536
+
+    def _enrich (self, records, overwrite, stats) :
+        """ Set bands of a list of records, see enrich_records """
+        update  = {}
+        flagged = set ()
+        for fname, bname in self.enrich_fields :
+            values = field_values (records, fname)
+            if fname == 'freq' :
+                no_freq = values.count (None)
+            elif not any (values) :
+                continue
+            have  = None if overwrite else field_values (records, bname)
+            names = self.lookup_many (mhz_to_hz (values))
+            for i, v in enumerate (values) :
+                if v is None :
+                    continue
+                if names [i] is None :
+                    flagged.add (i)
+                elif not have or not have [i] :
+                    update.setdefault (i, {}) [bname] = names [i]
+        for i, fields in update.items () :
+            records [i].set_fields (fields)
+        stats ['records'] += len (records)
+        stats ['bands']   += len (update)
+        stats ['no_freq'] += no_freq
+        stats ['out_of_band'].extend (records [i] for i in sorted (flagged))
+    # end def _enrich
+
+    def enrich_records (self, records, overwrite = False, stats = None) :
+        """ Generate the records (any iterable, e.g. an ADIF_Stream)
+            with band and band_rx set from freq and freq_rx (in MHz).
+            The records are processed in chunks of enrich_chunk, the
+            frequencies of a chunk are converted and looked up in
+            batch. Existing bands are kept unless overwrite is set.
+            If given, stats (see enrich) is updated.
+        """
+        if stats is None :
+            stats = dict (records = 0, bands = 0, no_freq = 0, out_of_band = [])
+        it = iter (records)
+        while True :
+            chunk = list (islice (it, self.enrich_chunk))
+            if not chunk :
+                break
+            self._enrich (chunk, overwrite, stats)
+            for r in chunk :
+                yield r
+    # end def enrich_records
+
+    def enrich (self, adif, overwrite = False) :
+        """ Set the fields band and band_rx of all records of adif (an
+            ADIF object or any iterable of records) from freq and
+            freq_rx, see enrich_records. Records with a frequency
+            outside all bands of the plan are flagged: These are
+            returned in out_of_band of the resulting statistics which
+            also include the number of records with a band set, the
+            number of records without freq and the throughput.
+        >>> f = io.StringIO ('<freq:6>14.074 <eor>'
+        ...     '<freq:5>7.074 <band:3>30m <eor>'
+        ...     '<freq:6>10.136 <freq_rx:6>14.074 <eor>'
+        ...     '<call:5>DL1AB <eor><freq:6>14.500 <eor>')
+        >>> from hamradio.adif import ADIF, ADIF_Compact_Record
+        >>> adif = ADIF (f, record_class = ADIF_Compact_Record)
+        >>> s = bandplans ['IARU-R1'].enrich (adif)
+        >>> s ['records'], s ['bands'], s ['no_freq']
+        (5, 2, 1)
+        >>> [r.dict for r in s ['out_of_band']]
+        [{'freq': '14.500'}]
+        >>> [r.dict for r in adif.records [:3]]
+        ... # doctest: +NORMALIZE_WHITESPACE
+        [{'freq': '14.074', 'band': '20m'},
+         {'freq': '7.074', 'band': '30m'},
+         {'freq': '10.136', 'freq_rx': '14.074', 'band': '30m', 'band_rx': '20m'}]
+        >>> s = bandplans ['IARU-R1'].enrich (adif, overwrite = True)
+        >>> s ['bands'], adif.records [1].band, s ['records_per_sec'] > 0
+        (3, '40m', True)
+        """
+        start = perf_counter ()
+        stats = dict (records = 0, bands = 0, no_freq = 0, out_of_band = [])
+        for r in self.enrich_records (adif, overwrite, stats) :
+            pass
+        seconds = perf_counter () - start
+        stats ['seconds'] = seconds
+        stats ['records_per_sec'] = \
+            stats ['records'] / seconds if seconds else 0.0
+        return stats
+    # end def enrich
+
+    def segment (self, frq) :
+        """ Segment containing frq or None
+        >>> r1 = bandplans ['IARU-R1']
+        >>> r1.segment (14.074e6), r1.segment (14.074e6).bandwidth
+        (Segment DIGI 14.070 MHz-14.099 MHz, 500.0)
+        >>> print (r1.segment (14.5e6), bandplan_austria.segment (14.074e6))
+        None None
+        """
+        band = self.lookup (frq)
+        if band is not None :
+            return band.segment (frq)
+    # end def segment
+
+    def bands_in (self, f_lo, f_hi) :
+        """ Bands overlapping the frequency range f_lo-f_hi
+        >>> bandplan_austria.bands_in (10e6, 20e6)
+        [Band 30m 10.100 MHz-10.150 MHz, Band 20m 14.000 MHz-14.350 MHz, Band 17m 18.068 MHz-18.168 MHz]
+        """
+        return self.overlapping (f_lo, f_hi)
+    # end def bands_in
+
+    def segments_in (self, f_lo, f_hi) :
+        """ Segments overlapping the frequency range f_lo-f_hi
+        >>> bandplans ['IARU-R1'].segments_in (14.065e6, 14.1e6)
+        [Segment CW 14.000 MHz-14.070 MHz, Segment DIGI 14.070 MHz-14.099 MHz, Segment BEACON 14.099 MHz-14.101 MHz]
+        """
+        result = []
+        for band in self.bands_in (f_lo, f_hi) :
+            result.extend (band.segments.overlapping (f_lo, f_hi))
+        return result
+    # end def segments_in
 
 # end class Bandplan
 
@@ -99,8 +521,8 @@ class Bandplan :
 # https://www.oevsv.at/funkbetrieb/amateurfunkfrequenzen/hf-referat/
 # https://www.oevsv.at/export/shared/.content/.galleries/Downloads_Referate/UKW-Referat-Downloads/UKW-Bandplan.pdf
 # https://www.oevsv.at/oevsv/aktuelles/60m-Band-und-630m-Band-nun-in-Oesterreich-fuer-den-Amateurfunk-freigegeben/
-bandplan_austria = bpa = Bandplan ()
-bpa.add_band (Band (bpa, '2.2km',   135.7e3,   137.8e3))
+bandplan_austria = bpa = Bandplan ('Austria', 'Austria (OeVSV)')
+bpa.add_band (Band (bpa, '2190m',   135.7e3,   137.8e3))
 bpa.add_band (Band (bpa, '630m',    472.0e3,   479.0e3))
 bpa.add_band (Band (bpa, '160m',   1810.0e3,  2000.0e3))
 bpa.add_band (Band (bpa, '80m',    3500.0e3,  3800.0e3))
@@ -116,7 +538,167 @@ bpa.add_band (Band (bpa, '6m',       50.0e6,    52.0e6))
 bpa.add_band (Band (bpa, '2m',      144.0e6,   146.0e6))
 bpa.add_band (Band (bpa, '70cm',    430.0e6,   440.0e6))
 
-__all__ = ['bandplan_austria', 'Band', 'Bandplan', 'Overlap_Error']
+class Bandplan_Registry :
+    """ Band plans by name, the plans in the data file are parsed on
+        first access.
+    >>> sorted (bandplans)
+    ['Austria', 'IARU-R1', 'IARU-R2', 'IARU-R3']
+    >>> bandplans ['IARU-R2'].lookup (7.25e6)
+    Band 40m 7.000 MHz-7.300 MHz
+    >>> r1 = bandplans ['IARU-R1']
+    >>> r1.lookup (5.36e6).power, r1.segment (5.36e6)
+    (15.0, Segment ALL 5.354 MHz-5.366 MHz)
+    >>> 'Austria' in bandplans, 'Mars' in bandplans
+    (True, False)
+    """
+
+    data = os.path.join (os.path.dirname (__file__), 'data', 'bandplans.txt')
+
+    def __init__ (self, filename = None) :
+        self.filename = filename or self.data
+        self.plans    = {}
+        self.loaded   = False
+    # end def __init__
+
+    def __contains__ (self, name) :
+        self.load ()
+        return name in self.plans
+    # end def __contains__
+
+    def __getitem__ (self, name) :
+        self.load ()
+        return self.plans [name]
+    # end def __getitem__
+
+    def __iter__ (self) :
+        self.load ()
+        return iter (self.plans)
+    # end def __iter__
+
+    def load (self) :
+        """ Parse the data file on first access, the registry is only
+            marked as loaded if this succeeds: After an error the plans
+            registered so far are dropped and the next access retries.
+        >>> import tempfile, shutil
+        >>> d  = tempfile.mkdtemp ()
+        >>> fn = os.path.join (d, 'bandplans.txt')
+        >>> plan = 'plan T Test\\nband 20m 14000 14350\\n'
+        >>> with open (fn, 'w') as f :
+        ...     _ = f.write (plan + 'plan T x\\n')
+        >>> r = Bandplan_Registry (fn)
+        >>> 'T' in r
+        Traceback (most recent call last):
+        ...
+        ValueError: Duplicate band plan: T
+        >>> r.loaded, r.plans
+        (False, {})
+        >>> with open (fn, 'w') as f :
+        ...     _ = f.write (plan)
+        >>> 'T' in r, r.loaded
+        (True, True)
+        >>> shutil.rmtree (d)
+        """
+        if self.loaded :
+            return
+        plans = dict (self.plans)
+        try :
+            with open (self.filename) as f :
+                for plan in self.parse (f, self.filename) :
+                    self.register (plan)
+        except Exception :
+            self.plans = plans
+            raise
+        self.loaded = True
+    # end def load
+
+    def register (self, plan) :
+        if plan.name in self.plans :
+            raise ValueError ('Duplicate band plan: %s' % plan.name)
+        self.plans [plan.name] = plan
+    # end def register
+
+    @staticmethod
+    def parse (f, filename = '<bandplans>') :
+        """ Parse band plan definitions, see the data file for the
+            format. Overlaps are checked once per plan and band when
+            all its bands or segments are known.
+        >>> lines = ['plan T Test', 'band 20m 14000 14350', ' 14000 14070 CW 200']
+        >>> [p] = Bandplan_Registry.parse (lines)
+        >>> p.name, p.description, p.bands, p.bands [0].segments.items
+        ('T', 'Test', [Band 20m 14.000 MHz-14.350 MHz], [Segment CW 14.000 MHz-14.070 MHz])
+        >>> Bandplan_Registry.parse (['band 20m 14000 14350'])
+        Traceback (most recent call last):
+        ...
+        ValueError: <bandplans>:1: band without plan
+        >>> lines.extend ([' 14060 14100 DIGI 500', 'band 17m 18068 18000'])
+        >>> Bandplan_Registry.parse (lines)
+        Traceback (most recent call last):
+        ...
+        ValueError: <bandplans>:5: Invalid range: 18068000.0-18000000.0
+        >>> Bandplan_Registry.parse (lines [:-1])
+        Traceback (most recent call last):
+        ...
+        hamradio.bandplan.Overlap_Error: <bandplans>: T: 14.000 MHz-14.070 MHz overlaps 14.060 MHz-14.100 MHz
+        """
+        def khz (v) :
+            return float (v + 'e3')
+        def opt (v) :
+            return None if v == '-' else float (v)
+        def finish (plan, bands) :
+            try :
+                for band, segments in bands :
+                    band.add_segments (segments)
+                plan.add_bands (b for b, s in bands)
+            except Overlap_Error as err :
+                raise Overlap_Error ('%s: %s: %s' % (filename, plan.name, err))
+
+        plans = []
+        plan  = bands = None
+        for lineno, line in enumerate (f, 1) :
+            line = line.split ('#', 1) [0]
+            if not line.strip () :
+                continue
+            t = line.split ()
+            try :
+                if t [0] == 'plan' :
+                    if plan is not None :
+                        finish (plan, bands)
+                    plan  = Bandplan (t [1], ' '.join (t [2:]))
+                    bands = []
+                    plans.append (plan)
+                elif t [0] == 'band' :
+                    if plan is None :
+                        raise ValueError ('band without plan')
+                    power = opt (t [4]) if len (t) > 4 else None
+                    band  = Band (plan, t [1], khz (t [2]), khz (t [3]), power)
+                    bands.append ((band, []))
+                else :
+                    if not bands :
+                        raise ValueError ('segment without band')
+                    band, segments = bands [-1]
+                    power = opt (t [4]) if len (t) > 4 else None
+                    segments.append \
+                        (Segment
+                            ( band, t [2], khz (t [0]), khz (t [1])
+                            , opt (t [3]), power
+                            )
+                        )
+            except (ValueError, IndexError) as err :
+                raise ValueError ('%s:%d: %s' % (filename, lineno, err))
+        if plan is not None :
+            finish (plan, bands)
+        return plans
+    # end def parse
+
+# end class Bandplan_Registry
+
+bandplans = Bandplan_Registry ()
+bandplans.register (bandplan_austria)
+
+__all__ = \
+    [ 'bandplan_austria', 'bandplans', 'mhz_to_hz', 'Band', 'Bandplan'
+    , 'Bandplan_Registry', 'Overlap_Error', 'Segment'
+    ]
 
 if __name__ == '__main__' :
     #for b in bandplan_austria.bands :
@@ -30,7 +30,16 @@
 import io
 import sys
 import os
+import tempfile
+from time          import perf_counter
+from collections   import OrderedDict
+from itertools     import islice
+from concurrent.futures import ProcessPoolExecutor
+from array         import array
+from re            import compile as rc
 from hamradio.dxcc import DXCC_File
+from hamradio.watcher import Reload_Watcher
+from hamradio.filecache import File_Cache, Cached_Download
 
 # Sources
 # Big CTY list:
@@ -96,7 +105,7 @@ cty_to_dxcc = dict \
     ,  ('Norfolk Island',           'Norfolk I.')
     ,  ('North Cook Islands',       'North Cook Is.')
     ,  ('North Macedonia',          'North Macedonia (Republic of)')
-    ,  ('Palmyra & Jarvis Islands', 'Palmyra & Jarvis Is')
+    ,  ('Palmyra & Jarvis Islands', 'Palmyra & Jarvis Is.')
     ,  ('Peter 1 Island',           'Peter 1 I.')
     ,  ('Pitcairn Island',          'Pitcairn I.')
     ,  ('Pr. Edward & Marion Is.',  'Prince Edward & Marion Is.')
@@ -146,22 +155,324 @@ darc_waedc_dxcc = dict \
     ,  ('Vienna Intl Ctr',          'Austria')  # *4U1V
     ))
 
-class CTY :
+class LRU_Cache :
+    """ Mapping of bounded size, the least recently used item is
+        evicted when maxsize is reached (maxsize None is unbounded, 0
+        disables caching). Hits, misses and evictions are counted.
+    >>> c = LRU_Cache (2)
+    >>> c ['a'] = 1
+    >>> c ['b'] = 2
+    >>> c.get ('a'), c.get ('x')
+    (1, None)
+    >>> c ['c'] = 3
+    >>> 'b' in c, 'a' in c, len (c)
+    (False, True, 2)
+    >>> s = c.stats ()
+    >>> s ['hits'], s ['misses'], s ['evictions'], s ['hit_rate']
+    (1, 1, 1, 0.5)
+    >>> c.clear ()
+    >>> len (c), c.stats () ['hits']
+    (0, 1)
+    """
+
+    def __init__ (self, maxsize = 4096) :
+        self.maxsize   = maxsize
+        self.data      = OrderedDict ()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+    # end def __init__
+
+    def get (self, key, default = None) :
+        """ Return cached value and mark it as recently used """
+        try :
+            value = self.data [key]
+        except KeyError :
+            self.misses += 1
+            return default
+        self.data.move_to_end (key)
+        self.hits += 1
+        return value
+    # end def get
+
+    def clear (self) :
+        """ Drop all items, the counters are kept """
+        self.data.clear ()
+    # end def clear
+
+    def stats (self) :
+        lookups = self.hits + self.misses
+        return dict \
+            ( size      = len (self.data)
+            , maxsize   = self.maxsize
+            , hits      = self.hits
+            , misses    = self.misses
+            , evictions = self.evictions
+            , hit_rate  = lookups and self.hits / lookups
+            )
+    # end def stats
+
+    def __contains__ (self, key) :
+        return key in self.data
+    # end def __contains__
+
+    def __len__ (self) :
+        return len (self.data)
+    # end def __len__
+
+    def __setitem__ (self, key, value) :
+        if self.maxsize == 0 :
+            return
+        self.data [key] = value
+        self.data.move_to_end (key)
+        if self.maxsize is not None and len (self.data) > self.maxsize :
+            self.data.popitem (last = False)
+            self.evictions += 1
+    # end def __setitem__
+
+# end class LRU_Cache
+
+class CTY_Entry :
+    """ Country information for a callsign as returned by
+        CTY.lookup_full: prefix is the matching prefix (or the callsign
+        for an exact match), primary_prefix the main prefix of the
+        country. Longitude and utc_offset are positive for east.
+    """
+
+    __slots__ = \
+        ( 'country', 'prefix', 'primary_prefix', 'exact', 'cq', 'itu'
+        , 'continent', 'lat', 'lon', 'utc_offset'
+        )
+
+    def __init__ \
+        ( self, country, prefix, primary_prefix, exact, cq, itu
+        , continent, lat, lon, utc_offset
+        ) :
+        self.country        = country
+        self.prefix         = prefix
+        self.primary_prefix = primary_prefix
+        self.exact          = exact
+        self.cq             = cq
+        self.itu            = itu
+        self.continent      = continent
+        self.lat            = lat
+        self.lon            = lon
+        self.utc_offset     = utc_offset
+    # end def __init__
+
+    def __repr__ (self) :
+        return 'CTY_Entry (%s)' % ', '.join \
+            ('%s = %r' % (k, getattr (self, k)) for k in self.__slots__)
+    # end def __repr__
+
+# end class CTY_Entry
+
+class CTY (File_Cache) :
     """ Parse Country information in cty.dat format
         Docs: https://www.country-files.com/cty-dat-format/
+        With an url (e.g. CTY.url) the current file is downloaded to
+        the cache directory and only fetched again when it changed
+        on the server (see Cached_Download), if there is no local copy
+        and the server is unreachable we use filename.
     """
 
     data = os.path.join (os.path.dirname (__file__), 'data', 'cty.dat')
+    url  = 'https://www.country-files.com/cty/cty.dat'
 
     # After prefix, additional info can be appended enclosed in the
-    # following suffix markup. We ignore those currently.
-    suffixes = '()', '[]', '<>', '{}', '~~'
+    # following suffix markup: (CQ zone), [ITU zone], <lat/lon>,
+    # {continent} and ~UTC offset~
+    suffixes    = '()', '[]', '<>', '{}', '~~'
+    re_prefix   = rc (r'(=?)([^(\[<{~]*)(.*)$')
+    re_override = rc \
+        ( r'\((\d+)\)|\[(\d+)\]|<([-+.\d]+)/([-+.\d]+)>'
+          r'|\{([A-Z]+)\}|~([-+.\d]+)~'
+        )
+    entry_fields = ('country', 'cq', 'itu', 'cont', 'lat', 'lon', 'utc')
+
+    # Portable suffixes that don't change the country, and maritime
+    # or aeronautical mobile which is not in any country
+    ignore_sfx = set (('P', 'M', 'A', 'B', 'J', 'QRP', 'QRPP', 'LH', 'R'))
+    mobile_sfx = set (('MM', 'AM'))
+
+    # Parsed tables are cached, see File_Cache
+    cache_name    = 'cty'
+    cache_version = 3
+
+    def __init__ \
+        ( self
+        , filename
+        , cache_dir  = None
+        , cache_size = 4096
+        , url        = None
+        , max_age    = 0
+        ) :
+        if cache_dir is not None :
+            self.cache_dir = cache_dir
+        self.filename   = filename
+        self.cache_size = cache_size
+        self.watcher    = None
+        self.download   = None
+        if url is not None :
+            self.download = Cached_Download \
+                (url, cache_dir, fallback = filename, max_age = max_age)
+        # CTY_Entry objects returned by lookup_full
+        self.entries    = {}
+        # Results of resolve
+        self.resolved   = LRU_Cache (cache_size)
+        self.load ()
+    # end def __init__
 
-    def __init__ (self, filename) :
+    def __getstate__ (self) :
+        """ Copies (e.g. for a process pool) don't share the watcher
+            thread and the download
+        """
+        state = self.__dict__.copy ()
+        state ['watcher']  = None
+        state ['download'] = None
+        return state
+    # end def __getstate__
+
+    def load (self) :
+        """ Load tables from the cache or parse self.filename, with an
+            url the file is fetched first.
+        >>> d   = tempfile.mkdtemp ()
+        >>> cty = CTY (CTY.data, cache_dir = d, url = 'http://127.0.0.1:1/')
+        >>> cty.download.thread.join ()
+        >>> cty.download.status, cty.filename == CTY.data
+        ('fallback', True)
+        >>> cty.changed ()
+        False
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        if self.download is not None :
+            self.filename = self.download.fetch ()
+        self.file_stat = self.file_key (self.filename) [:2]
+        if not self.load_cache (self.filename) :
+            self.parse (self.filename)
+            self.build_trie ()
+            self.write_cache (self.filename)
+    # end def load
+
+    def changed (self) :
+        """ True if size or mtime of the file changed since loading,
+            with an url this makes a conditional request to the server.
+        """
+        try :
+            filename = self.filename
+            if self.download is not None :
+                filename = self.download.fetch ()
+            if filename != self.filename :
+                return True
+            return self.file_key (filename) [:2] != self.file_stat
+        except (OSError, RuntimeError) :
+            return False
+    # end def changed
+
+    def reload (self) :
+        """ Build new tables from the file and swap them in at once by
+            replacing the instance dictionary: A lookup running in
+            another thread uses either the old or the new tables, see
+            snapshot. Memoised lookups are dropped.
+        >>> import shutil
+        >>> d  = tempfile.mkdtemp ()
+        >>> fn = os.path.join (d, 'cty.dat')
+        >>> _ = shutil.copy (CTY.data, fn)
+        >>> cty = CTY (fn, cache_dir = d)
+        >>> old = cty.snapshot ()
+        >>> cty.callsign_lookup ('DL9ZZZ'), cty.changed ()
+        ('Fed. Rep. of Germany', False)
+        >>> with io.open (CTY.data, 'r') as f :
+        ...     text = f.read ()
+        >>> with io.open (fn, 'w') as f :
+        ...     _ = f.write (text.replace ('OE,=4U0R', 'OE,=DL9ZZZ,=4U0R'))
+        >>> cty.changed ()
+        True
+        >>> cty.reload ()
+        >>> cty.callsign_lookup ('DL9ZZZ'), cty.changed ()
+        ('Austria', False)
+        >>> old.callsign_lookup ('DL9ZZZ')
+        'Fed. Rep. of Germany'
+        >>> w = cty.watch (interval = .01)
+        >>> w is cty.watch ()
+        True
+        >>> with io.open (fn, 'w') as f :
+        ...     _ = f.write (text)
+        >>> w.reloaded.wait (5)
+        True
+        >>> cty.unwatch ()
+        >>> cty.callsign_lookup ('DL9ZZZ'), cty.watcher
+        ('Fed. Rep. of Germany', None)
+        >>> shutil.rmtree (d)
+        """
+        new = self.__class__.__new__ (self.__class__)
+        keep = ('cache_dir', 'filename', 'cache_size', 'watcher', 'download')
+        for k in keep :
+            if k in self.__dict__ :
+                setattr (new, k, self.__dict__ [k])
+        new.entries  = {}
+        new.resolved = LRU_Cache (self.cache_size)
+        new.load ()
+        self.__dict__ = new.__dict__
+    # end def reload
+
+    def snapshot (self) :
+        """ Return a CTY object using the current tables, a reload of
+            self does not affect it.
+        """
+        snap = self.__class__.__new__ (self.__class__)
+        snap.__dict__ = self.__dict__
+        return snap
+    # end def snapshot
+
+    def watch (self, interval = 60) :
+        """ Check the file every interval seconds in a background
+            thread and reload it when it changes. Returns the
+            Reload_Watcher thread.
+        """
+        if self.watcher is None :
+            self.watcher = Reload_Watcher (self, interval)
+            self.watcher.start ()
+        return self.watcher
+    # end def watch
+
+    def unwatch (self) :
+        """ Stop watching the file """
+        watcher, self.watcher = self.watcher, None
+        if watcher is not None :
+            watcher.stop ()
+    # end def unwatch
+
+    def parse (self, filename) :
+        """ Parse cty.dat: For each country the CQ and ITU zone,
+            continent, latitude, longitude and UTC offset are stored
+            in a row of the entry tables, prefixes and exact callsigns
+            that override some of these get a row of their own. Rows are
+            shared by all prefixes with the same values.
+            countries maps the country name to its index in
+            country_names (which is used in entry_country).
+            Note that cty.dat uses positive longitudes and time offsets
+            for *west*, we store them with the usual sign (east is
+            positive).
+        """
         self.exact_callsign = {}
         self.prefix         = {}
         self.prf_max        = 0
         self.countries      = {}
+        self.exact_entry    = {}
+        self.prefix_entry   = {}
+        self.country_names  = []
+        self.country_prefix = []
+        self.continents     = []
+        self.entry_country  = array ('H')
+        self.entry_cq       = array ('B')
+        self.entry_itu      = array ('B')
+        self.entry_cont     = array ('B')
+        self.entry_lat      = array ('d')
+        self.entry_lon      = array ('d')
+        self.entry_utc      = array ('d')
+        rows    = {}
         country = None
         with io.open (filename, 'r') as f :
             for line in f :
@@ -170,8 +481,19 @@ class CTY :
                     assert line.endswith (':')
                     line = line.rstrip (':')
                     l = [x.lstrip () for x in line.split (':')]
-                    country, cq, itu, ctycode, lat, lon, gmtoff, pfx = l
-                    self.countries [country] = True
+                    country, cq, itu, cont, lat, lon, gmtoff, pfx = l
+                    self.countries [country] = len (self.country_names)
+                    self.country_names.append (country)
+                    self.country_prefix.append (pfx)
+                    default = dict \
+                        ( country = len (self.country_names) - 1
+                        , cq      = int (cq)
+                        , itu     = int (itu)
+                        , cont    = cont
+                        , lat     = float (lat)
+                        , lon     = -float (lon)
+                        , utc     = -float (gmtoff)
+                        )
                     end = False
                 else :
                     # Docs say 'should' contain comma at the end on continuation
@@ -181,64 +503,706 @@ class CTY :
                     line = line.rstrip (',')
                     pfxs = line.split (',')
                     for pfx in pfxs :
-                        # discard any additional info at end of prefix
-                        for s in self.suffixes :
-                            s = s [0]
-                            pfx = pfx.split (s, 1) [0]
-                        if pfx.startswith ('=') :
-                            pfx = pfx.lstrip ('=')
+                        # additional info at end of prefix overrides
+                        # the country defaults
+                        m   = self.re_prefix.match (pfx)
+                        pfx = m.group (2)
+                        row = self._entry_row (rows, default, m.group (3))
+                        if m.group (1) :
                             if pfx not in self.exact_callsign :
                                 self.exact_callsign [pfx] = country
+                                self.exact_entry    [pfx] = row
                         else :
                             l = len (pfx)
                             if l > self.prf_max :
                                 self.prf_max = l
                             if pfx not in self.prefix :
-                                self.prefix [pfx] = country
+                                self.prefix       [pfx] = country
+                                self.prefix_entry [pfx] = row
                     if end :
                         country = None
                         end     = False
-    # end def __init__
+    # end def parse
+
+    def _entry_row (self, rows, default, overrides) :
+        """ Row in the entry tables for the country defaults updated
+            by the overrides of a prefix, rows maps values to rows.
+        """
+        values = default
+        if overrides :
+            values = dict (default)
+            for m in self.re_override.finditer (overrides) :
+                cq, itu, lat, lon, cont, utc = m.groups ()
+                if cq :
+                    values ['cq']   = int (cq)
+                elif itu :
+                    values ['itu']  = int (itu)
+                elif lat :
+                    values ['lat']  = float (lat)
+                    values ['lon']  = -float (lon)
+                elif cont :
+                    values ['cont'] = cont
+                elif utc :
+                    values ['utc']  = -float (utc)
+        key = tuple (values [k] for k in self.entry_fields)
+        if key not in rows :
+            if values ['cont'] not in self.continents :
+                self.continents.append (values ['cont'])
+            rows [key] = len (self.entry_country)
+            self.entry_country.append (values ['country'])
+            self.entry_cq.append      (values ['cq'])
+            self.entry_itu.append     (values ['itu'])
+            self.entry_cont.append    (self.continents.index (values ['cont']))
+            self.entry_lat.append     (values ['lat'])
+            self.entry_lon.append     (values ['lon'])
+            self.entry_utc.append     (values ['utc'])
+        return rows [key]
+    # end def _entry_row
+
+
+    cached_attributes = \
+        ( 'exact_callsign', 'prefix', 'prf_max', 'countries', 'trie'
+        , 'exact_entry', 'prefix_entry', 'country_names', 'country_prefix'
+        , 'continents', 'entry_country', 'entry_cq', 'entry_itu'
+        , 'entry_cont', 'entry_lat', 'entry_lon', 'entry_utc'
+        )
+
+    def build_trie (self) :
+        """ Build a character trie from the prefixes: Each node is a
+            dict from the next character to the child node, the country
+            of a prefix ending at a node is stored under the key None.
+        """
+        self.trie = {}
+        for pfx, country in self.prefix.items () :
+            node = self.trie
+            for c in pfx :
+                node = node.setdefault (c, {})
+            node [None] = country
+    # end def build_trie
 
     def callsign_lookup (self, callsign) :
-        if callsign in self.exact_callsign :
-            return self.exact_callsign [callsign]
-        for n in reversed (range (self.prf_max)) :
-            pfx = callsign [:n+1]
-            if pfx in self.prefix :
-                return self.prefix [pfx]
+        """ Return the country of callsign: An exact match or else the
+            longest matching prefix, None if nothing matches.
+        >>> d = tempfile.mkdtemp ()
+        >>> cty = CTY (CTY.data, cache_dir = d)
+        >>> cty.callsign_lookup ('OE3RSU'), cty.callsign_lookup ('GM0XXX')
+        ('Austria', 'Scotland')
+        >>> cty.callsign_lookup ('4U1A'), cty.callsign_lookup ('4U1ITU')
+        ('Vienna Intl Ctr', 'ITU HQ')
+        >>> print (cty.callsign_lookup ('Q1AA'))
+        None
+
+        Compare with trying all prefix lengths for random callsigns:
+        >>> import random
+        >>> def slow (callsign) :
+        ...     if callsign in cty.exact_callsign :
+        ...         return cty.exact_callsign [callsign]
+        ...     for n in reversed (range (cty.prf_max)) :
+        ...         if callsign [:n+1] in cty.prefix :
+        ...             return cty.prefix [callsign [:n+1]]
+        >>> random.seed (7)
+        >>> pfx = sorted (cty.prefix) + sorted (cty.exact_callsign)
+        >>> bad = []
+        >>> for i in range (20000) :
+        ...     call = random.choice (pfx) [:random.randint (1, 8)]
+        ...     call += ''.join (random.choice ('0123ABCX') for k in 'xyz')
+        ...     call  = call [:random.randint (1, len (call))]
+        ...     if '/' in call :
+        ...         continue
+        ...     if slow (call) != cty.callsign_lookup (call) :
+        ...         bad.append (call)
+        >>> bad
+        []
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        country = self.exact_callsign.get (callsign)
+        if country is not None :
+            return country
+        if '/' in callsign or not callsign.isupper () :
+            callsign, exact = self.resolve (callsign)
+            if exact :
+                return self.exact_callsign [callsign]
+        node = self.trie
+        for c in callsign :
+            node = node.get (c)
+            if node is None :
+                break
+            country = node.get (None, country)
+        return country
     # end def callsign_lookup
 
+    def prefix_match (self, callsign) :
+        """ Longest prefix of callsign in the prefix table or None
+        >>> d = tempfile.mkdtemp ()
+        >>> cty = CTY (CTY.data, cache_dir = d)
+        >>> cty.prefix_match ('UA9ABC'), cty.prefix_match ('Q1')
+        ('UA9', None)
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        node  = self.trie
+        depth = 0
+        for n, c in enumerate (callsign) :
+            node = node.get (c)
+            if node is None :
+                break
+            if None in node :
+                depth = n + 1
+        if not depth :
+            return None
+        return callsign [:depth]
+    # end def prefix_match
+
+    def resolve (self, callsign) :
+        """ Normalize callsign for lookup, returns the callsign or
+            prefix to look up and a flag if this is an exact callsign
+            from cty.dat. Results are memoised.
+            The callsign is converted to upper case. An exact match
+            (cty.dat contains some portable calls) wins, otherwise
+            suffixes that don't change the location (/P, /M, /QRP, ...)
+            are dropped and /MM and /AM (maritime and aeronautical
+            mobile) don't belong to any country. For a portable
+            prefix like DL/OE3RSU or OE3RSU/DL the shortest part that
+            matches a prefix is used. A single digit suffix changes the
+            call area: UA1ABC/9 is looked up as UA9ABC.
+        >>> d = tempfile.mkdtemp ()
+        >>> cty = CTY (CTY.data, cache_dir = d)
+        >>> cty.resolve ('dl/oe3rsu'), cty.resolve ('OE3RSU/P')
+        (('DL', False), ('OE3RSU', False))
+        >>> cty.resolve ('VP2E/K1ABC/QRP'), cty.resolve ('UA1ABC/9')
+        (('VP2E', False), ('UA9ABC', False))
+        >>> cty.resolve ('3D2AG/P'), cty.resolve ('K1ABC/MM')
+        (('3D2AG/P', True), ('', False))
+        >>> for c in ('DL/OE3RSU', 'OE3RSU/P', 'VP2E/K1ABC/QRP', 'UA1ABC/9'
+        ...          , 'OE3RSU/MM', 'KH6/K1ABC', 'K1ABC/KH6', 'oe3rsu') :
+        ...     print ('%-15s %s' % (c, cty.callsign_lookup (c)))
+        DL/OE3RSU       Fed. Rep. of Germany
+        OE3RSU/P        Austria
+        VP2E/K1ABC/QRP  Anguilla
+        UA1ABC/9        Asiatic Russia
+        OE3RSU/MM       None
+        KH6/K1ABC       Hawaii
+        K1ABC/KH6       Hawaii
+        oe3rsu          Austria
+        >>> cty.lookup_many (['OE3RSU/P', 'DL/OE3RSU'])
+        ['Austria', 'Fed. Rep. of Germany']
+        >>> cty.lookup_full ('DL/OE3RSU').cq
+        14
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        result = self.resolved.get (callsign)
+        if result is not None :
+            return result
+        call   = callsign.strip ().upper ()
+        result = (call, True)
+        if call not in self.exact_callsign :
+            result = (self._resolve_portable (call), False)
+        self.resolved [callsign] = result
+        return result
+    # end def resolve
+
+    def _resolve_portable (self, call) :
+        parts = [p for p in call.split ('/') if p]
+        if not parts :
+            return ''
+        home  = parts [0]
+        parts = [home] + [p for p in parts [1:] if p not in self.ignore_sfx]
+        if any (p in self.mobile_sfx for p in parts [1:]) :
+            return ''
+        area = None
+        if len (parts) > 1 and len (parts [-1]) == 1 :
+            if parts [-1].isdigit () :
+                area = parts.pop ()
+        call = parts [0]
+        if len (parts) > 1 :
+            for p in sorted (parts, key = len) :
+                if self.prefix_match (p) :
+                    call = p
+                    break
+        if area :
+            for n, c in enumerate (call) :
+                if n and c.isdigit () :
+                    call = call [:n] + area + call [n+1:]
+                    break
+        return call
+    # end def _resolve_portable
+
+    def lookup_many (self, callsigns) :
+        """ Return a list with the country of each of the callsigns,
+            same as callsign_lookup for each of them. Callsigns that
+            occur more than once are looked up only once.
+        >>> d = tempfile.mkdtemp ()
+        >>> cty = CTY (CTY.data, cache_dir = d)
+        >>> calls = ['OE3RSU', 'DL1AB', 'Q1AA', 'OE3RSU', '4U1A']
+        >>> cty.lookup_many (calls)
+        ['Austria', 'Fed. Rep. of Germany', None, 'Austria', 'Vienna Intl Ctr']
+        >>> cty.lookup_many (calls) == [cty.callsign_lookup (c) for c in calls]
+        True
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        exact  = self.exact_callsign
+        trie   = self.trie
+        seen   = {}
+        result = []
+        for callsign in callsigns :
+            if callsign in seen :
+                result.append (seen [callsign])
+                continue
+            country = exact.get (callsign)
+            if country is None :
+                if '/' in callsign or not callsign.isupper () :
+                    country = self.callsign_lookup (callsign)
+                else :
+                    node = trie
+                    for c in callsign :
+                        node = node.get (c)
+                        if node is None :
+                            break
+                        country = node.get (None, country)
+            seen [callsign] = country
+            result.append (country)
+        return result
+    # end def lookup_many
+
+    def lookup_full (self, callsign) :
+        """ Return a CTY_Entry for callsign with country, zones,
+            continent, position and UTC offset, including overrides of
+            the matching prefix or exact callsign. None if nothing
+            matches. Entries are created once per prefix and shared,
+            they must not be modified. The lookup uses a snapshot of
+            the tables in case they are reloaded concurrently.
+        >>> d = tempfile.mkdtemp ()
+        >>> cty = CTY (CTY.data, cache_dir = d)
+        >>> e = cty.lookup_full ('OE3RSU')
+        >>> e.country, e.prefix, e.cq, e.itu, e.continent, e.exact
+        ('Austria', 'OE', 15, 28, 'EU', False)
+        >>> e.lat, e.lon, e.utc_offset
+        (47.33, 13.33, 1.0)
+        >>> e = cty.lookup_full ('BD6KF/0')
+        >>> e.country, e.primary_prefix, e.exact, e.cq, e.itu, e.continent
+        ('China', 'BY', True, 23, 42, 'AS')
+        >>> cty.lookup_full ('BY1AA').cq, cty.lookup_full ('OE').exact
+        (24, False)
+        >>> print (cty.lookup_full ('Q1AA'))
+        None
+        >>> import random
+        >>> random.seed (1)
+        >>> calls = random.sample (sorted (cty.prefix), 500)
+        >>> calls.extend (random.sample (sorted (cty.exact_callsign), 500))
+        >>> calls = [c + random.choice (('', '1ABC', '/P')) for c in calls]
+        >>> def country (call) :
+        ...     return getattr (cty.lookup_full (call), 'country', None)
+        >>> [c for c in calls if country (c) != cty.callsign_lookup (c)]
+        []
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        cty = self
+        if self.watcher is not None :
+            cty = self.snapshot ()
+        exact = callsign in cty.exact_entry
+        if exact :
+            prefix = callsign
+        else :
+            if '/' in callsign or not callsign.isupper () :
+                callsign, exact = cty.resolve (callsign)
+            prefix = callsign
+            if not exact :
+                prefix = cty.prefix_match (callsign)
+            if prefix is None :
+                return None
+        key = (prefix, exact)
+        if key not in cty.entries :
+            if exact :
+                row = cty.exact_entry [prefix]
+            else :
+                row = cty.prefix_entry [prefix]
+            country = cty.entry_country [row]
+            cty.entries [key] = CTY_Entry \
+                ( cty.country_names [country]
+                , prefix
+                , cty.country_prefix [country]
+                , exact
+                , cty.entry_cq  [row]
+                , cty.entry_itu [row]
+                , cty.continents [cty.entry_cont [row]]
+                , cty.entry_lat [row]
+                , cty.entry_lon [row]
+                , cty.entry_utc [row]
+                )
+        return cty.entries [key]
+    # end def lookup_full
+
 # end class CTY
 
 class CTY_DXCC :
     """ Matching of dxcc entities via CTY
         Note that since CTY contains more calls we need a mapping.
         Also the names in CTY are not the same as in DXCC.
+        CTY, DXCC list, the lookup cache and the DXCC entity of each
+        CTY country are kept together in .tables and are replaced at
+        once on reload. With strict set, loading fails if a CTY
+        country has no DXCC entity, see validate. With cty_url and
+        dxcc_url (e.g. CTY.url, DXCC_File.url) the files are
+        downloaded, see CTY. Parsed files and downloads are cached in
+        cache_dir (default File_Cache.cache_dir).
     """
 
-    def __init__ (self) :
-        dxcc = DXCC_File ()
-        dxcc.parse ()
-        self.dxcc = dxcc.by_type ['CURRENT']
-        self.cty  = CTY (CTY.data)
+    def __init__ \
+        ( self
+        , cache_size = 4096
+        , strict     = False
+        , cty_url    = None
+        , dxcc_url   = None
+        , max_age    = 0
+        , cache_dir  = None
+        ) :
+        self.cache_size = cache_size
+        self.strict     = strict
+        self.cty_url    = cty_url
+        self.dxcc_url   = dxcc_url
+        self.max_age    = max_age
+        self.cache_dir  = cache_dir
+        self.watcher    = None
+        self.tables     = self.load ()
     # end def __init__
 
+    @property
+    def cty (self) :
+        return self.tables [0]
+    # end def cty
+
+    @property
+    def dxcc (self) :
+        return self.tables [1].by_type ['CURRENT']
+    # end def dxcc
+
+    @property
+    def cache (self) :
+        return self.tables [2]
+    # end def cache
+
+    def load (self) :
+        """ Parse DXCC list and CTY, return new tables: The DXCC
+            entities are in a list indexed like CTY.country_names, None
+            for CTY countries without an entity.
+        """
+        dxcc = DXCC_File \
+            (self.dxcc_url, cache_dir = self.cache_dir, max_age = self.max_age)
+        dxcc.parse ()
+        cty  = CTY \
+            ( CTY.data
+            , cache_dir  = self.cache_dir
+            , cache_size = self.cache_size
+            , url        = self.cty_url
+            , max_age    = self.max_age
+            )
+        by_name  = dxcc.by_type ['CURRENT'].by_name
+        entities = []
+        for name in cty.country_names :
+            name = darc_waedc_dxcc.get (name, name)
+            name = cty_to_dxcc.get     (name, name)
+            entities.append (by_name.get (name))
+        tables = (cty, dxcc, LRU_Cache (self.cache_size), entities)
+        if self.strict :
+            unmapped = self.validate (tables) ['cty']
+            if unmapped :
+                raise ValueError \
+                    ("No DXCC entity for: %s" % ', '.join (unmapped))
+        return tables
+    # end def load
+
+    def validate (self, tables = None) :
+        """ Report coverage gaps of the mapping: CTY countries without
+            a DXCC entity and DXCC entities not matched by any CTY
+            country.
+        >>> d = tempfile.mkdtemp ()
+        >>> cd = CTY_DXCC (cache_dir = d)
+        >>> cd.validate ()
+        {'cty': [], 'dxcc': []}
+        >>> cty, dxcc, cache, entities = cd.tables
+        >>> entities = list (entities)
+        >>> entities [cty.countries ['Japan']] = None
+        >>> cd.validate ((cty, dxcc, cache, entities))
+        {'cty': ['Japan'], 'dxcc': ['Japan']}
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        cty, dxcc, cache, entities = tables or self.tables
+        mapped = set (id (e) for e in entities if e is not None)
+        return dict \
+            ( cty  =
+                [ cty.country_names [i]
+                  for i, e in enumerate (entities) if e is None
+                ]
+            , dxcc =
+                [ e.name for e in dxcc.by_type ['CURRENT'].by_name.values ()
+                  if id (e) not in mapped
+                ]
+            )
+    # end def validate
+
+    def changed (self) :
+        cty, dxcc, cache, entities = self.tables
+        return cty.changed () or dxcc.changed ()
+    # end def changed
+
+    def reload (self) :
+        """ Load the DXCC list and CTY again and swap them in, this
+            invalidates the cache. The cache counters are carried over.
+        """
+        tables = self.load ()
+        old    = self.tables [2]
+        new    = tables [2]
+        new.hits, new.misses, new.evictions = \
+            old.hits, old.misses, old.evictions
+        self.tables = tables
+    # end def reload
+
+    def watch (self, interval = 60) :
+        """ Reload when cty.dat or the DXCC list change, see CTY.watch """
+        if self.watcher is None :
+            self.watcher = Reload_Watcher (self, interval)
+            self.watcher.start ()
+        return self.watcher
+    # end def watch
+
+    def unwatch (self) :
+        watcher, self.watcher = self.watcher, None
+        if watcher is not None :
+            watcher.stop ()
+    # end def unwatch
+
     def callsign_lookup (self, call) :
         """ Look up a DXCC entity of a callsign via CTY
             For compatibility with the DXCC lookup which can contain
             multiple matches we return a (one-element) list.
+            Results are kept in an LRU cache, see cache.stats ().
+        >>> d = tempfile.mkdtemp ()
+        >>> cd = CTY_DXCC (cache_size = 2, cache_dir = d)
+        >>> [e.code for e in cd.callsign_lookup ('OE3RSU')]
+        ['206']
+        >>> for c in ('OE3RSU', 'DL1AB', 'Q1AA', 'OE3RSU', 'Q1AA') :
+        ...     _ = cd.callsign_lookup (c)
+        >>> s = cd.cache.stats ()
+        >>> s ['hits'], s ['misses'], s ['evictions'], s ['size']
+        (2, 4, 2, 2)
+        >>> cd.changed ()
+        False
+        >>> cd.reload ()
+        >>> len (cd.cache), cd.cache.stats () ['hits']
+        (0, 2)
+        >>> import shutil
+        >>> shutil.rmtree (d)
         """
-        name = self.cty.callsign_lookup (call)
-        if name is None :
-            return []
-        name = darc_waedc_dxcc.get (name, name)
-        name = cty_to_dxcc.get     (name, name)
-        return [self.dxcc.by_name [name]]
+        cty, dxcc, cache, entities = self.tables
+        result = cache.get (call)
+        if result is None :
+            result = ()
+            name = cty.callsign_lookup (call)
+            if name is not None :
+                entity = entities [cty.countries [name]]
+                if entity is not None :
+                    result = (entity,)
+            cache [call] = result
+        return list (result)
     # end def dxcc_lookup
 
+    # Fewer unique calls are resolved without a process pool
+    min_pool = 50000
+
+    def _resolve_calls (self, calls, tables = None) :
+        """ ADIF fields dxcc, cqz, ituz and cont for each of the calls,
+            None if not found. Zones and continent come from the CTY
+            entry (which may override those of the DXCC entity), dxcc is
+            None if the country has no DXCC entity.
+        """
+        cty, dxcc, cache, entities = tables or self.tables
+        codes  = [e and str (int (e.code)) for e in entities]
+        result = []
+        for call in calls :
+            e = cty.lookup_full (call)
+            if e is None :
+                result.append (None)
+                continue
+            code = codes [cty.countries [e.country]]
+            result.append ((code, str (e.cq), str (e.itu), e.continent))
+        return result
+    # end def _resolve_calls
+
+    def resolve_array (self, calls, workers = None) :
+        """ Return ADIF fields (dxcc, cqz, ituz, cont) for each of the
+            calls, None for calls without a match. Each call is only
+            resolved once, with workers > 1 and many different calls
+            these are split over a process pool.
+        >>> d = tempfile.mkdtemp ()
+        >>> cd = CTY_DXCC (cache_dir = d)
+        >>> cd.resolve_array (['OE3RSU', 'Q1AA', 'BD6KF/0', 'OE3RSU'])
+        [('206', '15', '28', 'EU'), None, ('318', '23', '42', 'AS'), ('206', '15', '28', 'EU')]
+        >>> calls = list (cd.cty.prefix) + list (cd.cty.exact_callsign)
+        >>> r = cd.resolve_array (calls)
+        >>> len (r) == len (calls), None in r
+        (True, False)
+        >>> cd.min_pool = 10
+        >>> cd.resolve_array (calls, workers = 2) == r
+        True
+
+        The workers get the tables of the parent, e.g. after a reload
+        or with a changed mapping:
+        >>> cty, dxcc, cache, entities = cd.tables
+        >>> entities = list (entities)
+        >>> entities [cty.countries ['Japan']] = None
+        >>> cd.tables = (cty, dxcc, cache, entities)
+        >>> r = cd.resolve_array (calls)
+        >>> cd.resolve_array (calls, workers = 2) == r
+        True
+        >>> cd.resolve_array (['JA1AA'], workers = 2)
+        [(None, '25', '45', 'AS')]
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        tables = self.tables
+        unique = list (dict.fromkeys (calls))
+        if workers and workers > 1 and len (unique) >= self.min_pool :
+            n      = -(-len (unique) // (workers * 4))
+            chunks = [unique [i:i + n] for i in range (0, len (unique), n)]
+            resolved = []
+            with ProcessPoolExecutor \
+                ( workers
+                , initializer = init_worker
+                , initargs    = (tables [0], tables [3])
+                ) as executor :
+                for r in executor.map (resolve_calls, chunks) :
+                    resolved.extend (r)
+        else :
+            resolved = self._resolve_calls (unique, tables)
+        by_call = dict (zip (unique, resolved))
+        return [by_call [c] for c in calls]
+    # end def resolve_array
+
+    # Records resolved at once by resolve_records, large enough for
+    # the process pool of resolve_array to pay off
+    resolve_chunk = 500000
+
+    def _resolve (self, records, workers, overwrite, stats) :
+        """ Resolve a list of records, see resolve_records """
+        calls   = [r.field ('call') for r in records]
+        unique  = list (dict.fromkeys (c for c in calls if c))
+        fields  = {}
+        names   = ('dxcc', 'cqz', 'ituz', 'cont')
+        for call, r in zip (unique, self.resolve_array (unique, workers)) :
+            if r is not None :
+                fields [call] = dict \
+                    ((k, v) for k, v in zip (names, r) if v is not None)
+        for rec, call in zip (records, calls) :
+            f = fields.get (call)
+            if f is None :
+                stats ['unknown'] += 1
+                continue
+            if not overwrite :
+                f = dict ((k, v) for k, v in f.items () if not rec.field (k))
+            if f :
+                rec.set_fields (f)
+        stats ['records'] += len (records)
+        stats ['calls']   += len (unique)
+    # end def _resolve
+
+    def resolve_records \
+        (self, records, workers = None, overwrite = False, stats = None) :
+        """ Generate the records (any iterable, e.g. an ADIF_Stream)
+            with dxcc, cqz, ituz and cont set from the callsign. The
+            records are processed in chunks of resolve_chunk, the
+            different calls of a chunk are resolved in batch, see
+            resolve_array. If given, stats (see resolve) is updated,
+            calls are counted once per chunk.
+        >>> f = io.StringIO ('<call:6>OE3RSU <eor><call:4>Q1AA <eor>'
+        ...     '<call:6>OE3RSU <dxcc:1>1 <eor>')
+        >>> from hamradio.adif import ADIF_Stream
+        >>> d = tempfile.mkdtemp ()
+        >>> cd = CTY_DXCC (cache_dir = d)
+        >>> cd.resolve_chunk = 2
+        >>> stats = dict (records = 0, calls = 0, unknown = 0)
+        >>> recs = cd.resolve_records (ADIF_Stream (f), stats = stats)
+        >>> [r.field ('dxcc') for r in recs]
+        ['206', None, '1']
+        >>> stats
+        {'records': 3, 'calls': 3, 'unknown': 1}
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        if stats is None :
+            stats = dict (records = 0, calls = 0, unknown = 0)
+        it = iter (records)
+        while True :
+            chunk = list (islice (it, self.resolve_chunk))
+            if not chunk :
+                break
+            self._resolve (chunk, workers, overwrite, stats)
+            for r in chunk :
+                yield r
+    # end def resolve_records
+
+    def resolve (self, adif, workers = None, overwrite = False) :
+        """ Set the fields dxcc, cqz, ituz and cont of all records of
+            adif (an ADIF object or a list of records) from the
+            callsign, see resolve_records. Values already in the log
+            are kept unless overwrite is set, records without a call or
+            with an unknown call are left alone. Returns statistics
+            including the throughput in records per second. The
+            records of a stream (e.g. ADIF_Stream) would be lost here,
+            use resolve_records for these.
+        >>> f = io.StringIO ('<call:6>OE3RSU <eor><call:4>Q1AA <eor>'
+        ...     '<call:5>DL1AB <cqz:2>99 <eor><mode:2>CW <eor>')
+        >>> from hamradio.adif import ADIF, ADIF_Compact_Record
+        >>> adif = ADIF (f, record_class = ADIF_Compact_Record)
+        >>> d = tempfile.mkdtemp ()
+        >>> s = CTY_DXCC (cache_dir = d).resolve (adif)
+        >>> s ['records'], s ['calls'], s ['unknown'], s ['records_per_sec'] > 0
+        (4, 3, 2, True)
+        >>> [r.dict for r in adif.records [:3]]
+        ... # doctest: +NORMALIZE_WHITESPACE
+        [{'call': 'OE3RSU', 'dxcc': '206', 'cqz': '15', 'ituz': '28', 'cont': 'EU'},
+         {'call': 'Q1AA'},
+         {'call': 'DL1AB', 'cqz': '99', 'dxcc': '230', 'ituz': '28', 'cont': 'EU'}]
+        >>> s = CTY_DXCC (cache_dir = d).resolve (adif, overwrite = True)
+        >>> adif.records [2].cqz
+        '14'
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        start = perf_counter ()
+        stats = dict (records = 0, calls = 0, unknown = 0)
+        for r in self.resolve_records (adif, workers, overwrite, stats) :
+            pass
+        seconds = perf_counter () - start
+        stats ['seconds']         = seconds
+        stats ['records_per_sec'] = \
+            stats ['records'] / seconds if seconds else 0.0
+        return stats
+    # end def resolve
+
 # end class CTY_DXCC
 
+_cty_dxcc = None
+
+def init_worker (cty, entities) :
+    """ Initializer of the process pool of CTY_DXCC.resolve_array: The
+        worker uses the CTY and the DXCC entities of the parent, so it
+        gives the same results as resolving in the parent.
+    """
+    global _cty_dxcc
+    _cty_dxcc = CTY_DXCC.__new__ (CTY_DXCC)
+    _cty_dxcc.tables = (cty, None, None, entities)
+# end def init_worker
+
+def resolve_calls (calls) :
+    """ Worker of CTY_DXCC.resolve_array in a process pool """
+    return _cty_dxcc._resolve_calls (calls)
+# end def resolve_calls
+
 if __name__ == '__main__' :
     dxcc = DXCC_File ()
     dxcc.parse ()
@@ -251,9 +1215,8 @@ if __name__ == '__main__' :
         csl = sys.argv [1:]
     for cs in csl :
         print ('%s:' % cs, cty.callsign_lookup (cs))
-#    for c in sorted (cty.countries) :
-#        if c not in dxcc.by_name :
-#            print ('No dxcc country: %s' % c)
-#    for c in sorted (dxcc.by_name) :
-#        if c not in cty.countries :
-##            print ('DXCC country not found: %s' % c)
+    report = CTY_DXCC ().validate ()
+    for c in report ['cty'] :
+        print ('No dxcc country: %s' % c)
+    for c in report ['dxcc'] :
+        print ('DXCC country not found: %s' % c)
@@ -38,7 +38,9 @@ from datetime import datetime, timedelta
 from netrc    import netrc
 from getpass  import getpass
 from hamradio      import requester
-from hamradio.adif import ADIF, Native_ADIF_Record
+from hamradio.adif import ADIF, ADIF_Stream, Native_ADIF_Record
+from hamradio.adif import adif_datetime, adif_strftime
+from hamradio.bandplan import bandplan_austria
 from hamradio.lotw import LOTW_Query
 from hamradio.eqsl import EQSL_Query
 try :
@@ -50,13 +52,67 @@ except ImportError:
 from rsclib.autosuper import autosuper
 from rsclib.pycompat  import text_type
 
+cutoff_formats = \
+    ( "%Y-%m-%d.%H:%M:%S", "%Y-%m-%dT%H:%M:%S"
+    , "%Y-%m-%d.%H:%M",   "%Y-%m-%dT%H:%M"
+    , "%Y-%m-%d"
+    )
+
 def parse_cutoff (cutoff) :
-    fmts = \
-        ("%Y-%m-%d.%H:%M:%S", "%Y-%m-%dT%H:%M:%S"
-        , "%Y-%m-%d.%H:%M",   "%Y-%m-%dT%H:%M"
-        , "%Y-%m-%d"
-        )
-    for fmt in fmts :
+    """ Parse cutoff date given on the command line. The fixed-width
+        forms are decoded by adif_datetime, everything else (and all
+        errors) by trying the formats with strptime.
+    >>> parse_cutoff ('2020-01-02T03:04:05')
+    datetime.datetime(2020, 1, 2, 3, 4, 5)
+    >>> parse_cutoff ('2020-01-02')
+    datetime.datetime(2020, 1, 2, 0, 0)
+    >>> parse_cutoff ('2020-1-2.03:04')
+    datetime.datetime(2020, 1, 2, 3, 4)
+    >>> parse_cutoff ('2020-13-02')
+    Traceback (most recent call last):
+    ValueError: Unrecognized date format for 2020-13-02
+
+    Compare with the strptime formats for random dates:
+    >>> import random
+    >>> def strp (s) :
+    ...     for fmt in cutoff_formats :
+    ...         try :
+    ...             return datetime.strptime (s, fmt)
+    ...         except ValueError :
+    ...             pass
+    >>> def fast (s) :
+    ...     try :
+    ...         return parse_cutoff (s)
+    ...     except ValueError :
+    ...         pass
+    >>> def rnd (n, hi) :
+    ...     return '%0*d' % (n, random.randint (0, hi))
+    >>> random.seed (4711)
+    >>> bad = []
+    >>> for i in range (10000) :
+    ...     s = '-'.join ((rnd (4, 2100), rnd (2, 13), rnd (2, 32)))
+    ...     s = s + random.choice ('.T ') + rnd (2, 24) + ':' + rnd (2, 60)
+    ...     s = s + random.choice (('', ':' + rnd (2, 61)))
+    ...     s = s [:random.choice ((10, 16, 19, random.randint (0, 19)))]
+    ...     if strp (s) != fast (s) :
+    ...         bad.append (s)
+    >>> bad
+    []
+    """
+    n = len (cutoff)
+    if  (   n in (10, 16, 19)
+        and cutoff [4] == cutoff [7] == '-'
+        and (n == 10 or cutoff [10] in '.T' and cutoff [13] == ':')
+        and (n != 19 or cutoff [16] == ':')
+        ) :
+        d = cutoff [:4] + cutoff [5:7] + cutoff [8:10]
+        t = (cutoff [11:13] + cutoff [14:16] + cutoff [17:]) or '0000'
+        if not (d + t).strip ('0123456789') :
+            try :
+                return adif_datetime (d, t)
+            except ValueError :
+                pass
+    for fmt in cutoff_formats :
         try :
             dt = datetime.strptime (cutoff, fmt)
             break
@@ -165,10 +221,10 @@ class ADIF_Uploader (requester.Requester, Log_Mixin) :
         d = dict \
             ( call             = qso ['call']
             , mode             = mode ['adif_mode']
-            , qso_date         = start.strftime ('%Y%m%d')
-            , time_on          = start.strftime ('%H%M%S')
-            , qso_date_off     = end.strftime ('%Y%m%d')
-            , time_off         = end.strftime ('%H%M%S')
+            , qso_date         = adif_strftime (start, '%Y%m%d')
+            , time_on          = adif_strftime (start, '%H%M%S')
+            , qso_date_off     = adif_strftime (end, '%Y%m%d')
+            , time_off         = adif_strftime (end, '%H%M%S')
             , gridsquare       = qso ['gridsquare']
             , rst_sent         = qso ['rst_sent']
             , rst_rcvd         = qso ['rst_rcvd']
@@ -311,13 +367,9 @@ class ADIF_Uploader (requester.Requester, Log_Mixin) :
 
     def import_adif (self, adif) :
         count = 0
-        for record in adif.records :
+        for record in adif :
             aprops = set (('qso_date', 'time_on', 'time_off'))
-            ds = ADIF.date_cvt \
-                ( record ['qso_date']
-                , record ['time_on']
-                , date_format = self.date_format
-                )
+            ds = record.get_date (self.date_format)
             if ds <= self.cutoff :
                 continue
             if 'qso_date_off' in record :
@@ -497,12 +549,15 @@ class DB_Importer (Log_Mixin) :
         if args.cutoff_date :
             cutoff = parse_cutoff (args.cutoff_date)
         self.cutoff = cutoff
-        self.adif = None
+        self.adif      = None
+        self.adif_file = None
         if args.adiffile :
-            with io.open (args.adiffile, 'r', encoding = args.encoding) as f :
-                adif = ADIF (f)
-                adif.set_date_format (self.au.date_format)
-                self.adif = adif
+            # Records are parsed while iterating, the file stays open
+            # until the command in execute is done
+            self.adif_file = io.open \
+                (args.adiffile, 'r', encoding = args.encoding)
+            self.adif = ADIF_Stream (self.adif_file)
+            self.adif.set_date_format (self.au.date_format)
         self.logbook = None
         if args.qsl_type :
             if args.qsl_type == 'LOTW' :
@@ -520,14 +575,19 @@ class DB_Importer (Log_Mixin) :
 
     def execute (self) :
         method = getattr (self, 'do_' + self.args.command)
-        method ()
+        try :
+            method ()
+        finally :
+            if self.adif_file :
+                self.adif_file.close ()
     # end def execute
 
     # Command methods start with 'do'
 
     def do_import (self) :
         self.au.set_cutoff_date (self.cutoff)
-        self.au.import_adif (self.adif)
+        # Exports of e.g. WSJTX may only contain the frequency
+        self.au.import_adif (bandplan_austria.enrich_records (self.adif))
     # end def do_import
 
     def do_import_qsl (self) :
@@ -546,16 +606,12 @@ class DB_Importer (Log_Mixin) :
             raise ValueError ("No ADIF file specified")
         self.adif.set_date_format (self.minute_date_format)
         ladif = self.logbook.get_qso (since = self.cutoff, mydetail = 'yes')
-        ladif.set_date_format (self.minute_date_format)
-        for r in self.adif.records :
+        index = ladif.get_index ()
+        for r in self.adif :
             ds = r.get_date ()
             if cutoff and ds <= cutoff :
                 continue
-            calls = ladif.by_call.get (r.call, [])
-            for lc in calls :
-                if lc.get_date () == r.get_date () :
-                    break
-            else :
+            if not index.find (r.call, r.get_datetime ()) :
                 self.notice ("Call: %s not in %s" % (r.call, qtype))
                 continue
             self.info ("Found %s in %s" % (r.call, qtype))
@@ -563,7 +619,7 @@ class DB_Importer (Log_Mixin) :
             submode = r.dict.get ('submode', None)
             qsl = self.au.find_qsl \
                 ( r.call
-                , r.get_date ()
+                , ds
                 , type    = qtype
                 , mode    = r.get_mode ()
                 , submode = submode
@@ -573,7 +629,7 @@ class DB_Importer (Log_Mixin) :
                 # Search QSO
                 qso = self.au.find_qso \
                     ( r.call
-                    , r.get_date ()
+                    , ds
                     , mode    = r.get_mode ()
                     , submode = submode
                     )
@@ -623,18 +679,15 @@ class DB_Importer (Log_Mixin) :
             }
         qsl = self.au.get ('qsl?' + urlencode (d))['data']['collection']
         adif = self.logbook.get_qso (since = self.cutoff, mydetail = 'yes')
-        adif.set_date_format (self.au.date_format)
+        index = adif.get_index ()
         for n, q in enumerate (qsl) :
             qso = self.au.get ('qso/%s' % q ['qso']['id'])
             q ['QSO'] = qso ['data']['attributes']
-            # Look it up by call in logbook
+            # Look it up by call and minute in logbook
             call = q ['QSO']['call']
             date = q ['QSO']['qso_start']
-            for a in adif.by_call.get (call, []) :
-                assert a.call == call
-                if a.get_date ()[:16] == date [:16] :
-                    self.animate_info ("%s: found: %s   " % (n, call))
-                    break
+            if index.find (call, parse_cutoff (date [:16])) :
+                self.animate_info ("%s: found: %s   " % (n, call))
             else :
                 if q ['QSO']['swl'] :
                     self.notice ("%s: %s: SWL       " % (n, call))
@@ -647,7 +700,8 @@ class DB_Importer (Log_Mixin) :
             they exist as SQL records (correct qsl type) in local DB.
         """
         qtype = self.args.qsl_type
-        adif = self.logbook.get_qso (since = self.cutoff, mydetail = 'yes')
+        adif = self.logbook.get_qso \
+            (since = self.cutoff, mydetail = 'yes', stream = True)
         adif.set_date_format (self.au.date_format)
         for n, a in enumerate (adif) :
             submode = a.dict.get ('submode', None)
@@ -670,9 +724,9 @@ class DB_Importer (Log_Mixin) :
     def do_check_log_app_dupes (self) :
         qtype = self.args.qsl_type
         adif = self.logbook.get_qso (since = self.cutoff, mydetail = 'yes')
-        adif.set_date_format (self.au.date_format)
-        for k, key in enumerate (adif.by_call) :
-            calls = adif.by_call [key]
+        index = adif.get_index ()
+        # Duplicates have the same start and are in the same minute
+        for k, calls in enumerate (index.by_call_minute.values ()) :
             if len (calls) == 1 :
                 c = calls [0]
                 self.animate_info ("%s: no dupe: %s       " % (k, c.call))
@@ -680,7 +734,7 @@ class DB_Importer (Log_Mixin) :
             for n, c1 in enumerate (calls) :
                 for c2 in calls [n+1:] :
                     assert c1.call == c2.call
-                    if c1.get_date () == c2.get_date () :
+                    if c1.get_datetime () == c2.get_datetime () :
                         self.notice ("Duplicate %s record:" % qtype)
                         self.notice ("First:\n",  c1)
                         self.notice ("Second:\n", c2)
@@ -710,7 +764,11 @@ class DB_Importer (Log_Mixin) :
             elif self.args.archived == 'all' :
                 archived = None
         adif = self.logbook.get_qsl \
-            (since = self.cutoff, mydetail = 'yes', archived = archived)
+            ( since    = self.cutoff
+            , mydetail = 'yes'
+            , archived = archived
+            , stream   = True
+            )
         adif.set_date_format (self.au.date_format)
         for a in adif :
             date = a.get_date ()
@@ -850,6 +908,17 @@ class DB_Importer (Log_Mixin) :
                     ("QSL %s %s updated: %s" % (date, a.call, qsl_dict))
     # end def do_check_qsl
 
+    def write_adif (self, adif) :
+        """ Write adif to the export_adif file or standard output """
+        if self.args.export_adif :
+            fn = self.args.export_adif
+            with io.open (fn, 'w', encoding = self.args.encoding) as f :
+                adif.write (f)
+        else :
+            adif.write (sys.stdout)
+            print ()
+    # end def write_adif
+
     def do_export_adif_from_list (self) :
         """ Needs listfile option, this contains a listing that is
             output by the find_qso_without_qsl check of the form
@@ -868,12 +937,7 @@ class DB_Importer (Log_Mixin) :
                 date, call = line.split () [:2]
                 qso = self.au.find_qso (call, date)
                 adif.append (self.au.qso_as_adif (qso ['id']))
-        if self.args.export_adif :
-            fn = self.args.export_adif
-            with io.open (fn, 'w', encoding = self.args.encoding) as f :
-                f.write (text_type (adif))
-        else :
-            print (adif)
+        self.write_adif (adif)
     # end def do_export_adif_from_list
 
     def do_export_adif_from_query (self) :
@@ -886,12 +950,7 @@ class DB_Importer (Log_Mixin) :
         q = q ['data']['collection']
         for k in q :
             adif.append (self.au.qso_as_adif (k ['id']))
-        if self.args.export_adif :
-            fn = self.args.export_adif
-            with io.open (fn, 'w', encoding = self.args.encoding) as f :
-                f.write (text_type (adif))
-        else :
-            print (adif)
+        self.write_adif (adif)
     # end def do_export_adif_from_query
 
     def do_find_qso_without_qsl_in_db (self) :
@@ -928,9 +987,7 @@ class DB_Importer (Log_Mixin) :
             else :
                 self.animate_info ("%s: found: %s         " % (n, call))
         if self.args.export_adif :
-            fn = self.args.export_adif
-            with io.open (fn, 'w', encoding = self.args.encoding) as f :
-                f.write (text_type (adif))
+            self.write_adif (adif)
     # end def do_find_qso_without_qsl_in_db
 
 # end class DB_Importer
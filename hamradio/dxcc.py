@@ -29,11 +29,11 @@
 
 import io
 import os
-import requests
 from re                 import compile as rc
 from argparse           import ArgumentParser
 from rsclib.autosuper   import autosuper
-from rsclib.stateparser import Parser
+from rsclib.stateparser import Parse_Error
+from hamradio.filecache import File_Cache, Cached_Download
 
 def prefix_sequence (seq) :
     """ Generate a sequence of prefixes from certain input ranges
@@ -129,8 +129,14 @@ class DXCC_Entry (autosuper) :
 
 # end class DXCC_Entry
 
-class DXCC_Parser (Parser) :
-    encoding   = None
+class DXCC_Parser (autosuper) :
+    """ Parser for one section (current or deleted entities) of the
+        ARRL DXCC list. Lines are fed one at a time, the state machine
+        is given by matrix: In a state the first row whose pattern
+        matches the line (None matches everything, a string must be
+        equal to the line, a regex must be found in it) calls the
+        action and switches to the new state.
+    """
     re_entity  = rc (r'^(CURRENT|DELETED) ENTITIES')
     re_date    = rc (r'^([A-Z][a-z]+)\s+([0-9]{4})\s+Edition')
     re_total   = rc (r'^([A-Za-z]+)\s+Entities Total:\s+([0-9]+)\s+')
@@ -167,7 +173,9 @@ class DXCC_Parser (Parser) :
     , ["note",  None,             'note', "append_note"]
     ]
 
-    def __init__ (self, *args, **kw) :
+    def __init__ (self) :
+        self.state     = 'init'
+        self.lineno    = 0
         self.head_text = []
         self.crossref  = {}
         self.entries   = []
@@ -177,9 +185,45 @@ class DXCC_Parser (Parser) :
         self.notes     = {}
         self.lastnote  = None
         self.prf_max   = 0
-        self.__super.__init__ (*args, **kw)
+        self.__super.__init__ ()
     # end def __init__
 
+    @classmethod
+    def transitions (cls) :
+        """ Rows of matrix by state, computed once per class """
+        if '_transitions' not in cls.__dict__ :
+            t = {}
+            for state, pattern, new_state, action in cls.matrix :
+                t.setdefault (state, []).append ((pattern, new_state, action))
+            cls._transitions = t
+        return cls._transitions
+    # end def transitions
+
+    def feed (self, line) :
+        """ Parse next line """
+        self.line    = line = line.rstrip ()
+        self.lineno += 1
+        for pattern, new_state, action in self.transitions () [self.state] :
+            match = None
+            if pattern is not None and line != pattern :
+                if isinstance (pattern, str) :
+                    continue
+                match = pattern.search (line)
+                if not match :
+                    continue
+            if action :
+                getattr (self, action) (self.state, new_state, match)
+            self.state = new_state
+            return
+        raise Parse_Error ("%s: %s" % (self.lineno, line))
+    # end def feed
+
+    def parse (self, f) :
+        """ Parse all lines of f """
+        for line in f :
+            self.feed (line)
+    # end def parse
+
     def callsign_lookup (self, callsign) :
         for n in reversed (range (self.prf_max)) :
             pfx = callsign [:n+1]
@@ -194,7 +238,7 @@ class DXCC_Parser (Parser) :
         c = None
         o = None
         p = g [0]
-        p = p.rstrip ('#').rstrip ('*').rstrip ('#').rstrip ('*')
+        p = p.rstrip ('#*')
         cross = []
         if '(' in p :
             p, cross = p.split ('(', 1)
@@ -204,7 +248,7 @@ class DXCC_Parser (Parser) :
                 cross = cross.split ('),(')
             else :
                 cross = [cross]
-            p = p.rstrip ('#').rstrip ('*').rstrip ('#').rstrip ('*')
+            p = p.rstrip ('#*')
         if '_' in p :
             p, o = p.split ('_', 1)
         e = DXCC_Entry (g [5], g [1].rstrip (), g [2], g [3], g [4])
@@ -285,48 +329,132 @@ class DXCC_Parser (Parser) :
 
 # end class DXCC_Parser
 
-class DXCC_File (autosuper) :
-    base = '2019_Current_Deleted(3).txt'
-    url  = 'http://www.arrl.org/files/file/DXCC/' + base
-    file = os.path.join (os.path.dirname (__file__), 'data', base)
+class DXCC_File (File_Cache, autosuper) :
+    """ The ARRL DXCC list, parsed lists of current and deleted
+        entities are in by_type. The result of parsing a file is
+        cached, see File_Cache. With an url the list is downloaded
+        to the cache directory and only fetched again when it changed
+        on the server (see Cached_Download), if there is no local copy
+        and the server is unreachable we use file.
+    """
+    base   = '2019_Current_Deleted(3).txt'
+    url    = 'http://www.arrl.org/files/file/DXCC/' + base
+    file   = os.path.join (os.path.dirname (__file__), 'data', base)
+    header = 'ARRL DXCC LIST'
+
+    cache_name        = 'dxcc'
+    cache_version     = 1
+    cached_attributes = ('dxcc_list', 'by_type')
 
-    def __init__ (self, url = None, file = file) :
+    def __init__ \
+        (self, url = None, file = file, cache_dir = None, max_age = 0) :
+        if cache_dir is not None :
+            self.cache_dir = cache_dir
         self.url       = url
         self.file      = file
+        self.source    = file
         self.dxcc_list = []
         self.by_type   = {}
+        self.file_stat = None
+        self.download  = None
         if self.url is not None :
-            self.session = requests.session ()
+            self.download = Cached_Download \
+                (url, cache_dir, fallback = file, max_age = max_age)
     # end def __init__
 
+    def stat (self, filename = None) :
+        st = os.stat (filename or self.source)
+        return st.st_size, st.st_mtime_ns
+    # end def stat
+
+    def fetch (self) :
+        """ Name of the file to parse, downloaded if we have an url """
+        if self.download is None :
+            return self.file
+        return self.download.fetch ()
+    # end def fetch
+
+    def changed (self) :
+        """ True if the file changed since it was parsed, with an url
+            this makes a conditional request to the server.
+        """
+        try :
+            source = self.fetch ()
+            if source != self.source :
+                return True
+            return self.stat (source) != self.file_stat
+        except (OSError, RuntimeError) :
+            return False
+    # end def changed
+
     def parse (self) :
-        h = 'ARRL DXCC LIST'
-        if self.url is not None :
-            r = self.session.get (self.url)
-            if not (200 <= r.status_code <= 299) :
-                raise RuntimeError \
-                    ( 'Invalid get result: %s: %s\n    %s'
-                    % (r.status_code, r.reason, r.text)
-                    )
-            t = r.text
-        else :
-            with io.open (self.file, 'r') as f :
-                t = f.read ()
-        t = t.split (h)
-        assert len (t) > 1
-        self.dxcc_list = []
-        self.by_type   = {}
-        for k in t :
-            if not k.strip () :
-                continue
-            with io.StringIO (h + k) as f :
-                self.dxcc_list.append (DXCC_Parser ())
-                self.dxcc_list [-1].parse (f)
-        for l in self.dxcc_list :
+        """ Parse the DXCC list or load it from the cache. The new lists
+            replace dxcc_list and by_type only when parsing is complete,
+            so parse can be used to reload the file while other threads
+            use the old lists.
+        >>> import shutil, tempfile
+        >>> d  = tempfile.mkdtemp ()
+        >>> df = DXCC_File (cache_dir = d)
+        >>> df.parse ()
+        >>> cached = DXCC_File (cache_dir = d)
+        >>> cached.parse ()
+        >>> df.loaded_from_cache, cached.loaded_from_cache
+        (False, True)
+        >>> cur = cached.by_type ['CURRENT']
+        >>> len (cur.entries), cur.entity_total, len (cur.prefix)
+        (340, 340, 780)
+        >>> cur.callsign_lookup ('OE3RSU') [0].name
+        'Austria'
+        >>> sorted (cached.by_type), len (cached.by_type ['DELETED'].entries)
+        (['CURRENT', 'DELETED'], 62)
+
+        If the list can't be downloaded the local file is used:
+        >>> df = DXCC_File ('http://127.0.0.1:1/dxcc.txt', cache_dir = d)
+        >>> df.parse ()
+        >>> df.download.thread.join ()
+        >>> df.download.status, df.source == df.file, df.loaded_from_cache
+        ('fallback', True, True)
+        >>> shutil.rmtree (d)
+        """
+        source    = self.fetch ()
+        file_stat = self.stat (source)
+        if self.load_cache (source) :
+            self.source    = source
+            self.file_stat = file_stat
+            return
+        with io.open (source, 'r') as f :
+            dxcc_list = self.parse_lines (f)
+        by_type = {}
+        for l in dxcc_list :
             t = l.entity_type
-            assert t not in self.by_type
-            self.by_type [t] = l
+            assert t not in by_type
+            by_type [t] = l
+        self.dxcc_list = dxcc_list
+        self.by_type   = by_type
+        self.source    = source
+        self.file_stat = file_stat
+        self.write_cache (source)
     # end def parse
+    reload = parse
+
+    def parse_lines (self, f) :
+        """ Parse the lines of the DXCC list in one pass, each section
+            starting with the header line gets its own DXCC_Parser.
+        """
+        dxcc_list = []
+        parser    = None
+        for line in f :
+            if line.startswith (self.header) :
+                parser = DXCC_Parser ()
+                dxcc_list.append (parser)
+            elif parser is None :
+                if line.strip () :
+                    raise Parse_Error ("1: %s" % line.rstrip ())
+                continue
+            parser.feed (line)
+        assert dxcc_list
+        return dxcc_list
+    # end def parse_lines
 
 # end class DXCC_File
 
@@ -348,7 +476,7 @@ def main () :
         , default = None
         )
     args = cmd.parse_args ()
-    df   = DXCC_File (url = args.url, file = file)
+    df   = DXCC_File (url = args.url, file = args.file)
     df.parse ()
     #for l in df.dxcc_list :
     #    #print l.entity_type
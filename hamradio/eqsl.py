@@ -37,7 +37,7 @@ from time            import sleep
 from datetime        import datetime
 from argparse        import ArgumentParser
 from hamradio        import requester
-from hamradio.adif   import ADIF
+from hamradio.adif   import ADIF, ADIF_Stream
 from bs4             import BeautifulSoup
 try :
     from urllib.parse import urlencode, urljoin
@@ -65,7 +65,7 @@ class EQSL_Query (requester.Requester) :
             (self.import_url, username, password, relax_username_check = True)
     # end def __init__
 
-    def _get_adif (self, linkpage, type = 'Outbox') :
+    def _get_adif (self, linkpage, type = 'Outbox', stream = False) :
         if 'Your ADIF log file has been built' not in linkpage :
             raise ValueError ("Error getting %s:\n%s" % (type, linkpage))
         soup = BeautifulSoup (linkpage, 'html.parser')
@@ -80,15 +80,18 @@ class EQSL_Query (requester.Requester) :
             raise ValueError ("Error getting %s: ADIF url not found" % type)
         self.url = urljoin (self.base_url, href)
         t = self.get ('', as_text = True)
+        if stream :
+            return ADIF_Stream (io.StringIO (t))
         with io.StringIO (t) as f :
             adif = ADIF (f)
         return adif
     # end def _get_adif
 
-    def get_qso (self, **kw) :
+    def get_qso (self, stream = False, **kw) :
         """ Get whole Outbox as ADIF
             'since' and other parameters are ignored, currently eQSL
             can't limit the downloaded QSOs
+            With stream set we return an ADIF_Stream.
         """
         self.url = self.out_url
         d = {}
@@ -96,12 +99,13 @@ class EQSL_Query (requester.Requester) :
         d ['Password']    = self.get_pw ()
         d ['QTHNickname'] = self.nickname
         t = self.get ('?' + urlencode (d), as_text = True)
-        return self._get_adif (t)
+        return self._get_adif (t, stream = stream)
     # end def get_qso
 
-    def get_qsl (self, since = '', archived = None, **kw) :
+    def get_qsl (self, since = '', archived = None, stream = False, **kw) :
         """ Get Inbox as ADIF
             'since' is a datetime instance
+            With stream set we return an ADIF_Stream.
         """
         self.url = self.in_url
         d = {}
@@ -115,7 +119,7 @@ class EQSL_Query (requester.Requester) :
         if archived is not None :
             d ['Archive']   = int (bool (archived))
         t = self.get ('?' + urlencode (d), as_text = True)
-        return self._get_adif (t, 'Inbox')
+        return self._get_adif (t, 'Inbox', stream = stream)
     # end def get_qsl
 
     def get_qslcard (self, rec, own_call) :
@@ -0,0 +1,387 @@
+#!/usr/bin/python3
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ****************************************************************************
+
+""" Cache tables parsed from data files on disk and local copies of
+    data files downloaded from a web server
+"""
+
+import io
+import os
+import json
+import time
+import pickle
+import hashlib
+import tempfile
+import requests
+import threading
+
+def write_atomic (filename, data) :
+    """ Write data (bytes) to filename via a temporary file, readers
+        see either the old or the new contents.
+    """
+    dirname = os.path.dirname (filename)
+    os.makedirs (dirname, exist_ok = True)
+    fd, tmp = tempfile.mkstemp (dir = dirname, suffix = '.tmp')
+    try :
+        with io.open (fd, 'wb') as f :
+            f.write (data)
+        os.replace (tmp, filename)
+    except BaseException :
+        os.unlink (tmp)
+        raise
+# end def write_atomic
+
+class File_Cache (object) :
+    """ Mixin that caches attributes computed by parsing a file as a
+        pickle in cache_dir (None disables the cache). Classes using
+        it define cache_name (prefix of the cache file), cached_attributes
+        and cache_version; the cache is invalid when cache_version or
+        the file changes.
+    """
+
+    cache_dir         = os.path.join \
+        ( os.environ.get ('XDG_CACHE_HOME')
+          or os.path.join (os.path.expanduser ('~'), '.cache')
+        , 'hamradio'
+        )
+    cache_name        = None
+    cache_version     = 1
+    cached_attributes = ()
+    loaded_from_cache = False
+
+    def cache_file (self, filename) :
+        """ Name of the cache file for filename """
+        path = os.path.abspath (filename).encode ('utf-8', 'surrogateescape')
+        name = '%s-%s.pickle' % \
+            (self.cache_name, hashlib.sha1 (path).hexdigest ())
+        return os.path.join (self.cache_dir, name)
+    # end def cache_file
+
+    def file_key (self, filename, data = None) :
+        """ Size, mtime and (if data is given) SHA-256 of the file """
+        st = os.stat (filename)
+        h  = data and hashlib.sha256 (data).hexdigest ()
+        return st.st_size, st.st_mtime_ns, h
+    # end def file_key
+
+    def load_cache (self, filename) :
+        """ Load the parsed tables from the cache, return True if
+            successful. If size and mtime of filename don't match the
+            cached values we compare the SHA-256 of the contents, an
+            unchanged file (e.g. after a copy) refreshes the cache.
+        >>> from hamradio.cty import CTY
+        >>> d = tempfile.mkdtemp ()
+        >>> cty = CTY (CTY.data, cache_dir = d)
+        >>> os.listdir (d) == [os.path.basename (cty.cache_file (CTY.data))]
+        True
+        >>> cached = CTY (CTY.data, cache_dir = d)
+        >>> cached.loaded_from_cache, cty.loaded_from_cache
+        (True, False)
+        >>> cached.prefix == cty.prefix, cached.trie == cty.trie
+        (True, True)
+        >>> cached.callsign_lookup ('OE3RSU')
+        'Austria'
+
+        A modified file is parsed again:
+        >>> fn = os.path.join (d, 'cty.dat')
+        >>> with io.open (CTY.data, 'r') as f :
+        ...     text = f.read ()
+        >>> with io.open (fn, 'w') as f :
+        ...     _ = f.write (text.replace ('OE,=4U0R', 'OE,=DL9ZZZ,=4U0R'))
+        >>> CTY (fn, cache_dir = d).loaded_from_cache
+        False
+        >>> c = CTY (fn, cache_dir = d)
+        >>> c.loaded_from_cache, c.callsign_lookup ('DL9ZZZ')
+        (True, 'Austria')
+        >>> with io.open (fn, 'w') as f :
+        ...     _ = f.write (text.replace ('OE,=4U0R', 'OE,=DL9ZZZ,=4U0R'))
+        >>> CTY (fn, cache_dir = d).loaded_from_cache
+        True
+        >>> with io.open (fn, 'w') as f :
+        ...     _ = f.write (text)
+        >>> c = CTY (fn, cache_dir = d)
+        >>> c.loaded_from_cache, c.callsign_lookup ('DL9ZZZ')
+        (False, 'Fed. Rep. of Germany')
+        >>> import shutil
+        >>> shutil.rmtree (d)
+        """
+        self.loaded_from_cache = False
+        if self.cache_dir is None :
+            return False
+        try :
+            with io.open (self.cache_file (filename), 'rb') as f :
+                cache = pickle.load (f)
+            if cache ['version'] != self.cache_version :
+                return False
+            key = self.file_key (filename)
+            if key [:2] != cache ['key'][:2] :
+                with io.open (filename, 'rb') as f :
+                    key = self.file_key (filename, f.read ())
+                if key [2] != cache ['key'][2] :
+                    return False
+                cache ['key'] = key
+                self._write_cache (filename, cache)
+        except (OSError, EOFError, KeyError, ValueError, TypeError,
+                AttributeError, ImportError, pickle.UnpicklingError) :
+            return False
+        for k in self.cached_attributes :
+            setattr (self, k, cache [k])
+        self.loaded_from_cache = True
+        return True
+    # end def load_cache
+
+    def write_cache (self, filename) :
+        """ Write the parsed tables to the cache, errors (e.g. a
+            read-only home directory) are ignored.
+        """
+        if self.cache_dir is None :
+            return
+        try :
+            with io.open (filename, 'rb') as f :
+                key = self.file_key (filename, f.read ())
+        except OSError :
+            return
+        cache = dict ((k, getattr (self, k)) for k in self.cached_attributes)
+        cache ['version'] = self.cache_version
+        cache ['key']     = key
+        self._write_cache (filename, cache)
+    # end def write_cache
+
+    def _write_cache (self, filename, cache) :
+        """ Write cache atomically via a temporary file """
+        try :
+            data = pickle.dumps (cache, pickle.HIGHEST_PROTOCOL)
+            write_atomic (self.cache_file (filename), data)
+        except OSError :
+            pass
+    # end def _write_cache
+
+# end class File_Cache
+
+class Cached_Download (object) :
+    r""" Local copy of a file on a web server, kept in the download
+        directory of the cache dir together with its validators (ETag
+        and Last-Modified). fetch issues a conditional request, so an
+        unchanged file is not downloaded again. When the server is
+        unreachable or returns an error the local copy is used, if
+        there is none the fallback file (if given). If the last check
+        was less than max_age seconds ago no request is made at all.
+        With background set (the default) fetch doesn't wait for the
+        server if there is a local copy or a fallback: These are
+        returned immediately while the request runs in a thread, a
+        later fetch returns the new copy.
+    >>> import shutil, threading
+    >>> from http.server import HTTPServer, BaseHTTPRequestHandler
+    >>> class Handler (BaseHTTPRequestHandler) :
+    ...     body = b'version 1\n'
+    ...     gate = threading.Event ()
+    ...     def do_GET (self) :
+    ...         self.gate.wait (10)
+    ...         etag = '"%s"' % hashlib.sha1 (self.body).hexdigest ()
+    ...         if self.headers.get ('If-None-Match') == etag :
+    ...             self.send_response (304)
+    ...             self.end_headers ()
+    ...             return
+    ...         self.send_response (200)
+    ...         self.send_header ('ETag', etag)
+    ...         self.send_header ('Content-Length', len (self.body))
+    ...         self.end_headers ()
+    ...         self.wfile.write (self.body)
+    ...     def log_message (self, *args) :
+    ...         pass
+    >>> server = HTTPServer (('127.0.0.1', 0), Handler)
+    >>> thread = threading.Thread (target = server.serve_forever)
+    >>> thread.start ()
+    >>> Handler.gate.set ()
+    >>> url = 'http://127.0.0.1:%s/x.txt' % server.server_port
+    >>> d  = tempfile.mkdtemp ()
+    >>> dl = Cached_Download (url, cache_dir = d, background = False)
+    >>> path = dl.fetch ()
+    >>> dl.status, io.open (path).read ()
+    ('downloaded', 'version 1\n')
+    >>> dl.fetch () == path, dl.status
+    (True, 'not modified')
+    >>> Handler.body = b'version 2\n'
+    >>> dl.fetch () == path, dl.status, io.open (path).read ()
+    (True, 'downloaded', 'version 2\n')
+
+    In the background the local copy is returned first, here the
+    server waits for the gate:
+    >>> Handler.body = b'version 3\n'
+    >>> Handler.gate.clear ()
+    >>> bg = Cached_Download (url, cache_dir = d)
+    >>> bg.fetch () == path, bg.status, io.open (path).read ()
+    (True, 'refreshing', 'version 2\n')
+    >>> Handler.gate.set ()
+    >>> bg.thread.join ()
+    >>> bg.status, io.open (bg.fetch ()).read ()
+    ('downloaded', 'version 3\n')
+    >>> bg.thread.join ()
+    >>> bg.status
+    'not modified'
+    >>> Handler.gate.clear ()
+    >>> fb = Cached_Download (url + '?fb', cache_dir = d, fallback = 'fb')
+    >>> fb.fetch (), fb.status
+    ('fb', 'refreshing')
+    >>> Handler.gate.set ()
+    >>> fb.thread.join ()
+    >>> fb.fetch () == fb.path
+    True
+    >>> fb.thread.join ()
+    >>> server.shutdown ()
+    >>> server.server_close ()
+    >>> thread.join ()
+    >>> dl.fetch () == path, dl.status
+    (True, 'offline')
+    >>> Cached_Download (url, cache_dir = d, max_age = 60).fetch () == path
+    True
+    >>> dl = Cached_Download (url + '?new', cache_dir = d, fallback = 'fb')
+    >>> dl.fetch ()
+    'fb'
+    >>> dl.thread.join ()
+    >>> dl.status
+    'fallback'
+    >>> dl.background = False
+    >>> dl.fetch (), dl.status
+    ('fb', 'fallback')
+    >>> shutil.rmtree (d)
+    """
+
+    timeout = 10
+
+    def __init__ \
+        ( self
+        , url
+        , cache_dir  = None
+        , fallback   = None
+        , max_age    = 0
+        , session    = None
+        , timeout    = None
+        , background = True
+        ) :
+        self.url        = url
+        self.cache_dir  = os.path.join \
+            (cache_dir or File_Cache.cache_dir, 'download')
+        self.fallback   = fallback
+        self.max_age    = max_age
+        self.session    = session or requests.session ()
+        self.background = background
+        self.thread     = None
+        self.status     = None
+        if timeout is not None :
+            self.timeout = timeout
+        name = os.path.basename (url.split ('?') [0]) or 'index'
+        name = '%s-%s' % \
+            (hashlib.sha1 (url.encode ('utf-8')).hexdigest (), name)
+        self.path      = os.path.join (self.cache_dir, name)
+        self.meta_path = self.path + '.json'
+    # end def __init__
+
+    def read_meta (self) :
+        try :
+            with io.open (self.meta_path, 'r') as f :
+                return json.load (f)
+        except (OSError, ValueError) :
+            return {}
+    # end def read_meta
+
+    def fetch (self) :
+        """ Return the name of the local copy (or the fallback), after
+            fetching the file if it changed on the server. The result
+            is in status: 'downloaded', 'not modified', 'fresh' (no
+            request made due to max_age), 'offline' (local copy used
+            after an error), 'fallback' or 'refreshing' (the request
+            runs in the background).
+        """
+        meta = self.read_meta ()
+        have = os.path.exists (self.path)
+        age  = time.time () - meta.get ('checked', 0)
+        if have and self.max_age and age < self.max_age :
+            self.status = 'fresh'
+            return self.path
+        if self.background and (have or self.fallback) :
+            if self.thread is None or not self.thread.is_alive () :
+                self.status = 'refreshing'
+                self.thread = threading.Thread \
+                    (target = self._refresh, daemon = True)
+                self.thread.start ()
+            return self.path if have else self.fallback
+        return self.refresh ()
+    # end def fetch
+
+    def _refresh (self) :
+        try :
+            self.refresh ()
+        except (OSError, RuntimeError) :
+            pass
+    # end def _refresh
+
+    def refresh (self) :
+        """ Make the request, see fetch """
+        meta = self.read_meta ()
+        have = os.path.exists (self.path)
+        now  = time.time ()
+        headers = {}
+        if have and meta.get ('etag') :
+            headers ['If-None-Match'] = meta ['etag']
+        if have and meta.get ('last_modified') :
+            headers ['If-Modified-Since'] = meta ['last_modified']
+        try :
+            r = self.session.get \
+                (self.url, headers = headers, timeout = self.timeout)
+        except requests.RequestException as err :
+            r, error = None, str (err)
+        else :
+            error = '%s: %s' % (r.status_code, r.reason)
+        if r is not None and r.status_code == 304 and have :
+            self.status = 'not modified'
+        elif r is not None and 200 <= r.status_code <= 299 :
+            write_atomic (self.path, r.content)
+            meta = dict \
+                ( etag          = r.headers.get ('ETag')
+                , last_modified = r.headers.get ('Last-Modified')
+                )
+            self.status = 'downloaded'
+        elif have :
+            self.status = 'offline'
+            return self.path
+        elif self.fallback :
+            self.status = 'fallback'
+            return self.fallback
+        else :
+            raise RuntimeError ('Cannot get %s: %s' % (self.url, error))
+        meta ['checked'] = now
+        try :
+            write_atomic (self.meta_path, json.dumps (meta).encode ('utf-8'))
+        except OSError :
+            pass
+        return self.path
+    # end def refresh
+
+# end class Cached_Download
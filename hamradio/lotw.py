@@ -34,7 +34,7 @@ import sys
 from argparse        import ArgumentParser
 from rsclib.pycompat import text_type
 from hamradio        import requester
-from hamradio.adif   import ADIF
+from hamradio.adif   import ADIF, ADIF_Stream
 try :
     from urllib.parse import urlencode
 except ImportError:
@@ -50,7 +50,21 @@ class LOTW_Query (requester.Requester) :
         self.__super.__init__ (self.url, username, password)
     # end def __init__
 
-    def get_qso (self, since = None, **args) :
+    def _get_adif (self, d, stream = False) :
+        """ Retrieve ADIF with given query parameters, with stream set
+            the records are parsed while the download is in progress
+            and we return an ADIF_Stream.
+        """
+        if stream :
+            r = self.get ('?' + urlencode (d), as_result = True, stream = True)
+            return ADIF_Stream (requester.Response_Reader (r))
+        t = self.get ('?' + urlencode (d), as_text = True)
+        with io.StringIO (t) as f :
+            adif = ADIF (f)
+        return adif
+    # end def _get_adif
+
+    def get_qso (self, since = None, stream = False, **args) :
         """ Get QSOs for the given parameters.
             Parameters are automagically prefixed with 'qso_'
             Allowed values according to
@@ -59,7 +73,8 @@ class LOTW_Query (requester.Requester) :
             enddate, endtime, mydetail, withown.
             Note that the 'since' parameter specifies the date QSO were
             uploaded to LOTW, not the startdate/starttime of the QSO.
-            We directly return an ADIF object.
+            We directly return an ADIF object (an ADIF_Stream if
+            stream is set).
         """
         d = {}
         for a in args :
@@ -70,13 +85,10 @@ class LOTW_Query (requester.Requester) :
         d ['qso_query']      = 1
         if since :
             d ['qso_qsorxsince'] = since.strftime ('%Y-%m-%d')
-        t = self.get ('?' + urlencode (d), as_text = True)
-        with io.StringIO (t) as f :
-            adif = ADIF (f)
-        return adif
+        return self._get_adif (d, stream)
     # end def get_qso
 
-    def get_qsl (self, since = None, **args) :
+    def get_qsl (self, since = None, stream = False, **args) :
         """ Get QSLs for the given parameters.
             Parameters are automagically prefixed with 'qso_'
             according the the lotw API.
@@ -86,7 +98,8 @@ class LOTW_Query (requester.Requester) :
             enddate, endtime, mydetail, withown.
             Note that the 'since' parameter specifies the date QSL were
             uploaded to LOTW, not the startdate/starttime of the QSO.
-            We directly return an ADIF object.
+            We directly return an ADIF object (an ADIF_Stream if
+            stream is set).
         """
         d = {}
         for a in args :
@@ -98,10 +111,7 @@ class LOTW_Query (requester.Requester) :
         if since :
             d ['qso_qslsince'] = since.strftime ('%Y-%m-%d')
         d ['qso_qsldetail']  = 'yes'
-        t = self.get ('?' + urlencode (d), as_text = True)
-        with io.StringIO (t) as f :
-            adif = ADIF (f)
-        return adif
+        return self._get_adif (d, stream)
     # end def get_qsl
 
 # end class LOTW_Query
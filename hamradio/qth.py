@@ -27,7 +27,13 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 # ****************************************************************************
 
+import math
+from array               import array
 from rsclib.iter_recipes import grouper
+try :
+    import numpy
+except ImportError :
+    numpy = None
 
 class Maidenhead_Locator (object) :
     """ Represent a location with LAT/LON as Maidenhead Locator
@@ -135,6 +141,23 @@ class Maidenhead_Locator (object) :
         return cls (lon = pos [0] * 2 - 180, lat = pos [1] - 90)
     # end def from_locator
 
+    def distance (self, other, method = 'haversine') :
+        """ Distance to other Maidenhead_Locator in km, see distance
+        >>> vie = Maidenhead_Locator (48.208525, 16.373146)
+        >>> muc = Maidenhead_Locator.from_locator ('JN58TD')
+        >>> "%.3f %.3f" % (vie.distance (muc), vie.distance (muc, 'vincenty'))
+        '352.226 353.278'
+        >>> "%.3f" % vie.azimuth (muc)
+        '270.620'
+        """
+        return distance (self.lat, self.lon, other.lat, other.lon, method)
+    # end def distance
+
+    def azimuth (self, other, method = 'haversine') :
+        """ Initial bearing to other Maidenhead_Locator in degrees """
+        return azimuth (self.lat, self.lon, other.lat, other.lon, method)
+    # end def azimuth
+
     def _format (self, value, suffices) :
         r      = []
         suffix = suffices [value > 0]
@@ -162,3 +185,528 @@ class Maidenhead_Locator (object) :
     __repr__ = __str__
 
 # end class Maidenhead_Locator
+
+def encode (lat, lon, precision = 3) :
+    """ Maidenhead locators with precision pairs for arrays (or any
+        sequences) of latitudes and longitudes, the same as
+        Maidenhead_Locator (lat, lon).as_locator (precision) for each
+        point. With NumPy each pair of characters is computed for all
+        points at once.
+    >>> encode ([48.208525, 48.47699], [16.373146, 16.95398], 4)
+    ['JN88EF40', 'JN88LL44']
+    >>> import random
+    >>> random.seed (24)
+    >>> lat = [random.uniform (-90, 90)   for k in range (2000)]
+    >>> lon = [random.uniform (-180, 180) for k in range (2000)]
+    >>> for p in range (1, 8) :
+    ...     loc = [Maidenhead_Locator (*x).as_locator (p) for x in zip (lat, lon)]
+    ...     assert encode (lat, lon, p) == loc, p
+    >>> import hamradio.qth as qth
+    >>> np, qth.numpy = qth.numpy, None
+    >>> encode (lat, lon, 7) == loc
+    True
+    >>> qth.numpy = np
+    """
+    if numpy is None :
+        return \
+            [ Maidenhead_Locator (a, o).as_locator (precision)
+              for a, o in zip (lat, lon)
+            ]
+    lat   = numpy.asarray (lat, dtype = float)
+    lon   = numpy.asarray (lon, dtype = float)
+    pos   = [(lon + 180.) / 2., lat + 90.]
+    codes = numpy.empty ((len (lat), 2 * precision), dtype = numpy.uint8)
+    div   = 10
+    for k in range (precision) :
+        for i, p in enumerate (pos) :
+            q, r = numpy.divmod (p, div)
+            if k % 2 :
+                codes [:, 2 * k + i] = q.astype (int) + ord ('0')
+                pos [i] = r * 10
+            else :
+                codes [:, 2 * k + i] = q.astype (int) + ord ('A')
+                pos [i] = r * 24
+        if k % 2 :
+            div = 10
+        else :
+            div = 24
+    if not len (codes) :
+        return []
+    return codes.view ('S%d' % (2 * precision)).ravel ().astype (str).tolist ()
+# end def encode
+
+def decode (locators, round_vhf = True) :
+    """ Latitudes and longitudes (two arrays) of a sequence of
+        Maidenhead locators, the same as Maidenhead_Locator.from_locator
+        for each of them: The arithmetic is done in the same order for
+        all locators of the same length, so results are identical.
+        Locators must consist of pairs of letters and digits.
+    >>> lat, lon = decode (['JN88', 'jn88ef40', 'JN88EF40LL'])
+    >>> ["(%2.5f, %2.5f)" % x for x in zip (lat, lon)]
+    ['(48.47699, 16.95398)', '(48.21032, 16.37064)', '(48.21033, 16.37065)']
+    >>> encode (*decode (['JN88'], round_vhf = False), precision = 7)
+    ['JN88MM00AA00AA']
+    >>> import random
+    >>> random.seed (25)
+    >>> lat = [random.uniform (-90, 90)   for k in range (2000)]
+    >>> lon = [random.uniform (-180, 180) for k in range (2000)]
+    >>> locs = []
+    >>> for p in range (1, 8) :
+    ...     locs.extend (encode (lat, lon, p))
+    >>> lc = [Maidenhead_Locator.from_locator (l) for l in locs]
+    >>> lat, lon = decode (locs)
+    >>> list (lat) == [l.lat for l in lc], list (lon) == [l.lon for l in lc]
+    (True, True)
+    >>> decode (['JN88', 'JN8E'])
+    Traceback (most recent call last):
+    ...
+    ValueError: Invalid locator: JN8E
+    >>> import hamradio.qth as qth
+    >>> np, qth.numpy = qth.numpy, None
+    >>> lat, lon = decode (locs)
+    >>> list (lat) == [l.lat for l in lc], list (lon) == [l.lon for l in lc]
+    (True, True)
+    >>> qth.numpy = np
+    """
+    rounding_constant = 0.47699
+    if not round_vhf :
+        rounding_constant = .5
+    if numpy is None :
+        lat = array ('d')
+        lon = array ('d')
+        for loc in locators :
+            if not valid_locator (loc) :
+                raise ValueError ('Invalid locator: %s' % loc)
+            l = Maidenhead_Locator.from_locator (loc, round_vhf)
+            lat.append (l.lat)
+            lon.append (l.lon)
+        return lat, lon
+    locs  = numpy.array ([l.upper () for l in locators], dtype = bytes)
+    codes = locs.view (numpy.uint8).reshape (len (locs), locs.itemsize)
+    lens  = (codes != 0).sum (axis = 1)
+    lat   = numpy.empty (len (locs))
+    lon   = numpy.empty (len (locs))
+    for length in numpy.unique (lens) :
+        rows = numpy.nonzero (lens == length) [0]
+        c    = codes [rows, :length].astype (int)
+        pos  = [numpy.zeros (len (rows)), numpy.zeros (len (rows))]
+        mul  = 10
+        ok   = numpy.full (len (rows), length >= 2 and length % 2 == 0)
+        for n in range (length // 2) :
+            for idx in range (2) :
+                col = c [:, 2 * n + idx]
+                if n % 2 :
+                    k   = col - ord ('0')
+                    ok &= (k >= 0) & (k < 10)
+                else :
+                    k   = col - ord ('A')
+                    ok &= (k >= 0) & (k < 24)
+                pos [idx] += k * mul
+            if n % 2 :
+                newmul = 24
+            else :
+                newmul = 10
+            mul = mul / newmul
+        if not ok.all () :
+            bad = locs [rows [numpy.argmin (ok)]].decode ()
+            raise ValueError ('Invalid locator: %s' % bad)
+        pos [0] += mul * newmul * rounding_constant
+        pos [1] += mul * newmul * rounding_constant
+        lon [rows] = pos [0] * 2 - 180
+        lat [rows] = pos [1] - 90
+    return lat, lon
+# end def decode
+
+def valid_locator (loc) :
+    """ Check that loc consists of pairs of letters and digits
+    >>> valid_locator ('JN88ef40'), valid_locator ('JN8'), valid_locator ('J188')
+    (True, False, False)
+    """
+    if not loc or len (loc) % 2 :
+        return False
+    for n, k in enumerate (loc.upper ()) :
+        if (n // 2) % 2 :
+            if not '0' <= k <= '9' :
+                return False
+        elif not 'A' <= k <= 'X' :
+            return False
+    return True
+# end def valid_locator
+
+# Mean earth radius in km for the spherical formulas
+earth_radius = 6371.0
+# WGS84 ellipsoid for Vincenty's formulae, in km
+wgs84_a = 6378.137
+wgs84_f = 1 / 298.257223563
+
+def _broadcast (*args) :
+    """ Without NumPy: Tuples of the elements of args (sequences or
+        scalars, the latter are repeated) and whether all were scalars
+    """
+    seqs = [a for a in args if hasattr (a, '__len__')]
+    if not seqs :
+        return [args], True
+    n    = len (seqs [0])
+    args = [a if hasattr (a, '__len__') else [a] * n for a in args]
+    return list (zip (*args)), False
+# end def _broadcast
+
+def _haversine (lat1, lon1, lat2, lon2) :
+    """ Distance (as angle) and initial bearing of two points on the
+        sphere in radians, scalar version of haversine
+    """
+    p1, p2 = math.radians (lat1), math.radians (lat2)
+    dl     = math.radians (lon2 - lon1)
+    h      = ( math.sin ((p2 - p1) / 2) ** 2
+             + math.cos (p1) * math.cos (p2) * math.sin (dl / 2) ** 2
+             )
+    d      = 2 * math.asin (math.sqrt (min (h, 1.0)))
+    az     = math.atan2 \
+        ( math.sin (dl) * math.cos (p2)
+        , math.cos (p1) * math.sin (p2)
+        - math.sin (p1) * math.cos (p2) * math.cos (dl)
+        )
+    return d, az
+# end def _haversine
+
+def haversine (lat1, lon1, lat2, lon2) :
+    """ Great circle distance (in km) and initial bearing (in degrees
+        from north, 0-360) from lat1/lon1 to lat2/lon2 on a sphere with
+        radius earth_radius. Arguments may be arrays or scalars, these
+        are broadcast against each other.
+    >>> d, az = haversine (48.2085, 16.3731, [48.2085, 51.5, -33.9], 16.3731)
+    >>> ["%.1f/%.1f" % x for x in zip (d, az)]
+    ['0.0/0.0', '366.0/0.0', '9130.0/180.0']
+    >>> d, az = haversine (0, 0, 0, [90, -90])
+    >>> ["%.1f/%.1f" % x for x in zip (d, az)]
+    ['10007.5/90.0', '10007.5/270.0']
+    """
+    if numpy is None :
+        args, scalar = _broadcast (lat1, lon1, lat2, lon2)
+        r = [_haversine (*a) for a in args]
+        d = [x [0] * earth_radius for x in r]
+        a = [math.degrees (x [1]) % 360 for x in r]
+        if scalar :
+            return d [0], a [0]
+        return d, a
+    p1 = numpy.radians (lat1)
+    p2 = numpy.radians (lat2)
+    dl = numpy.radians (numpy.subtract (lon2, lon1))
+    h  = ( numpy.sin ((p2 - p1) / 2) ** 2
+         + numpy.cos (p1) * numpy.cos (p2) * numpy.sin (dl / 2) ** 2
+         )
+    d  = 2 * numpy.arcsin (numpy.sqrt (numpy.minimum (h, 1.0)))
+    az = numpy.arctan2 \
+        ( numpy.sin (dl) * numpy.cos (p2)
+        , numpy.cos (p1) * numpy.sin (p2)
+        - numpy.sin (p1) * numpy.cos (p2) * numpy.cos (dl)
+        )
+    return d * earth_radius, numpy.degrees (az) % 360
+# end def haversine
+
+def _vincenty (lat1, lon1, lat2, lon2, maxiter = 200, eps = 1e-12) :
+    """ Scalar version of vincenty, None if it doesn't converge """
+    a, f = wgs84_a, wgs84_f
+    b    = (1 - f) * a
+    L    = math.radians (lon2 - lon1)
+    U1   = math.atan ((1 - f) * math.tan (math.radians (lat1)))
+    U2   = math.atan ((1 - f) * math.tan (math.radians (lat2)))
+    sU1, cU1 = math.sin (U1), math.cos (U1)
+    sU2, cU2 = math.sin (U2), math.cos (U2)
+    lam  = L
+    for k in range (maxiter) :
+        sl, cl = math.sin (lam), math.cos (lam)
+        ss  = math.hypot (cU2 * sl, cU1 * sU2 - sU1 * cU2 * cl)
+        if ss == 0 :
+            return 0.0, 0.0
+        cs  = sU1 * sU2 + cU1 * cU2 * cl
+        sig = math.atan2 (ss, cs)
+        sa  = cU1 * cU2 * sl / ss
+        c2a = 1 - sa * sa
+        c2m = cs - 2 * sU1 * sU2 / c2a if c2a else 0.0
+        C   = f / 16 * c2a * (4 + f * (4 - 3 * c2a))
+        prev = lam
+        lam  = L + (1 - C) * f * sa * \
+            (sig + C * ss * (c2m + C * cs * (-1 + 2 * c2m * c2m)))
+        if abs (lam - prev) < eps :
+            break
+    else :
+        return None
+    u2 = c2a * (a * a - b * b) / (b * b)
+    A  = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B  = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    ds = B * ss * \
+        ( c2m + B / 4 *
+          ( cs * (-1 + 2 * c2m * c2m)
+          - B / 6 * c2m * (-3 + 4 * ss * ss) * (-3 + 4 * c2m * c2m)
+          )
+        )
+    az = math.atan2 (cU2 * sl, cU1 * sU2 - sU1 * cU2 * cl)
+    return b * A * (sig - ds), math.degrees (az) % 360
+# end def _vincenty
+
+def vincenty (lat1, lon1, lat2, lon2, maxiter = 200, eps = 1e-12) :
+    """ Distance (in km) and initial bearing (in degrees) on the WGS84
+        ellipsoid with Vincenty's inverse formula, arguments like for
+        haversine. Each iteration only computes the points that have
+        not yet converged. For nearly antipodal points where it does not
+        converge we fall back to haversine.
+    >>> d, az = vincenty (48.2085, 16.3731, [48.2085, 51.5, -33.9], 16.3731)
+    >>> ["%.3f/%.3f" % x for x in zip (d, az)]
+    ['0.000/0.000', '366.101/0.000', '9094.180/180.000']
+
+    Reference example from Vincenty's paper (Flinders Peak to
+    Buninyong) and an antipodal case using haversine:
+    >>> d, az = vincenty (-37.95103342, 144.42486789, -37.65282114, 143.92649554)
+    >>> "%.6f %.6f" % (d, az)
+    '54.972271 306.868160'
+    >>> d, az = vincenty (0, 0, 0, 179.5)
+    >>> "%.3f %.3f" % (d, az), "%.3f" % haversine (0, 0, 0, 179.5) [0]
+    ('19959.489 90.000', '19959.489')
+    >>> import random
+    >>> random.seed (25)
+    >>> p = [[random.uniform (-90, 90) for k in range (500)] for i in (0, 1)]
+    >>> l = [[random.uniform (-180, 180) for k in range (500)] for i in (0, 1)]
+    >>> d, az = (x.tolist () for x in vincenty (p [0], l [0], p [1], l [1]))
+    >>> import hamradio.qth as qth
+    >>> np, qth.numpy = qth.numpy, None
+    >>> d2, az2 = vincenty (p [0], l [0], p [1], l [1])
+    >>> max (abs (x - y) for x, y in zip (d, d2)) < 1e-6
+    True
+    >>> max (min (abs (x - y), 360 - abs (x - y)) for x, y in zip (az, az2)) < 1e-6
+    True
+    >>> qth.numpy = np
+    """
+    if numpy is None :
+        args, scalar = _broadcast (lat1, lon1, lat2, lon2)
+        d = []
+        a = []
+        for x in args :
+            r = _vincenty (* (x + (maxiter, eps)))
+            if r is None :
+                r = haversine (*x)
+            d.append (r [0])
+            a.append (r [1])
+        if scalar :
+            return d [0], a [0]
+        return d, a
+    a, f = wgs84_a, wgs84_f
+    b    = (1 - f) * a
+    lat1, lon1, lat2, lon2 = numpy.broadcast_arrays \
+        (* (numpy.asarray (x, dtype = float) for x in (lat1, lon1, lat2, lon2)))
+    shape = lat1.shape
+    lat1, lon1, lat2, lon2 = (x.reshape (-1) for x in (lat1, lon1, lat2, lon2))
+    L    = numpy.radians (lon2 - lon1)
+    U1   = numpy.arctan ((1 - f) * numpy.tan (numpy.radians (lat1)))
+    U2   = numpy.arctan ((1 - f) * numpy.tan (numpy.radians (lat2)))
+    sU1, cU1 = numpy.sin (U1), numpy.cos (U1)
+    sU2, cU2 = numpy.sin (U2), numpy.cos (U2)
+    lam  = L.copy ()
+    # Terms of the last iteration of each point, the iteration only
+    # computes the points in idx that have not converged yet
+    sl, cl, ss, cs, sig, c2a, c2m = (numpy.zeros (L.shape) for k in range (7))
+    idx  = numpy.arange (len (L))
+    with numpy.errstate (invalid = 'ignore', divide = 'ignore') :
+        for k in range (maxiter) :
+            l     = lam [idx]
+            s1, c1, s2, c2 = sU1 [idx], cU1 [idx], sU2 [idx], cU2 [idx]
+            sl_k, cl_k = numpy.sin (l), numpy.cos (l)
+            ss_k  = numpy.hypot (c2 * sl_k, c1 * s2 - s1 * c2 * cl_k)
+            cs_k  = s1 * s2 + c1 * c2 * cl_k
+            sig_k = numpy.arctan2 (ss_k, cs_k)
+            sa    = numpy.where (ss_k == 0, 0.0, c1 * c2 * sl_k / ss_k)
+            c2a_k = 1 - sa * sa
+            c2m_k = numpy.where \
+                (c2a_k == 0, 0.0, cs_k - 2 * s1 * s2 / c2a_k)
+            C     = f / 16 * c2a_k * (4 + f * (4 - 3 * c2a_k))
+            new   = L [idx] + (1 - C) * f * sa * \
+                ( sig_k
+                + C * ss_k * (c2m_k + C * cs_k * (-1 + 2 * c2m_k * c2m_k))
+                )
+            sl  [idx], cl  [idx], ss  [idx], cs [idx] = sl_k, cl_k, ss_k, cs_k
+            sig [idx], c2a [idx], c2m [idx] = sig_k, c2a_k, c2m_k
+            lam [idx] = new
+            idx = idx [abs (new - l) >= eps]
+            if not len (idx) :
+                break
+        u2 = c2a * (a * a - b * b) / (b * b)
+        A  = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B  = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        ds = B * ss * \
+            ( c2m + B / 4 *
+              ( cs * (-1 + 2 * c2m * c2m)
+              - B / 6 * c2m * (-3 + 4 * ss * ss) * (-3 + 4 * c2m * c2m)
+              )
+            )
+    d  = b * A * (sig - ds)
+    az = numpy.degrees (numpy.arctan2 (cU2 * sl, cU1 * sU2 - sU1 * cU2 * cl))
+    az = numpy.where (ss == 0, 0.0, az % 360)
+    if len (idx) :
+        hd, haz = haversine (lat1 [idx], lon1 [idx], lat2 [idx], lon2 [idx])
+        d  [idx] = hd
+        az [idx] = haz
+    if not shape :
+        return d [0], az [0]
+    return d.reshape (shape), az.reshape (shape)
+# end def vincenty
+
+def distance (lat1, lon1, lat2, lon2, method = 'haversine') :
+    """ Distance in km, method is haversine or vincenty """
+    return _methods [method] (lat1, lon1, lat2, lon2) [0]
+# end def distance
+
+def azimuth (lat1, lon1, lat2, lon2, method = 'haversine') :
+    """ Initial bearing in degrees, method is haversine or vincenty """
+    return _methods [method] (lat1, lon1, lat2, lon2) [1]
+# end def azimuth
+
+_methods = dict (haversine = haversine, vincenty = vincenty)
+
+class Locator_Index :
+    """ Spatial index of positions by 4-character grid square (2° of
+        longitude by 1° of latitude): For queries only the positions
+        in squares that may intersect the search circle are checked.
+        Items default to the index of the position. Longitude 180 is
+        indexed as -180.
+    >>> idx = Locator_Index.from_locators \\
+    ...     (['JN88EF', 'JN88LL', 'JN58TD', 'JO62QM', 'IO91WM', 'RR73'])
+    >>> sorted (idx.squares) [:3]
+    ['IO91', 'JN58', 'JN88']
+    >>> [(i, "%.1f" % d) for i, d in idx.within (48.2085, 16.3731, 400)]
+    [(0, '2.2'), (1, '52.5'), (2, '352.2')]
+    >>> idx = Locator_Index ([0, 1, -1], [179.5, -179.5, 179], 'abc')
+    >>> [(i, "%.1f" % d) for i, d in idx.within (0, -179.9, 200)]
+    [('a', '66.7'), ('b', '119.8'), ('c', '165.3')]
+    >>> [(i, "%.1f" % d) for i, d in idx.within (0, -179.9, 100, 'vincenty')]
+    [('a', '66.8')]
+    >>> idx = Locator_Index ([10.0, 0.0005], [180.0, 1.0], 'ef')
+    >>> [(i, "%.2f" % d) for i, d in idx.within (10.0, 179.9, 50)]
+    [('e', '10.95')]
+    >>> r = idx.within (-0.999, 1.0, 110.8, 'vincenty')
+    >>> [(i, "%.2f" % d) for i, d in r]
+    [('f', '110.52')]
+    >>> import random
+    >>> random.seed (23)
+    >>> lat = [random.uniform (-90, 90)   for k in range (3000)]
+    >>> lon = [random.uniform (-180, 180) for k in range (3000)]
+    >>> idx = Locator_Index (lat, lon)
+    >>> for k in range (50) :
+    ...     a, o = random.uniform (-90, 90), random.uniform (-180, 180)
+    ...     km   = random.choice ((100, 500, 2000, 8000, 20000))
+    ...     d    = distance (a, o, lat, lon)
+    ...     r    = [i for i, x in idx.within (a, o, km)]
+    ...     assert sorted (r) == [i for i in range (len (d)) if d [i] <= km]
+    >>> import hamradio.qth as qth
+    >>> np, qth.numpy = qth.numpy, None
+    >>> idx = Locator_Index ([0, 1, -1], [179.5, -179.5, 179], 'abc')
+    >>> [(i, "%.1f" % d) for i, d in idx.within (0, -179.9, 200)]
+    [('a', '66.7'), ('b', '119.8'), ('c', '165.3')]
+    >>> qth.numpy = np
+    """
+
+    def __init__ (self, lat, lon, items = None) :
+        self.items = list (items) if items is not None else None
+        if numpy is None :
+            self.lat = array ('d', lat)
+            self.lon = array ('d', (o - 360 if o >= 180 else o for o in lon))
+        else :
+            self.lat = numpy.asarray (lat, dtype = float)
+            self.lon = numpy.asarray (lon, dtype = float)
+            self.lon = numpy.where (self.lon >= 180, self.lon - 360, self.lon)
+        squares = {}
+        for i, sq in enumerate (encode (self.lat, self.lon, 2)) :
+            squares.setdefault (sq, []).append (i)
+        if numpy is not None :
+            squares = dict \
+                ( (k, numpy.array (v, dtype = int))
+                  for k, v in squares.items ()
+                )
+        self.squares = squares
+    # end def __init__
+
+    @classmethod
+    def from_locators (cls, locators, items = None, round_vhf = True) :
+        lat, lon = decode (locators, round_vhf)
+        return cls (lat, lon, items)
+    # end def from_locators
+
+    @staticmethod
+    def square (ix, iy) :
+        """ Name of square with given column (of 180) and row """
+        return ( chr (ord ('A') + ix // 10) + chr (ord ('A') + iy // 10)
+               + str (ix % 10) + str (iy % 10)
+               )
+    # end def square
+
+    # Widening of the search window for distances on the ellipsoid:
+    # A degree of latitude is only 110.57 km at the equator
+    margin = 1.01
+
+    def candidates (self, lat, lon, km, method = 'haversine') :
+        """ Names of the indexed squares which may contain positions
+            within km of lat/lon
+        """
+        d      = km / earth_radius
+        if method != 'haversine' :
+            d *= self.margin
+        dlat   = math.degrees (d)
+        lat_lo = max (lat - dlat, -90.)
+        lat_hi = min (lat + dlat,  90.)
+        cols   = range (180)
+        if d < math.pi / 2 and -90 < lat_lo and lat_hi < 90 :
+            # The circle doesn't contain a pole
+            s    = math.sin (d) / math.cos (math.radians (lat))
+            dlon = math.degrees (math.asin (min (s, 1)))
+            lo   = int ((lon - dlon + 180) // 2)
+            hi   = int ((lon + dlon + 180) // 2)
+            if hi - lo < 179 :
+                cols = [ix % 180 for ix in range (lo, hi + 1)]
+        rows = range (int (lat_lo + 90), int (lat_hi + 90) + 1)
+        squares = self.squares
+        if len (cols) * len (rows) > len (squares) :
+            rows = set (rows)
+            cols = set (cols)
+            return \
+                [ sq for sq in squares
+                  if  (ord (sq [0]) - ord ('A')) * 10 + int (sq [2]) in cols
+                  and (ord (sq [1]) - ord ('A')) * 10 + int (sq [3]) in rows
+                ]
+        result = []
+        for ix in cols :
+            for iy in rows :
+                sq = self.square (ix, iy)
+                if sq in squares :
+                    result.append (sq)
+        return result
+    # end def candidates
+
+    def within (self, lat, lon, km, method = 'haversine') :
+        """ Items with positions within km of lat/lon as (item,
+            distance) sorted by distance
+        """
+        sq = self.candidates (lat, lon, km, method)
+        if not sq :
+            return []
+        if numpy is None :
+            idx = [i for s in sq for i in self.squares [s]]
+            d   = distance \
+                ( lat, lon
+                , [self.lat [i] for i in idx], [self.lon [i] for i in idx]
+                , method
+                )
+            r   = sorted ((x, i) for x, i in zip (d, idx) if x <= km)
+        else :
+            idx = numpy.concatenate ([self.squares [s] for s in sq])
+            d   = distance (lat, lon, self.lat [idx], self.lon [idx], method)
+            ok  = d <= km
+            idx = idx [ok]
+            d   = d [ok]
+            srt = numpy.argsort (d, kind = 'stable')
+            r   = zip (d [srt].tolist (), idx [srt].tolist ())
+        items = self.items
+        if items is None :
+            return [(i, x) for x, i in r]
+        return [(items [i], x) for x, i in r]
+    # end def within
+
+# end class Locator_Index
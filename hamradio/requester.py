@@ -29,6 +29,8 @@
 
 from __future__ import print_function
 
+import io
+import codecs
 import requests
 from netrc    import netrc
 from getpass  import getpass
@@ -37,6 +39,62 @@ try :
 except ImportError:
     from urlparse import urlparse
 from rsclib.autosuper import autosuper
+from requests.compat  import chardet
+
+class Response_Reader (object) :
+    r""" File-like object reading the text of a streamed response:
+        Content encodings (e.g. gzip) are undone by requests and the
+        text is decoded with the charset of the response. Without a
+        charset it is detected like for response.text, but only from
+        the first block. The response is closed at the end of the
+        data or by close, this releases the connection.
+    >>> r = requests.models.Response ()
+    >>> r.raw = io.BytesIO ('<name:4>J\xfcrg <eor>'.encode ('utf-8'))
+    >>> f = Response_Reader (r)
+    >>> f.read (3), f.read () == 'me:4>J\xfcrg <eor>', f.read (), f.eof
+    ('<na', True, '', True)
+    >>> r = requests.models.Response ()
+    >>> r.raw, r.encoding = io.BytesIO (b'<name:4>J\xfcrg <eor>'), 'latin-1'
+    >>> Response_Reader (r, blocksize = 4).read () == '<name:4>J\xfcrg <eor>'
+    True
+    """
+
+    blocksize = 64 * 1024
+
+    def __init__ (self, response, blocksize = None) :
+        self.response = response
+        self.decoder  = None
+        self.buf      = ''
+        self.eof      = False
+        self.chunks   = response.iter_content (blocksize or self.blocksize)
+    # end def __init__
+
+    def read (self, n = -1) :
+        while not self.eof and (n < 0 or len (self.buf) < n) :
+            data = next (self.chunks, None)
+            if data is None :
+                if self.decoder is not None :
+                    self.buf += self.decoder.decode (b'', True)
+                self.close ()
+                break
+            if self.decoder is None :
+                encoding = self.response.encoding \
+                    or chardet.detect (data) ['encoding'] or 'utf-8'
+                self.decoder = codecs.getincrementaldecoder (encoding) \
+                    (errors = 'replace')
+            self.buf += self.decoder.decode (data)
+        if n < 0 :
+            n = len (self.buf)
+        r, self.buf = self.buf [:n], self.buf [n:]
+        return r
+    # end def read
+
+    def close (self) :
+        self.eof = True
+        self.response.close ()
+    # end def close
+
+# end class Response_Reader
 
 class Requester (autosuper) :
 
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ****************************************************************************
+
+
+""" Tokenizers for ADIF data: Both return the (tag, value) spans of the
+    well-formed records in a whole buffer. The NumPy version finds all
+    tag delimiters in one pass, ADIF_Parse uses it when its tokenizer
+    is set to accelerated (None without NumPy), the pure-Python version
+    is the reference implementation it is tested against.
+"""
+
+from re import compile as rc
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+# Tag with optional length and 'd' data type, used for the same
+# well-formed subset of ADIF as in ADIF_Parse._get_tags_fast
+re_token = rc (r'<([^:>\n<]+)(?::([0-9]+)(?::[dD])?)?>')
+re_nonws = rc (r'[^ \t\n\r\f\v]')
+
+def tokenize_py (buf, pos = 0, endpos = None) :
+    r""" Tokenize buf [pos:endpos], returns the tokens and a flag if
+        tokenizing stopped because the end of the data was reached.
+        The tokens are four lists: The offset of each '<', the end of
+        each tag name and the start and end of each value. A tag
+        without a length has an empty value starting right after the
+        name and the closing '>'. Tokenizing stops before the first tag that is
+        not well-formed: After a tag without a length (and at the
+        start) only white space is allowed up to the next tag,
+        anything after a value is skipped. Values (including the
+        character swallowed by a zero-length value) must not contain
+        '<' or a newline, so each '<' starts a tag.
+    >>> tokenize_py ('<call:6>OE3RSU x\n<eor>\n')
+    (([0, 17], [5, 21], [8, 22], [14, 22]), True)
+    >>> tokenize_py ('<call:6>OE3R')
+    (([], [], [], []), True)
+    >>> tokenize_py ('<eor> x <eor>')
+    (([0], [4], [5], [5]), False)
+    """
+    if endpos is None :
+        endpos = len (buf)
+    tokens = lts, name_ends, starts, ends = [], [], [], []
+    start  = True
+    while True :
+        lt  = buf.find ('<', pos, endpos)
+        end = lt if lt >= 0 else endpos
+        if start and re_nonws.search (buf, pos, end) :
+            return tokens, False
+        if lt < 0 :
+            return tokens, True
+        m = re_token.match (buf, lt, endpos)
+        if not m :
+            return tokens, buf.find ('>', lt, endpos) < 0
+        vs = m.end ()
+        if m.group (2) is None :
+            lts.append (lt)
+            name_ends.append (vs - 1)
+            starts.append (vs)
+            ends.append (vs)
+            pos   = vs
+            start = True
+            continue
+        count = int (m.group (2))
+        # A zero-length value swallows the next character
+        need  = vs + (count or 1)
+        if need > endpos :
+            return tokens, True
+        if buf.find ('<', vs, need) >= 0 or buf.find ('\n', vs, need) >= 0 :
+            return tokens, False
+        lts.append (lt)
+        name_ends.append (m.start (2) - 1)
+        starts.append (vs)
+        ends.append (vs + count)
+        pos   = need
+        start = False
+# end def tokenize_py
+
+def tokenize_numpy (buf, pos = 0, endpos = None) :
+    r""" Same as tokenize_py but all tag delimiters are located with
+        NumPy in one pass over the buffer, the tokens are then checked
+        with array operations. Since every '<' in the well-formed part
+        starts a tag the result is the prefix of candidate tags up to
+        the first one that is not well-formed. Without NumPy the tests
+        compare tokenize_py with itself.
+    >>> tokenize = accelerated or tokenize_py
+    >>> tokenize ('<call:6>OE3RSU x\n<eor>\n')
+    (([0, 17], [5, 21], [8, 22], [14, 22]), True)
+    >>> tokenize ('<call:6>OE3R')
+    (([], [], [], []), True)
+    >>> tokenize ('<eor> x <eor>')
+    (([0], [4], [5], [5]), False)
+    >>> import random
+    >>> pieces = ['<call:6>OE3RSU', '<eor>', '<EOR>\n', ' ', 'x', '<x:0>',
+    ...     '<d:8:d>20200101', '<a:b>', '<n:2>\n', '<', '>', ':', '\n',
+    ...     '<t:3>a<b', '<c:5>J\xfcrg ', '<c:02>ab', '<:1>a', '<x:1:y>a']
+    >>> random.seed (42)
+    >>> for i in range (2000) :
+    ...     s = ''.join (random.choice (pieces) for k in range (12))
+    ...     p = random.randint (0, 3)
+    ...     e = random.randint (p, len (s))
+    ...     assert tokenize (s, p, e) == tokenize_py (s, p, e), s
+    """
+    if endpos is None :
+        endpos = len (buf)
+    a   = numpy.frombuffer \
+        ( buf [pos:endpos].encode ('utf-32-le', 'surrogatepass')
+        , dtype = numpy.uint32
+        )
+    n   = len (a)
+    # Positions of delimiters, each with n appended as a sentinel
+    lt  = numpy.flatnonzero (a == ord ('<'))
+    k   = len (lt)
+    ltn = numpy.append (lt [1:], n)
+    gtp = numpy.append (numpy.flatnonzero (a == ord ('>')), n)
+    cop = numpy.append (numpy.flatnonzero (a == ord (':')), [n, n])
+    nlp = numpy.append (numpy.flatnonzero (a == ord ('\n')), n)
+    wsp = numpy.flatnonzero ((a == ord (' ')) | ((a >= 9) & (a <= 13)))
+
+    gt       = gtp [numpy.searchsorted (gtp, lt)]
+    has_gt   = gt < n
+    ci       = numpy.searchsorted (cop, lt)
+    c1       = cop [ci]
+    c2       = numpy.minimum (cop [ci + 1], gt)
+    has_len  = c1 < gt
+    name_end = numpy.where (has_len, c1, gt)
+    # No newline or '<' in the name
+    name_ok  = \
+        ( (name_end > lt + 1)
+        & (nlp [numpy.searchsorted (nlp, lt)] >= name_end)
+        & (ltn >= name_end)
+        )
+    # Length is one or more digits, followed by an optional 'd' type
+    d0       = c1 + 1
+    ndig     = c2 - d0
+    len_ok   = has_len & (ndig > 0)
+    last     = numpy.minimum (c2 + 1, max (n - 1, 0))
+    type_ok  = (c2 == gt) | ((gt == c2 + 2) & ((a [last] | 32) == ord ('d')))
+    # Numeric value of the length, saturated to stay in range
+    count    = numpy.zeros (k, dtype = numpy.int64)
+    for j in range (int (ndig [len_ok].max ()) if len_ok.any () else 0) :
+        sel    = len_ok & (j < ndig)
+        d      = a [numpy.minimum (d0 + j, n - 1)].astype (numpy.int64) - 48
+        len_ok = len_ok & (~sel | ((d >= 0) & (d <= 9)))
+        count  = numpy.where \
+            (sel, numpy.minimum (count * 10 + d, 1 << 40), count)
+    tag_ok   = has_gt & name_ok & (~has_len | (len_ok & type_ok))
+    vs       = numpy.minimum (gt + 1, n)
+    # A zero-length value swallows the next character
+    end      = numpy.where (has_len, gt + 1 + numpy.maximum (count, 1), vs)
+    trunc    = ~has_gt | (tag_ok & has_len & (end > n))
+    # No newline or '<' in the value
+    val_ok   = ~has_len | \
+        ((ltn >= end) & (nlp [numpy.searchsorted (nlp, vs)] >= end))
+    tok_ok   = tag_ok & ~trunc & val_ok
+
+    # Only white space before a tag at the start or after a tag
+    # without length
+    endc     = numpy.minimum (end, n)
+    prev_end = numpy.minimum (numpy.concatenate (([0], endc [:-1])), lt)
+    gap_ok   = numpy.ones (k, dtype = bool)
+    prev_ws  = gap_ok.copy ()
+    prev_ws [1:] = ~has_len [:-1]
+    prev_ws  = numpy.flatnonzero (prev_ws)
+    lt_ws    = lt [prev_ws]
+    end_ws   = prev_end [prev_ws]
+    n_ws     = numpy.searchsorted (wsp, lt_ws) - numpy.searchsorted (wsp, end_ws)
+    gap_ok [prev_ws] = n_ws == lt_ws - end_ws
+    fail     = ~(gap_ok & tok_ok)
+    i        = int (numpy.argmax (fail)) if fail.any () else k
+    if i < k :
+        truncated = bool (gap_ok [i] and trunc [i])
+    else :
+        tail = int (endc [-1]) if k else 0
+        n_ws = len (wsp) - numpy.searchsorted (wsp, tail)
+        truncated = k and has_len [-1] or n_ws == n - tail
+    vend   = numpy.where (has_len, vs + count, vs)
+    tokens = tuple \
+        ((x [:i] + pos).tolist () for x in (lt, name_end, vs, vend))
+    return tokens, bool (truncated)
+# end def tokenize_numpy
+
+# Tokenizer used by ADIF_Parse if available
+accelerated = tokenize_numpy if numpy is not None else None
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ****************************************************************************
+
+""" Reload data files of long-running processes when they change
+"""
+
+import threading
+from rsclib.autosuper import autosuper
+
+class Reload_Watcher (threading.Thread, autosuper) :
+    """ Daemon thread that polls obj.changed () every interval seconds
+        and calls obj.reload () if it returns True. The reload runs in
+        this thread, so lookups in other threads continue on the old
+        data until the new data is swapped in. Exceptions during
+        reload are stored in .error and the old data is kept.
+    >>> class Data :
+    ...     version = 0
+    ...     def changed (self) :
+    ...         return self.version < 2
+    ...     def reload (self) :
+    ...         self.version += 1
+    >>> d = Data ()
+    >>> w = Reload_Watcher (d)
+    >>> w.check (), w.check (), w.check (), d.version
+    (True, True, False, 2)
+    >>> w = Reload_Watcher (Data (), interval = .01)
+    >>> w.start ()
+    >>> w.reloaded.wait (1)
+    True
+    >>> w.stop ()
+    >>> w.is_alive (), w.error
+    (False, None)
+    """
+
+    def __init__ (self, obj, interval = 60) :
+        self.__super.__init__ ()
+        self.obj      = obj
+        self.interval = interval
+        self.error    = None
+        self.stopped  = threading.Event ()
+        # Set after each successful reload
+        self.reloaded = threading.Event ()
+        self.daemon   = True
+    # end def __init__
+
+    def check (self) :
+        """ Reload if changed, return True if reloaded """
+        try :
+            if self.obj.changed () :
+                self.obj.reload ()
+                self.reloaded.set ()
+                return True
+        except Exception as err :
+            self.error = err
+        return False
+    # end def check
+
+    def run (self) :
+        while not self.stopped.wait (self.interval) :
+            self.check ()
+    # end def run
+
+    def stop (self) :
+        self.stopped.set ()
+        if self.is_alive () :
+            self.join ()
+    # end def stop
+
+# end class Reload_Watcher
@@ -45,6 +45,7 @@ setup \
     , author           = "Ralf Schlatterbeck"
     , author_email     = "rsc@runtux.com"
     , install_requires = ['rsclib', 'requests', 'bs4']
+    , extras_require   = dict (fast = ['numpy'])
     , packages         = ['hamradio']
     , package_data     = dict
         (hamradio = ['data/*.txt', 'data/*.dat', 'data/*.html'])